@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+additive.py - 向量化加法合成核心
+一次計算所有同時發聲音符的所有泛音：每個音符每個取樣點只求一次複數指數 e^(iωn)，
+第 k 個泛音以複數旋轉遞推（連乘 k 次）取得，不必對每個泛音重新取正弦；
+超過奈奎斯特頻率的泛音直接略過，所有暫存都是預先配置、分塊重用的緩衝區
+"""
+
+import numpy as np
+
+# 每次處理的取樣點數，限制暫存緩衝區的記憶體
+BLOCK_SIZE = 4096
+
+
+def additive_synthesis(frequencies, amplitudes, samples, sample_rate,
+                       phases=None, out=None, block_size=BLOCK_SIZE):
+    """加法合成
+
+    frequencies: 各音符的基頻 (n_notes,)
+    amplitudes: 第 k 個泛音（k+1 倍頻）的振幅 (n_partials,)，所有音符共用
+    phases: 第 k 個泛音的初始相位 (n_partials,)，預設全為 0
+    out: 預先配置的輸出緩衝區 (samples,)，結果會加總到 0 之後寫入
+    回傳所有音符、所有泛音的總和
+    """
+    frequencies = np.atleast_1d(np.asarray(frequencies, dtype=np.float64))
+    amplitudes = np.asarray(amplitudes, dtype=np.float64)
+    if phases is None:
+        phases = np.zeros(len(amplitudes))
+    else:
+        phases = np.asarray(phases, dtype=np.float64)
+
+    if out is None:
+        out = np.zeros(samples)
+    else:
+        out[:samples] = 0.0
+
+    # 複數振幅 c[k]：Im(c[k] * e^(i(k+1)ωn)) = amplitudes[k] * sin((k+1)ωn + phases[k])
+    coefficients = amplitudes * np.exp(1j * phases)
+    multiples = np.arange(1, len(amplitudes) + 1)
+    # 各音符低於奈奎斯特頻率的泛音數（泛音頻率遞增，之後的都超過）
+    counts = [int(np.count_nonzero(frequency * multiples < sample_rate / 2)) for frequency in frequencies]
+    voices = [(2 * np.pi * frequency / sample_rate, count)
+              for frequency, count in zip(frequencies, counts)
+              if count and np.any(amplitudes[:count] != 0)]
+    if not voices:
+        return out[:samples]
+
+    block_size = min(block_size, max(samples, 1))
+    rotation = np.empty(block_size, dtype=np.complex128)
+    partial = np.empty(block_size, dtype=np.complex128)
+    scaled = np.empty(block_size, dtype=np.complex128)
+    for begin in range(0, samples, block_size):
+        end = min(begin + block_size, samples)
+        target = out[begin:end]
+        step = rotation[:end - begin]
+        power = partial[:end - begin]
+        term = scaled[:end - begin]
+        for omega, count in voices:
+            # step[n] = e^(iωn)，power 依序為 e^(i(k+1)ωn)
+            np.multiply(np.arange(begin, end, dtype=np.float64), 1j * omega, out=step)
+            np.exp(step, out=step)
+            power[:] = step
+            for k in range(count):
+                if k:
+                    power *= step
+                if coefficients[k] != 0:
+                    np.multiply(power, coefficients[k], out=term)
+                    target += term.imag
+
+    return out[:samples]
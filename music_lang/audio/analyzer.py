@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+analyzer.py - 乾跑分析
+只在虛擬時鐘上執行程式（時間軸編譯器，不合成、不初始化混音器），
+回報總長、各樂器事件數、最大同時發聲數，以及離線渲染的 CPU 時間與記憶體估計，
+可以在花時間渲染之前先決定是否接受這個工作
+"""
+
+import time
+
+import numpy as np
+
+from .audio_engine import InstrumentSynthesizer
+from .offline_renderer import BLOCK_SIZE
+from .sound_cache import SoundCache
+from .timeline import EVENT_NOTE, EVENT_REST, TimelineCompiler
+
+# 以下是成本模型的假設值，不是在執行的機器上量測的結果：估計只用來比較工作大小、
+# 決定是否接受，渲染主機明顯較快或較慢時以 ProgramAnalyzer 的 synth_rate / mix_rate 調整
+
+# 合成速度假設（每秒可合成的「聲部 x 取樣點」數，抓偏慢的一端，估計值寧可偏高）
+SYNTH_SAMPLES_PER_SECOND = 15_000_000
+
+# 混音與輸出速度假設（每秒可處理的主緩衝區取樣點數）
+MIX_SAMPLES_PER_SECOND = 200_000_000
+
+# 合成一個聲部時同時存在的 float64 暫存陣列數假設（時間軸、相位、波形、顫音、包絡等）
+SYNTH_SCRATCH_ARRAYS = 6
+
+
+class AnalysisReport:
+    """乾跑分析結果"""
+
+    def __init__(self, duration, instruments, peak_polyphony, peak_time,
+                 synth_samples, estimated_cpu, estimated_memory, elapsed):
+        self.duration = duration              # 總長（秒）
+        self.instruments = instruments        # 樂器名稱 -> {'notes', 'rests', 'sounding'}
+        self.peak_polyphony = peak_polyphony  # 最大同時發聲數（和弦的每個音各算一個）
+        self.peak_time = peak_time            # 第一次達到最大同時發聲數的時間（秒）
+        self.synth_samples = synth_samples    # 需要實際合成的「聲部 x 取樣點」數（重複的音符與片段只算一次）
+        self.estimated_cpu = estimated_cpu    # 離線渲染的 CPU 時間估計（秒）
+        self.estimated_memory = estimated_memory  # 離線渲染的記憶體峰值估計（位元組）
+        self.elapsed = elapsed                # 分析本身的耗時（秒）
+
+    @property
+    def note_count(self):
+        return sum(counts['notes'] for counts in self.instruments.values())
+
+    @property
+    def rest_count(self):
+        return sum(counts['rests'] for counts in self.instruments.values())
+
+    def to_dict(self):
+        """轉換為可序列化的 dict（例如寫成 JSON 給排程器判斷）"""
+        return {
+            'duration': self.duration,
+            'notes': self.note_count,
+            'rests': self.rest_count,
+            'instruments': {name: dict(counts) for name, counts in self.instruments.items()},
+            'peak_polyphony': self.peak_polyphony,
+            'peak_time': self.peak_time,
+            'synth_samples': self.synth_samples,
+            'estimated_cpu': self.estimated_cpu,
+            'estimated_memory': self.estimated_memory,
+        }
+
+    def show(self):
+        """顯示分析摘要"""
+        print(f"\n🔎 乾跑分析（耗時 {self.elapsed:.2f}s，未合成音訊）:")
+        print(f"  ⏱️  總長: {self.duration:.2f}s")
+        print(f"  🎵 總計: {self.note_count} 個音符, {self.rest_count} 個休止符")
+        for name, counts in self.instruments.items():
+            print(f"  🎹 {name}: {counts['notes']} 個音符, {counts['rests']} 個休止符, "
+                  f"發聲 {counts['sounding']:.1f}s")
+        print(f"  🎼 最大同時發聲數: {self.peak_polyphony}（{self.peak_time:.2f}s）")
+        print(f"  🧮 預估渲染 CPU: {self.estimated_cpu:.2f}s"
+              f"（需合成 {self.synth_samples / 1e6:.1f}M 聲部取樣點）")
+        print(f"  💾 預估渲染記憶體: {self.estimated_memory / (1024 * 1024):.1f}MB")
+
+
+class ProgramAnalyzer:
+    """乾跑分析器：編譯事件時間軸，依時間軸估計播放與渲染成本"""
+
+    def __init__(self, sample_rate=44100, sound_cache_bytes=None,
+                 synth_rate=SYNTH_SAMPLES_PER_SECOND, mix_rate=MIX_SAMPLES_PER_SECOND, block_size=BLOCK_SIZE):
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.sound_cache_bytes = sound_cache_bytes if sound_cache_bytes is not None else SoundCache().max_bytes
+        self.synth_rate = synth_rate
+        self.mix_rate = mix_rate
+
+    def analyze(self, ast):
+        """在虛擬時鐘上執行 AST 並分析，無效的 AST 回傳 None"""
+        start = time.perf_counter()
+        timeline = TimelineCompiler(self.sample_rate).compile(ast)
+        if timeline is None:
+            return None
+        report = self.analyze_timeline(timeline)
+        report.elapsed = time.perf_counter() - start
+        return report
+
+    def analyze_timeline(self, timeline):
+        """分析已編譯的事件時間軸"""
+        start = time.perf_counter()
+        events = timeline.events
+        sample_rate = timeline.sample_rate
+        peak, peak_at = self._peak_polyphony(events)
+        synth_samples, cache_bytes = self._synth_work(timeline)
+
+        # CPU：合成不重複的音符與片段，加上混音到主緩衝區
+        total = timeline.total_samples
+        notes = events[events['kind'] == EVENT_NOTE]
+        estimated_cpu = synth_samples / self.synth_rate + (int(notes['length'].sum()) + total) / self.mix_rate
+
+        # 記憶體（串流渲染）：事件陣列 + 一個 float64 混音區塊與 16-bit 立體聲輸出區塊
+        # + 同時保留的 float32 聲部波形與合成暫存 + 音效快取（有上限）
+        voice_bytes = self._peak_voice_bytes(timeline)
+        estimated_memory = (events.nbytes + self.block_size * (8 + 4) + voice_bytes
+                            + min(cache_bytes, self.sound_cache_bytes))
+
+        return AnalysisReport(
+            timeline.duration,
+            self._instrument_counts(timeline),
+            peak,
+            peak_at / sample_rate,
+            synth_samples,
+            estimated_cpu,
+            estimated_memory,
+            time.perf_counter() - start,
+        )
+
+    @staticmethod
+    def _instrument_counts(timeline):
+        """各樂器的音符數、休止符數與發聲總長（依首次出現順序）"""
+        events = timeline.events
+        counts = {}
+        instruments = events['instrument']
+        _, first = np.unique(instruments, return_index=True)
+        for instrument_id in instruments[np.sort(first)]:
+            mine = events[instruments == instrument_id]
+            notes = mine['kind'] == EVENT_NOTE
+            counts[timeline.instrument_name(instrument_id)] = {
+                'notes': int(np.count_nonzero(notes)),
+                'rests': int(np.count_nonzero(mine['kind'] == EVENT_REST)),
+                'sounding': float(mine['length'][notes].sum()) / timeline.sample_rate,
+            }
+        return counts
+
+    @staticmethod
+    def _peak_polyphony(events):
+        """最大同時發聲數與第一次達到的取樣點位置（同一位置先結束再開始）"""
+        notes = events[(events['kind'] == EVENT_NOTE) & (events['length'] > 0)]
+        if not len(notes):
+            return 0, 0
+        positions = np.concatenate((notes['start'], notes['start'] + notes['length']))
+        changes = np.concatenate((np.ones(len(notes), dtype=np.int64), -np.ones(len(notes), dtype=np.int64)))
+        order = np.lexsort((changes, positions))
+        active = np.cumsum(changes[order])
+        index = int(np.argmax(active))
+        return int(active[index]), int(positions[order][index])
+
+    def _peak_voice_bytes(self, timeline):
+        """stream_timeline 同時保留的聲部波形位元組數峰值：
+        聲部在起點所在的區塊合成（float32），到終點所在的區塊結束才釋放；
+        另加合成最長聲部時的 float64 暫存陣列"""
+        events = timeline.events
+        spans = [(int(segment['start']), int(segment['length'])) for segment in timeline.segments]
+        in_segment = timeline.segment_mask()
+        for begin, end in timeline.group_bounds(events, timeline.segment_breaks()):
+            first = events[begin]
+            if not in_segment[begin] and first['kind'] == EVENT_NOTE:
+                spans.append((int(first['start']), int(first['length'])))
+        spans = np.array([span for span in spans if span[1] > 0], dtype=np.int64).reshape(-1, 2)
+        if not len(spans):
+            return 0
+
+        block = self.block_size
+        starts, lengths = spans[:, 0], spans[:, 1]
+        acquire = starts // block
+        release = (starts + lengths - 1) // block + 1
+        positions = np.concatenate((acquire, release))
+        changes = np.concatenate((lengths, -lengths))
+        # 同一區塊先釋放再配置
+        order = np.lexsort((changes, positions))
+        peak = int(np.cumsum(changes[order]).max())
+        return peak * 4 + int(lengths.max()) * 8 * SYNTH_SCRATCH_ARRAYS
+
+    def _synth_work(self, timeline):
+        """需要合成的聲部取樣點數與快取會保存的位元組數：
+        確定性樂器的相同音符組與內容相同的片段只合成一次，與離線渲染器相同"""
+        events = timeline.events
+        seen = set()
+        synth_samples = 0
+        cache_bytes = 0
+
+        def add_group(group, instrument):
+            nonlocal synth_samples, cache_bytes
+            first = group[0]
+            length = int(first['length'])
+            if InstrumentSynthesizer.is_deterministic(instrument):
+                key = SoundCache.make_key(group['frequency'].tolist(), instrument, length, float(first['gain']))
+                if key in seen:
+                    return
+                seen.add(key)
+                cache_bytes += length * 4
+            synth_samples += length * len(group)
+
+        segments_seen = set()
+        for segment in timeline.segments:
+            if segment['id'] in segments_seen:
+                continue
+            segments_seen.add(segment['id'])
+            cache_bytes += int(segment['length']) * 4
+            inner = timeline.segment_events(segment)
+            for begin, end in timeline.group_bounds(inner):
+                group = inner[begin:end]
+                if group[0]['kind'] == EVENT_NOTE:
+                    add_group(group, timeline.instrument_name(group[0]['instrument']))
+
+        in_segment = timeline.segment_mask()
+        for begin, end in timeline.group_bounds(events, timeline.segment_breaks()):
+            if in_segment[begin] or events[begin]['kind'] != EVENT_NOTE:
+                continue
+            group = events[begin:end]
+            add_group(group, timeline.instrument_name(group[0]['instrument']))
+
+        return synth_samples, cache_bytes
+
+
+def analyze(ast, sample_rate=44100):
+    """乾跑分析 AST，回傳 AnalysisReport（無效的 AST 回傳 None）"""
+    return ProgramAnalyzer(sample_rate).analyze(ast)
@@ -4,116 +4,159 @@ audio_engine.py - 完整的多樂器音訊引擎 (支援休止符)
 支援10種樂器音色、多軌道演奏、動態樂器切換、休止符功能
 """
 
-import pygame
 import numpy as np
-import threading
 import time
 import math
-from collections import defaultdict
+
+from parser.ast_nodes import Node, Program, as_program
+
+from .additive import additive_synthesis
+from .backends import PCM_SCALE, open_backend
+from .compiler import ProgramCompiler
+from .recorder import RECORD_NOTE, RECORD_REST, EventRecorder
+from .sound_cache import SoundCache
+from .tracing import DEBUG, ERROR, INFO, WARNING, tracer
+from .wavetable import WavetableBank
+
+def wait_until(deadline, spin_threshold=0.002):
+    """等待到指定的 time.perf_counter 絕對期限
+    
+    距離期限較遠時使用 sleep，最後幾毫秒以忙碌等待補足精度
+    """
+    while True:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return
+        if remaining > spin_threshold:
+            time.sleep(remaining - spin_threshold)
+
 
 class InstrumentSynthesizer:
     """樂器合成器 - 為不同樂器生成不同音色"""
     
+    # 含隨機噪音的波形，每次合成結果都不同
+    NOISY_WAVEFORMS = {'noise', 'soft_percussion'}
+    
+    # 含 0.5 倍頻（低八度）成分的波形，週期為兩個基頻週期
+    WAVEFORM_CYCLES = {'soft_piano': 2, 'soft_cello': 2, 'soft_bass': 2, 'sine_rich': 2}
+    
+    # 撥弦類波形的指數衰減率
+    WAVEFORM_DECAY = {'plucked': 3, 'soft_plucked': 1.5}
+    
+    # 樂器音色配置 - 全面柔和化（類別層級，時間軸編譯與乾跑分析不必建立合成器也能查詢）
+    instrument_configs = {
+        'piano': {
+            'waveform': 'soft_piano',
+            'attack': 0.08,   # 更長的起音時間
+            'decay': 0.5,
+            'sustain': 0.5,   # 降低持續音量
+            'release': 1.0,   # 延長釋音
+            'harmonics': [1.0, 0.12, 0.04, 0.015, 0.008],  # 大幅減少泛音
+            'volume_scale': 0.6  # 整體音量縮放
+        },
+        'violin': {
+            'waveform': 'soft_violin',
+            'attack': 0.15,   # 更柔和的起音
+            'decay': 0.3,
+            'sustain': 0.65,  # 適中的持續音量
+            'release': 0.4,
+            'harmonics': [1.0, 0.25, 0.12, 0.06, 0.03],  # 減少尖銳泛音
+            'vibrato': {'rate': 4.5, 'depth': 0.015},  # 更輕微的顫音
+            'volume_scale': 0.5
+        },
+        'guitar': {
+            'waveform': 'soft_plucked',
+            'attack': 0.02,
+            'decay': 1.2,     # 更長的自然衰減
+            'sustain': 0.2,   # 較低的持續音量
+            'release': 1.5,
+            'harmonics': [1.0, 0.2, 0.08, 0.04, 0.02],
+            'volume_scale': 0.4
+        },
+        'drums': {
+            'waveform': 'soft_percussion',
+            'attack': 0.002,
+            'decay': 0.15,
+            'sustain': 0.0,
+            'release': 0.3,
+            'volume_scale': 0.3  # 鼓聲音量大幅降低
+        },
+        'flute': {
+            'waveform': 'soft_sine',
+            'attack': 0.08,   # 更柔和的起音
+            'decay': 0.15,
+            'sustain': 0.85,
+            'release': 0.3,
+            'harmonics': [1.0, 0.06, 0.02, 0.008],  # 非常純淨的音色
+            'breath': {'noise': 0.02},  # 減少氣息噪音
+            'volume_scale': 0.45
+        },
+        'trumpet': {
+            'waveform': 'soft_brass',
+            'attack': 0.08,
+            'decay': 0.2,
+            'sustain': 0.7,
+            'release': 0.3,
+            'harmonics': [1.0, 0.4, 0.2, 0.1, 0.05, 0.025],  # 減少尖銳感
+            'volume_scale': 0.5
+        },
+        'saxophone': {
+            'waveform': 'soft_reed',
+            'attack': 0.12,   # 更柔和的起音
+            'decay': 0.25,
+            'sustain': 0.75,
+            'release': 0.4,
+            'harmonics': [1.0, 0.35, 0.18, 0.08, 0.04],
+            'volume_scale': 0.55
+        },
+        'cello': {
+            'waveform': 'soft_cello',
+            'attack': 0.2,    # 非常柔和的起音
+            'decay': 0.4,
+            'sustain': 0.75,
+            'release': 0.6,
+            'harmonics': [1.0, 0.4, 0.2, 0.1, 0.05],
+            'vibrato': {'rate': 3.5, 'depth': 0.02},  # 溫暖的顫音
+            'volume_scale': 0.6
+        },
+        'bass': {
+            'waveform': 'soft_bass',
+            'attack': 0.05,
+            'decay': 0.6,
+            'sustain': 0.55,
+            'release': 1.0,
+            'harmonics': [1.0, 0.5, 0.15, 0.05, 0.02],
+            'volume_scale': 0.7  # 低音稍微響一些，但仍控制
+        },
+        'organ': {
+            'waveform': 'soft_organ',
+            'attack': 0.03,
+            'decay': 0.05,
+            'sustain': 0.8,
+            'release': 0.2,
+            'harmonics': [1.0, 0.25, 0.5, 0.15, 0.4, 0.1, 0.3],  # 柔和的管風琴音栓
+            'volume_scale': 0.4
+        }
+    }
+    
+    
     def __init__(self, sample_rate=44100):
         self.sample_rate = sample_rate
         
-        # 樂器音色配置 - 全面柔和化
-        self.instrument_configs = {
-            'piano': {
-                'waveform': 'soft_piano',
-                'attack': 0.08,   # 更長的起音時間
-                'decay': 0.5,
-                'sustain': 0.5,   # 降低持續音量
-                'release': 1.0,   # 延長釋音
-                'harmonics': [1.0, 0.12, 0.04, 0.015, 0.008],  # 大幅減少泛音
-                'volume_scale': 0.6  # 整體音量縮放
-            },
-            'violin': {
-                'waveform': 'soft_violin',
-                'attack': 0.15,   # 更柔和的起音
-                'decay': 0.3,
-                'sustain': 0.65,  # 適中的持續音量
-                'release': 0.4,
-                'harmonics': [1.0, 0.25, 0.12, 0.06, 0.03],  # 減少尖銳泛音
-                'vibrato': {'rate': 4.5, 'depth': 0.015},  # 更輕微的顫音
-                'volume_scale': 0.5
-            },
-            'guitar': {
-                'waveform': 'soft_plucked',
-                'attack': 0.02,
-                'decay': 1.2,     # 更長的自然衰減
-                'sustain': 0.2,   # 較低的持續音量
-                'release': 1.5,
-                'harmonics': [1.0, 0.2, 0.08, 0.04, 0.02],
-                'volume_scale': 0.4
-            },
-            'drums': {
-                'waveform': 'soft_percussion',
-                'attack': 0.002,
-                'decay': 0.15,
-                'sustain': 0.0,
-                'release': 0.3,
-                'volume_scale': 0.3  # 鼓聲音量大幅降低
-            },
-            'flute': {
-                'waveform': 'soft_sine',
-                'attack': 0.08,   # 更柔和的起音
-                'decay': 0.15,
-                'sustain': 0.85,
-                'release': 0.3,
-                'harmonics': [1.0, 0.06, 0.02, 0.008],  # 非常純淨的音色
-                'breath': {'noise': 0.02},  # 減少氣息噪音
-                'volume_scale': 0.45
-            },
-            'trumpet': {
-                'waveform': 'soft_brass',
-                'attack': 0.08,
-                'decay': 0.2,
-                'sustain': 0.7,
-                'release': 0.3,
-                'harmonics': [1.0, 0.4, 0.2, 0.1, 0.05, 0.025],  # 減少尖銳感
-                'volume_scale': 0.5
-            },
-            'saxophone': {
-                'waveform': 'soft_reed',
-                'attack': 0.12,   # 更柔和的起音
-                'decay': 0.25,
-                'sustain': 0.75,
-                'release': 0.4,
-                'harmonics': [1.0, 0.35, 0.18, 0.08, 0.04],
-                'volume_scale': 0.55
-            },
-            'cello': {
-                'waveform': 'soft_cello',
-                'attack': 0.2,    # 非常柔和的起音
-                'decay': 0.4,
-                'sustain': 0.75,
-                'release': 0.6,
-                'harmonics': [1.0, 0.4, 0.2, 0.1, 0.05],
-                'vibrato': {'rate': 3.5, 'depth': 0.02},  # 溫暖的顫音
-                'volume_scale': 0.6
-            },
-            'bass': {
-                'waveform': 'soft_bass',
-                'attack': 0.05,
-                'decay': 0.6,
-                'sustain': 0.55,
-                'release': 1.0,
-                'harmonics': [1.0, 0.5, 0.15, 0.05, 0.02],
-                'volume_scale': 0.7  # 低音稍微響一些，但仍控制
-            },
-            'organ': {
-                'waveform': 'soft_organ',
-                'attack': 0.03,
-                'decay': 0.05,
-                'sustain': 0.8,
-                'release': 0.2,
-                'harmonics': [1.0, 0.25, 0.5, 0.15, 0.4, 0.1, 0.3],  # 柔和的管風琴音栓
-                'volume_scale': 0.4
-            }
-        }
+        # 週期性波形的波表（依樂器延遲建立）
+        self.wavetables = WavetableBank(self)
+        
+        # 磁碟上的預先合成樣本庫（audio.sample_bank.SampleBank，未設定時每次即時合成）
+        self.sample_bank = None
     
-    def note_to_frequency(self, note):
+    @classmethod
+    def is_deterministic(cls, instrument):
+        """相同參數是否總是合成出相同波形（不含噪音成分）"""
+        config = cls.instrument_configs.get(instrument, cls.instrument_configs['piano'])
+        return config['waveform'] not in cls.NOISY_WAVEFORMS and 'breath' not in config
+    
+    @staticmethod
+    def note_to_frequency(note):
         """將音符轉換為頻率"""
         note_frequencies = {
             'C': 261.63, 'C#': 277.18, 'Db': 277.18,
@@ -139,76 +182,78 @@ class InstrumentSynthesizer:
         samples = int(self.sample_rate * duration)
         t = np.linspace(0, duration, samples, False)
         
-        # 生成基礎波形 - 新增柔和版本
-        if config['waveform'] == 'sine':
-            wave = np.sin(2 * np.pi * frequency * t)
-        elif config['waveform'] == 'soft_sine':
-            wave = self._generate_soft_sine_wave(frequency, t)
-        elif config['waveform'] == 'sawtooth':
-            wave = 2 * (t * frequency % 1) - 1
-        elif config['waveform'] == 'soft_violin':
-            wave = self._generate_soft_violin_wave(frequency, t)
-        elif config['waveform'] == 'soft_cello':
-            wave = self._generate_soft_cello_wave(frequency, t)
-        elif config['waveform'] == 'square':
-            wave = np.sign(np.sin(2 * np.pi * frequency * t))
-        elif config['waveform'] == 'triangle':
-            wave = 2 * np.arcsin(np.sin(2 * np.pi * frequency * t)) / np.pi
-        elif config['waveform'] == 'soft_piano':
-            wave = self._generate_soft_piano_wave(frequency, t)
-        elif config['waveform'] == 'complex_piano':
-            wave = self._generate_piano_wave(frequency, t)
-        elif config['waveform'] == 'plucked':
-            wave = self._generate_plucked_wave(frequency, t)
-        elif config['waveform'] == 'soft_plucked':
-            wave = self._generate_soft_plucked_wave(frequency, t)
-        elif config['waveform'] == 'noise':
-            wave = self._generate_drum_wave(frequency, t)
-        elif config['waveform'] == 'soft_percussion':
-            wave = self._generate_soft_percussion_wave(frequency, t)
-        elif config['waveform'] == 'brass':
-            wave = self._generate_brass_wave(frequency, t)
-        elif config['waveform'] == 'soft_brass':
-            wave = self._generate_soft_brass_wave(frequency, t)
-        elif config['waveform'] == 'reed':
-            wave = self._generate_reed_wave(frequency, t)
-        elif config['waveform'] == 'soft_reed':
-            wave = self._generate_soft_reed_wave(frequency, t)
-        elif config['waveform'] == 'sine_rich':
-            wave = self._generate_rich_sine_wave(frequency, t)
-        elif config['waveform'] == 'soft_bass':
-            wave = self._generate_soft_bass_wave(frequency, t)
-        elif config['waveform'] == 'organ':
-            wave = self._generate_organ_wave(frequency, t)
-        elif config['waveform'] == 'soft_organ':
-            wave = self._generate_soft_organ_wave(frequency, t)
-        else:
-            wave = np.sin(2 * np.pi * frequency * t)
-        
-        # 添加泛音 - 使用音量縮放
-        if 'harmonics' in config:
-            for i, amplitude in enumerate(config['harmonics'][1:], 2):
-                if amplitude > 0:
-                    # 進一步降低泛音強度，避免疊加破音
-                    harmonic_amplitude = amplitude * 0.3  # 大幅降低泛音
-                    harmonic = harmonic_amplitude * np.sin(2 * np.pi * frequency * i * t)
-                    wave += harmonic
-        
-        # 添加顫音 (vibrato) - 但強度降低
+        wave = self.generate_tone(frequency, samples, instrument, t)
+        self._add_breath(wave, config)
+        return self.apply_envelope(wave, instrument)
+    
+    def generate_chord(self, frequencies, duration, instrument):
+        """和弦波形：所有聲部的所有分音以一次加法合成計算，顫音、氣息與包絡只套用一次
+        
+        與逐音呼叫 generate_waveform 後相加的結果相同（差異只在波表內插誤差）；
+        含噪音的波形無法分解成分音，回傳 None
+        """
+        config = self.instrument_configs.get(instrument, self.instrument_configs['piano'])
+        table = self.wavetables.get(instrument)
+        if table is None:
+            return None
+        samples = int(self.sample_rate * duration)
+        
+        # 波表涵蓋 cycles 個基頻週期，分音以波表基頻（基頻 / cycles）的倍數表示
+        base = np.asarray(frequencies, dtype=np.float64) / table.cycles
+        (amplitudes, phases), harmonics = table.partials()
+        wave = additive_synthesis(base, amplitudes, samples, self.sample_rate, phases)
+        if table.decay:
+            # 衰減只作用在基礎波形，泛音另外合成後相加
+            t = np.linspace(0, duration, samples, False)
+            wave *= np.exp(-t * table.decay)
+            amplitudes, phases = harmonics
+            wave += additive_synthesis(base, amplitudes, samples, self.sample_rate, phases)
+        
+        self._apply_vibrato(wave, config, samples)
+        self._add_breath(wave, config, len(frequencies))
+        return self.apply_envelope(wave, instrument)
+    
+    def generate_tone(self, frequency, samples, instrument, t=None):
+        """生成尚未套用包絡的音色（基礎波形、泛音與顫音），前段與音符長度無關"""
+        config = self.instrument_configs.get(instrument, self.instrument_configs['piano'])
+        if t is None:
+            t = np.arange(samples) / self.sample_rate
+        
+        # 週期性成分（基礎波形與泛音）由波表讀取，只有含噪音的波形才逐點計算
+        wave = self.wavetables.render(instrument, frequency, samples, t)
+        if wave is None:
+            wave = self._generate_base_wave(config['waveform'], frequency, t)
+            wave += self._generate_harmonics(config, frequency, samples, self.sample_rate)
+        
+        self._apply_vibrato(wave, config, samples)
+        return wave
+    
+    def _apply_vibrato(self, wave, config, samples):
+        """添加顫音 (vibrato) - 但強度降低（就地修改 wave）"""
         if 'vibrato' in config:
             vibrato_rate = config['vibrato']['rate']
             vibrato_depth = config['vibrato']['depth'] * 0.7  # 降低顫音深度
-            vibrato = 1 + vibrato_depth * np.sin(2 * np.pi * vibrato_rate * t)
+            vibrato = self.wavetables.sine(vibrato_rate, samples)
+            vibrato *= vibrato_depth
+            vibrato += 1
             wave *= vibrato
+    
+    def _add_breath(self, wave, config, voices=1):
+        """添加氣息噪音 (用於管樂器) - 但強度降低（就地修改 wave）
         
-        # 添加氣息噪音 (用於管樂器) - 但強度降低
+        voices 個聲部各自獨立的常態噪音相加，等於標準差乘上 sqrt(voices) 的一個噪音
+        """
         if 'breath' in config:
             noise_level = config['breath']['noise'] * 0.5  # 降低噪音
-            breath_noise = noise_level * np.random.normal(0, 0.05, len(t))
+            breath_noise = noise_level * np.random.normal(0, 0.05 * math.sqrt(voices), len(wave))
             wave += breath_noise
+    
+    def apply_envelope(self, wave, instrument):
+        """套用音符長度的 ADSR 包絡與樂器音量縮放（就地修改並回傳 wave）"""
+        config = self.instrument_configs.get(instrument, self.instrument_configs['piano'])
         
         # 應用包絡
-        envelope = self._create_envelope(samples, config)
+        envelope = self._create_envelope(len(wave), config)
         wave *= envelope
         
         # 應用樂器特定的音量縮放，防止破音
@@ -217,6 +262,114 @@ class InstrumentSynthesizer:
         
         return wave
     
+    def _waveform(self, frequency, duration, instrument):
+        """音符波形：樣本庫有這個音高時切出並套用包絡，否則即時合成"""
+        if self.sample_bank is not None:
+            wave = self.sample_bank.render(frequency, duration, instrument)
+            if wave is not None:
+                return wave
+        return self.generate_waveform(frequency, duration, instrument)
+    
+    def _chord_waveform(self, frequencies, duration, instrument):
+        """和弦各聲部相加的波形：沒有樣本庫時整個和弦一次加法合成，
+        樣本庫的各聲部與含噪音的波形逐音取得後相加"""
+        if self.sample_bank is None:
+            wave = self.generate_chord(frequencies, duration, instrument)
+            if wave is not None:
+                return wave
+        
+        mix = self._waveform(frequencies[0], duration, instrument)
+        for frequency in frequencies[1:]:
+            mix += self._waveform(frequency, duration, instrument)
+        return mix
+    
+    def _generate_base_wave(self, waveform, frequency, t):
+        """生成基礎波形 - 新增柔和版本"""
+        if waveform == 'sine':
+            return np.sin(2 * np.pi * frequency * t)
+        elif waveform == 'soft_sine':
+            return self._generate_soft_sine_wave(frequency, t)
+        elif waveform == 'sawtooth':
+            return 2 * (t * frequency % 1) - 1
+        elif waveform == 'soft_violin':
+            return self._generate_soft_violin_wave(frequency, t)
+        elif waveform == 'soft_cello':
+            return self._generate_soft_cello_wave(frequency, t)
+        elif waveform == 'square':
+            return np.sign(np.sin(2 * np.pi * frequency * t))
+        elif waveform == 'triangle':
+            return 2 * np.arcsin(np.sin(2 * np.pi * frequency * t)) / np.pi
+        elif waveform == 'soft_piano':
+            return self._generate_soft_piano_wave(frequency, t)
+        elif waveform == 'complex_piano':
+            return self._generate_piano_wave(frequency, t)
+        elif waveform == 'plucked':
+            return self._generate_plucked_wave(frequency, t)
+        elif waveform == 'soft_plucked':
+            return self._generate_soft_plucked_wave(frequency, t)
+        elif waveform == 'noise':
+            return self._generate_drum_wave(frequency, t)
+        elif waveform == 'soft_percussion':
+            return self._generate_soft_percussion_wave(frequency, t)
+        elif waveform == 'brass':
+            return self._generate_brass_wave(frequency, t)
+        elif waveform == 'soft_brass':
+            return self._generate_soft_brass_wave(frequency, t)
+        elif waveform == 'reed':
+            return self._generate_reed_wave(frequency, t)
+        elif waveform == 'soft_reed':
+            return self._generate_soft_reed_wave(frequency, t)
+        elif waveform == 'sine_rich':
+            return self._generate_rich_sine_wave(frequency, t)
+        elif waveform == 'soft_bass':
+            return self._generate_soft_bass_wave(frequency, t)
+        elif waveform == 'organ':
+            return self._generate_organ_wave(frequency, t)
+        elif waveform == 'soft_organ':
+            return self._generate_soft_organ_wave(frequency, t)
+        return np.sin(2 * np.pi * frequency * t)
+    
+    def _generate_tone(self, waveform, frequency, t):
+        """生成基礎波形的週期性部分（撥弦類不含衰減）"""
+        if waveform == 'plucked':
+            return self._generate_plucked_tone(frequency, t)
+        if waveform == 'soft_plucked':
+            return self._generate_soft_plucked_tone(frequency, t)
+        return self._generate_base_wave(waveform, frequency, t)
+    
+    def _generate_harmonics(self, config, frequency, samples, sample_rate):
+        """生成設定中的泛音 - 使用音量縮放"""
+        if 'harmonics' not in config:
+            return np.zeros(samples)
+        
+        # 基音由基礎波形提供，這裡只加第 2 個以上的泛音
+        # 進一步降低泛音強度，避免疊加破音
+        amplitudes = np.array(config['harmonics'], dtype=np.float64) * 0.3  # 大幅降低泛音
+        amplitudes[0] = 0.0
+        return additive_synthesis(frequency, amplitudes, samples, sample_rate)
+    
+    def render_note(self, frequency, duration, instrument, gain):
+        """生成套用增益並限幅後的音符波形"""
+        wave = self._waveform(frequency, duration, instrument)
+        wave = wave * gain
+        
+        # 更嚴格的音量限制
+        return np.clip(wave, -0.8, 0.8)  # 限制在更安全的範圍
+    
+    def render_chord(self, frequencies, duration, instrument, gain):
+        """將和弦所有聲部相加成一個緩衝區，整體正規化而非逐聲部削波"""
+        if len(frequencies) == 1:
+            return self.render_note(frequencies[0], duration, instrument, gain)
+        
+        mix = self._chord_waveform(frequencies, duration, instrument)
+        mix *= gain
+        
+        # 整體縮放到安全範圍，保持各聲部的相對音量
+        peak = np.max(np.abs(mix)) if len(mix) else 0.0
+        if peak > 0.8:
+            mix *= 0.8 / peak
+        return mix
+    
     def _generate_soft_piano_wave(self, frequency, t):
         """生成柔和鋼琴音色"""
         # 主要使用正弦波，添加少量溫暖的泛音
@@ -265,13 +418,18 @@ class InstrumentSynthesizer:
     
     def _generate_soft_plucked_wave(self, frequency, t):
         """生成柔和撥弦音色 (吉他)"""
+        wave = self._generate_soft_plucked_tone(frequency, t)
+        # 柔和的指數衰減
+        decay = np.exp(-t * self.WAVEFORM_DECAY['soft_plucked'])
+        return wave * decay
+    
+    def _generate_soft_plucked_tone(self, frequency, t):
+        """柔和撥弦音色的週期性部分"""
         # 使用柔和的衰減曲線
         wave = np.sin(2 * np.pi * frequency * t)
         wave += 0.12 * np.sin(2 * np.pi * frequency * 2 * t)
         wave += 0.06 * np.sin(2 * np.pi * frequency * 3 * t)
-        # 柔和的指數衰減
-        decay = np.exp(-t * 1.5)
-        return wave * decay
+        return wave
     
     def _generate_soft_percussion_wave(self, frequency, t):
         """生成柔和打擊樂音色"""
@@ -327,10 +485,14 @@ class InstrumentSynthesizer:
     
     def _generate_plucked_wave(self, frequency, t):
         """生成撥弦音色 (吉他)"""
-        wave = 2 * (t * frequency % 1) - 1
-        decay = np.exp(-t * 3)
+        wave = self._generate_plucked_tone(frequency, t)
+        decay = np.exp(-t * self.WAVEFORM_DECAY['plucked'])
         return wave * decay
     
+    def _generate_plucked_tone(self, frequency, t):
+        """撥弦音色的週期性部分（鋸齒波）"""
+        return 2 * (t * frequency % 1) - 1
+    
     def _generate_drum_wave(self, frequency, t):
         """生成鼓聲"""
         noise = np.random.normal(0, 1, len(t))
@@ -410,51 +572,84 @@ class InstrumentSynthesizer:
 class AudioEngine:
     """完整的音訊引擎 - 支援多樂器、休止符和程式碼執行"""
     
-    def __init__(self):
-        # 初始化 pygame mixer
-        try:
-            pygame.mixer.pre_init(frequency=44100, size=-16, channels=2, buffer=512)
-            pygame.mixer.init()
-            print("🎵 pygame mixer 初始化成功")
-        except Exception as e:
-            print(f"❌ pygame mixer 初始化失敗: {e}")
-            return
+    def __init__(self, sound_cache=None, backend=None, warmup=False, sample_bank=None, events_csv=None):
+        # 開啟音訊輸出後端（預設 pygame，無音效裝置時改用 null 後端）
+        self.backend = self._open_backend(backend)
         
-        self.synthesizer = InstrumentSynthesizer()
+        self.synthesizer = InstrumentSynthesizer(self.backend.sample_rate)
         
-        # 音樂狀態
-        self.current_tempo = 120  # BPM
-        self.current_volume = 0.8
-        self.current_instrument = 'piano'
+        # 磁碟樣本庫（sample_bank 為目錄，空字串使用預設目錄）
+        if sample_bank is not None:
+            from .sample_bank import SampleBank
+            self.synthesizer.sample_bank = SampleBank(self.synthesizer, sample_bank or None)
+        
+        # 合成結果快取（確定性樂器的相同音符直接重用）
+        self.sound_cache = sound_cache if sound_cache is not None else SoundCache()
         
-        # 多軌道支援
-        self.tracks = defaultdict(list)
+        # 音樂狀態與變數
+        self._init_music_state()
+        
+        # 演奏記錄（欄式、有上限）
+        self.recorder = EventRecorder()
         self.active_sounds = []
         
-        # 變數存儲
-        self.variables = {}
+        # 輸出時間軸上的目前位置（取樣點），非即時後端依此放置聲音
+        self.cursor = 0
+        
+        # 串流後端使用的區塊混音器（第一次串流時建立）
+        self._stream_renderer = None
+        
+        # 播放前是否先平行合成所有不重複的聲音
+        self.warmup = warmup
+        
+        # 每次執行後將演奏記錄（含每個起奏的預定與實際時間）寫出為 CSV
+        self.events_csv = events_csv
         
         print("🎵 多樂器音訊引擎初始化完成（支援休止符）")
         print(f"📀 支援樂器: {', '.join(self.synthesizer.instrument_configs.keys())}")
         print("🔇 支援休止符功能")
     
+    def _init_music_state(self):
+        """音樂狀態與變數的初始值"""
+        self.current_tempo = 120  # BPM
+        self.current_volume = 0.8
+        self.current_instrument = 'piano'
+        
+        # 變數存儲
+        self.variables = {}
+    
+    def _open_backend(self, backend):
+        """開啟音訊輸出後端"""
+        return open_backend(backend)
+    
+    def _hold(self, started, duration):
+        """推進輸出位置；即時後端等到音符或休止符結束（以起點計算絕對期限，合成時間不會累加）"""
+        self.cursor += int(self.synthesizer.sample_rate * duration)
+        if self.backend.realtime:
+            wait_until(started + duration)
+    
     def set_tempo(self, bpm):
         """設定速度"""
         self.current_tempo = bpm
-        print(f"🎼 設定速度: {bpm} BPM")
+        if tracer.info:
+            tracer.emit(INFO, 'tempo', f"🎼 設定速度: {bpm} BPM", bpm=bpm)
     
     def set_volume(self, volume):
         """設定音量"""
         self.current_volume = max(0.0, min(1.0, volume))
-        print(f"🔊 設定音量: {self.current_volume:.1f}")
+        if tracer.info:
+            tracer.emit(INFO, 'volume', f"🔊 設定音量: {self.current_volume:.1f}", volume=self.current_volume)
     
     def set_instrument(self, instrument):
         """設定樂器"""
         if instrument in self.synthesizer.instrument_configs:
             self.current_instrument = instrument
-            print(f"🎹 切換樂器: {instrument}")
+            if tracer.info:
+                tracer.emit(INFO, 'instrument', f"🎹 切換樂器: {instrument}", instrument=instrument)
         else:
-            print(f"⚠️  未知樂器: {instrument}，使用預設樂器 piano")
+            if tracer.warning:
+                tracer.emit(WARNING, 'unknown_instrument', f"⚠️  未知樂器: {instrument}，使用預設樂器 piano",
+                            instrument=instrument)
             self.current_instrument = 'piano'
     
     def play_note(self, note, duration=None):
@@ -465,436 +660,240 @@ class AudioEngine:
         self._play_single_note(note, duration)
     
     def play_chord(self, notes, duration=None):
-        """播放和弦"""
+        """播放和弦 - 所有聲部合成為單一緩衝區，以一個 Sound 播放"""
         if duration is None:
             duration = 60.0 / self.current_tempo * 2
         
-        print(f"🎹 播放和弦 ({self.current_instrument}): [{', '.join(notes)}], 時長: {duration:.1f}s")
-        
-        # 同時播放所有音符
-        threads = []
-        for note in notes:
-            thread = threading.Thread(target=self._play_single_note, args=(note, duration))
-            threads.append(thread)
-            thread.start()
+        started = time.perf_counter()
+        if tracer.debug:
+            tracer.emit(DEBUG, 'chord', f"🎹 播放和弦 ({self.current_instrument}): [{', '.join(notes)}], 時長: {duration:.1f}s",
+                        notes=list(notes), duration=duration, instrument=self.current_instrument)
         
-        # 等待所有音符播放完成
-        for thread in threads:
-            thread.join()
+        try:
+            sound = self._get_sound(
+                [self.synthesizer.note_to_frequency(note) for note in notes],
+                duration,
+                self.current_instrument,
+                self.effective_volume()
+            )
+            if sound is None:
+                return
+            
+            self.backend.play(sound, self.cursor)
+            
+            # 記錄到演奏記錄
+            scheduled = self.cursor / self.synthesizer.sample_rate
+            actual = scheduled + (time.perf_counter() - started)
+            for note in notes:
+                self.recorder.record(RECORD_NOTE, self.current_instrument, note, duration, scheduled, actual)
+            
+            # 等待播放完成
+            self._hold(started, duration)
+            
+        except Exception as e:
+            if tracer.error:
+                tracer.emit(ERROR, 'chord_error', f"❌ 播放和弦時發生錯誤: {e}", notes=list(notes), error=repr(e))
     
     def play_rest(self, duration):
         """播放休止符 - 靜默指定時間"""
-        print(f"🔇 休止符: {duration:.1f}s")
+        started = time.perf_counter()
+        if tracer.debug:
+            tracer.emit(DEBUG, 'rest', f"🔇 休止符: {duration:.1f}s", duration=duration)
         
-        # 記錄休止符到軌道
-        self.tracks[self.current_instrument].append({
-            'type': 'rest',
-            'duration': duration,
-            'timestamp': time.time()
-        })
+        # 記錄休止符
+        self.recorder.record(RECORD_REST, self.current_instrument, None, duration,
+                             self.cursor / self.synthesizer.sample_rate)
         
         # 靜默等待
-        time.sleep(duration)
+        self._hold(started, duration)
     
     def _play_single_note(self, note_str, duration):
         """播放單個音符 - 修復版本，防止破音"""
+        started = time.perf_counter()
         try:
-            print(f"♪ 播放音符 ({self.current_instrument}): {note_str}, 時長: {duration:.1f}s")
+            if tracer.debug:
+                tracer.emit(DEBUG, 'note', f"♪ 播放音符 ({self.current_instrument}): {note_str}, 時長: {duration:.1f}s",
+                            note=note_str, duration=duration, instrument=self.current_instrument)
             
-            # 生成波形
-            wave = self.synthesizer.generate_waveform(
-                self.synthesizer.note_to_frequency(note_str),
+            sound = self._get_sound(
+                [self.synthesizer.note_to_frequency(note_str)],
                 duration,
-                self.current_instrument
+                self.current_instrument,
+                self.effective_volume()
             )
-            
-            # 應用用戶設定的音量，但限制最大值防止破音
-            effective_volume = min(self.current_volume * 0.4, 0.6)  # 大幅降低音量上限
-            wave = wave * effective_volume
-            
-            # 更嚴格的音量限制
-            wave = np.clip(wave, -0.8, 0.8)  # 限制在更安全的範圍
-            
-            # 轉換為 pygame 可用的格式，使用較小的範圍
-            wave_int = (wave * 20000).astype(np.int16)  # 進一步降低音量範圍
-            
-            # 檢查 pygame mixer 設定
-            mixer_init = pygame.mixer.get_init()
-            if mixer_init is None:
-                print("❌ pygame mixer 未正確初始化")
+            if sound is None:
                 return
             
-            # 兼容不同版本的 pygame - 支援3或4個返回值
-            if len(mixer_init) == 4:
-                frequency, format_val, channels, buffer = mixer_init
-            elif len(mixer_init) == 3:
-                frequency, format_val, channels = mixer_init
-            else:
-                print(f"❌ 未知的 mixer 初始化格式: {mixer_init}")
-                channels = 2  # 預設立體聲
-            
-            # 根據聲道數處理音訊
-            if channels == 2:
-                # 立體聲：使用 column_stack 創建立體聲陣列
-                stereo_wave = np.column_stack((wave_int, wave_int))
-                sound = pygame.sndarray.make_sound(stereo_wave)
-            else:
-                # 單聲道
-                sound = pygame.sndarray.make_sound(wave_int)
-            
             # 播放音效
-            sound.play()
+            self.backend.play(sound, self.cursor)
             
-            # 記錄到對應軌道
-            self.tracks[self.current_instrument].append({
-                'type': 'note',
-                'note': note_str,
-                'duration': duration,
-                'timestamp': time.time()
-            })
+            # 記錄到演奏記錄
+            scheduled = self.cursor / self.synthesizer.sample_rate
+            self.recorder.record(RECORD_NOTE, self.current_instrument, note_str, duration,
+                                 scheduled, scheduled + (time.perf_counter() - started))
             
             # 等待播放完成
-            time.sleep(duration)
+            self._hold(started, duration)
             
         except Exception as e:
-            print(f"❌ 播放音符時發生錯誤: {e}")
-            import traceback
-            print("詳細錯誤資訊：")
-            traceback.print_exc()
+            if tracer.error:
+                # 完整的堆疊只寫進事件欄位（JSONL），主控台只顯示一行
+                import traceback
+                tracer.emit(ERROR, 'note_error', f"❌ 播放音符時發生錯誤: {e}",
+                            note=note_str, error=repr(e), traceback=traceback.format_exc())
+    
+    def _get_sound(self, frequencies, duration, instrument, gain):
+        """取得音符或和弦的可播放物件（由後端建立），確定性樂器優先從快取取得"""
+        key = self._sound_key(frequencies, duration, instrument, gain)
+        sound = self._cached_sound(key)
+        if sound is not None:
+            return sound
+        return self._store_sound(key, self._render_pcm(frequencies, duration, instrument, gain))
+    
+    def _get_segment_sound(self, timeline, segment):
+        """取得時間軸片段（重複呼叫的函式）整段混音後的可播放物件，內容相同的片段只合成一次"""
+        key = timeline.segment_key(segment)
+        sound = self._cached_sound(key)
+        if sound is not None:
+            return sound
+        return self._store_sound(key, self._render_segment_pcm(timeline, segment))
+    
+    def _sound_key(self, frequencies, duration, instrument, gain):
+        """音符或和弦的快取鍵，含噪音成分的樂器不快取（回傳 None）"""
+        if not self.synthesizer.is_deterministic(instrument):
+            return None
+        length = int(self.synthesizer.sample_rate * duration)
+        return SoundCache.make_key(frequencies, instrument, length, gain)
+    
+    def _cached_sound(self, key):
+        """從快取取得可播放物件，沒有時回傳 None"""
+        if key is None:
+            return None
+        entry = self.sound_cache.get(key)
+        if entry is None:
+            return None
+        if entry.sound is None:
+            self.sound_cache.attach_sound(key, self.backend.make_sound(entry.buffer))
+        return entry.sound
+    
+    def _store_sound(self, key, pcm):
+        """由 PCM 建立可播放物件，key 不為 None 時放入快取"""
+        if pcm is None:
+            return None
+        sound = self.backend.make_sound(pcm)
+        if key is not None:
+            self.sound_cache.put(key, pcm, sound)
+        return sound
+    
+    def _render_pcm(self, frequencies, duration, instrument, gain):
+        """合成音符或和弦的 PCM（只做運算，不存取快取與後端，可在工作執行緒執行）"""
+        wave = self.synthesizer.render_chord(frequencies, duration, instrument, gain)
+        return self._to_pcm(wave)
+    
+    def _render_segment_pcm(self, timeline, segment):
+        """合成片段整段混音的 PCM（只做運算，可在工作執行緒執行）"""
+        sample_rate = self.synthesizer.sample_rate
+        
+        def render_group(frequencies, length, instrument, gain):
+            return self.synthesizer.render_chord(frequencies, length / sample_rate, instrument, gain)[:length]
+        
+        mix = timeline.mix_segment(segment, render_group)
+        # 片段內的音符可能重疊，先限幅再轉換，避免 int16 溢位
+        return self._to_pcm(np.clip(mix, -32768 / PCM_SCALE, 32767 / PCM_SCALE))
+    
+    def _to_pcm(self, wave):
+        """將浮點波形轉換為符合後端聲道數的 int16 陣列"""
+        # 轉換為整數格式，使用較小的範圍
+        wave_int = (wave * PCM_SCALE).astype(np.int16)  # 進一步降低音量範圍
+        
+        # 立體聲：使用 column_stack 創建立體聲陣列
+        if self.backend.channels == 2:
+            return np.column_stack((wave_int, wave_int))
+        
+        # 單聲道
+        return wave_int
+    
+    def effective_volume(self):
+        """應用用戶設定的音量，但限制最大值防止破音"""
+        return min(self.current_volume * 0.4, 0.6)  # 大幅降低音量上限
     
     def execute(self, ast):
-        """執行 AST"""
-        if not isinstance(ast, dict):
+        """執行 AST（節點物件或舊版 dict AST）"""
+        ast = as_program(ast)
+        if ast is None:
             print("❌ 無效的 AST")
             return
         
-        program_body = ast.get('body', [])
+        # 延遲導入，避免與 timeline/sequencer 模組循環導入
+        from .timeline import TimelineCompiler
+        from .sequencer import Sequencer
+        
+        program_body = ast.body
         
         print("🎵 開始執行音樂程式...")
         print(f"📊 程式包含 {len(program_body)} 個語句")
         
-        for i, stmt in enumerate(program_body, 1):
-            print(f"\n--- 執行語句 {i}/{len(program_body)} ---")
-            self._execute_node(stmt)
+        # 先編譯成事件時間軸，再依絕對期限播放
+        compiler = TimelineCompiler(self.synthesizer.sample_rate)
+        compiler.load_state(self)
+        timeline = compiler.compile(ast)
+        self.load_state(compiler)
+        
+        print(f"\n▶️  開始播放 {len(timeline)} 個事件（總長 {timeline.duration:.1f}s）")
+        sequencer = Sequencer(self)
+        if self.warmup and not self.backend.streaming:
+            sequencer.warmup(timeline)
+        if self.backend.streaming:
+            report = sequencer.stream(timeline)
+        else:
+            report = sequencer.play(timeline)
         
         print("\n🎵 音樂程式執行完成！")
         self._show_track_summary()
+        self.sound_cache.show_stats()
+        if self.synthesizer.sample_bank is not None:
+            self.synthesizer.sample_bank.show_stats()
+        self.backend.flush()
+        report.show()
+        if self.events_csv:
+            count = self.recorder.to_csv(self.events_csv)
+            print(f"📝 已寫出 {count} 筆演奏記錄（預定／實際起奏時間）: {self.events_csv}")
+    
+    def stream_renderer(self):
+        """串流後端使用的區塊混音器（保留在引擎上，互動模式下重複執行時沿用它的快取）"""
+        if self._stream_renderer is None:
+            from .offline_renderer import OfflineRenderer
+            self._stream_renderer = OfflineRenderer(self.synthesizer.sample_rate)
+            self._stream_renderer.synthesizer.sample_bank = self.synthesizer.sample_bank
+        return self._stream_renderer
+    
+    def load_state(self, other):
+        """從另一個引擎複製速度、音量、樂器與變數狀態"""
+        self.current_tempo = other.current_tempo
+        self.current_volume = other.current_volume
+        self.current_instrument = other.current_instrument
+        self.variables = other.variables
     
     def _execute_node(self, node):
-        """執行 AST 節點"""
-        if not isinstance(node, dict):
+        """執行單一 AST 節點（編譯成只含此語句的程式後執行）"""
+        if not isinstance(node, Node):
             return
-        
-        node_type = node.get('type', '')
-        
-        if node_type == 'tempo':
-            bpm = self._get_value(node.get('bpm', {}), 120)
-            self.set_tempo(bpm)
-        
-        elif node_type == 'volume':
-            volume = self._get_value(node.get('volume', {}), 0.8)
-            self.set_volume(volume)
-        
-        elif node_type == 'instrument':
-            instrument_node = node.get('instrument', {})
-            instrument_name = instrument_node.get('name', 'piano')
-            self.set_instrument(instrument_name)
-        
-        elif node_type == 'note':
-            self._play_note(node)
-        
-        elif node_type == 'chord':
-            self._play_chord(node)
-        
-        elif node_type == 'rest':
-            self._play_rest_node(node)
-        
-        elif node_type == 'loop':
-            count = int(self._get_value(node.get('count', {}), 1))
-            body = node.get('body', [])
-            
-            print(f"🔄 迴圈 {count} 次")
-            for i in range(count):
-                print(f"   第 {i+1}/{count} 次迴圈")
-                for stmt in body:
-                    self._execute_node(stmt)
-        
-        elif node_type == 'while':
-            condition = node.get('condition', {})
-            body = node.get('body', [])
-            
-            print("🔄 while 迴圈開始")
-            loop_count = 0
-            max_iterations = 1000
-            
-            while self._evaluate_condition(condition) and loop_count < max_iterations:
-                loop_count += 1
-                print(f"   第 {loop_count} 次迴圈")
-                for stmt in body:
-                    self._execute_node(stmt)
-            
-            if loop_count >= max_iterations:
-                print("⚠️  迴圈達到最大次數限制，自動終止")
-            
-            print("🔄 while 迴圈結束")
-        
-        elif node_type == 'for':
-            variable = node.get('variable', {})
-            range_expr = node.get('range', {})
-            body = node.get('body', [])
-            
-            var_name = self._get_name(variable)
-            start_val = int(self._get_value(range_expr.get('start', {}), 0))
-            end_val = int(self._get_value(range_expr.get('end', {}), 0))
-            
-            print(f"🔄 for 迴圈開始 ({var_name}: {start_val} 到 {end_val})")
-            
-            for i in range(start_val, end_val):
-                self.variables[var_name] = i
-                print(f"   第 {i+1}/{end_val-start_val} 次，{var_name} = {i}")
-                
-                for stmt in body:
-                    self._execute_node(stmt)
-            
-            print("🔄 for 迴圈結束")
-        
-        elif node_type == 'if':
-            condition = node.get('condition', {})
-            then_body = node.get('then_body', [])
-            elseif_clauses = node.get('elseif_clauses', [])
-            else_body = node.get('else_body', [])
-            
-            if self._evaluate_condition(condition):
-                print("✅ if 條件成立")
-                for stmt in then_body:
-                    self._execute_node(stmt)
-            else:
-                executed = False
-                for elseif_clause in elseif_clauses:
-                    elseif_condition = elseif_clause.get('condition', {})
-                    if self._evaluate_condition(elseif_condition):
-                        print("✅ elseif 條件成立")
-                        for stmt in elseif_clause.get('body', []):
-                            self._execute_node(stmt)
-                        executed = True
-                        break
-                
-                if not executed and else_body:
-                    print("✅ 執行 else 分支")
-                    for stmt in else_body:
-                        self._execute_node(stmt)
-        
-        elif node_type == 'assign':
-            var_node = node.get('var', {})
-            value_node = node.get('value', {})
-            
-            var_name = self._get_name(var_node)
-            value = self._get_value(value_node, 0)
-            
-            self.variables[var_name] = value
-            print(f"📝 設定變數: {var_name} = {value}")
-        
-        elif node_type == 'function_def':
-            name_node = node.get('name', {})
-            func_name = self._get_name(name_node)
-            params = node.get('params', [])
-            body = node.get('body', [])
-            
-            self.variables[func_name] = {
-                'type': 'function',
-                'params': params,
-                'body': body
-            }
-            print(f"📋 定義函式: {func_name}")
-        
-        elif node_type == 'function_call':
-            name_node = node.get('name', {})
-            func_name = self._get_name(name_node)
-            args = node.get('args', [])
-            
-            if func_name in self.variables:
-                func_def = self.variables[func_name]
-                if isinstance(func_def, dict) and func_def.get('type') == 'function':
-                    print(f"🎯 呼叫函式: {func_name}")
-                    for stmt in func_def.get('body', []):
-                        self._execute_node(stmt)
-        
-        elif node_type == 'ref_call':
-            name_node = node.get('name', {})
-            func_name = self._get_name(name_node)
-            args = node.get('args', [])
-            
-            print(f"🔧 呼叫 ref 函式: {func_name}")
-            
-            if func_name == 'refVolume':
-                if args:
-                    volume = self._get_value(args[0], 0.8)
-                    self.set_volume(volume)
-            
-            elif func_name == 'refTempo':
-                if args:
-                    tempo = self._get_value(args[0], 120)
-                    self.set_tempo(tempo)
-            
-            elif func_name == 'refInst':
-                if args:
-                    instrument = self._get_name(args[0])
-                    self.set_instrument(instrument)
-    
-    def _play_note(self, node):
-        """播放音符或音符陣列"""
-        note_value = node.get('note_value', {})
-        duration_node = node.get('duration')
-        
-        if duration_node:
-            duration = self._get_value(duration_node, 1.0)
-        else:
-            duration = 60.0 / self.current_tempo
-        
-        if note_value.get('type') == 'note_array':
-            notes = note_value.get('notes', [])
-            print(f"🎵 播放音符陣列 ({self.current_instrument}): ", end='')
-            for note in notes:
-                note_str = self._get_note_string(note)
-                print(f"{note_str} ", end='')
-                self._play_single_note(note_str, duration)
-            print()
-        else:
-            note_str = self._get_note_string(note_value)
-            self._play_single_note(note_str, duration)
-    
-    def _play_chord(self, node):
-        """播放和弦"""
-        chord_node = node.get('chord', {})
-        duration_node = node.get('duration')
-        
-        if duration_node:
-            duration = self._get_value(duration_node, 2.0)
-        else:
-            duration = 60.0 / self.current_tempo * 2
-        
-        notes = chord_node.get('notes', [])
-        chord_notes = [self._get_note_string(note) for note in notes]
-        
-        self.play_chord(chord_notes, duration)
-    
-    def _play_rest_node(self, node):
-        """播放休止符節點"""
-        duration_node = node.get('duration', {})
-        duration = self._get_value(duration_node, 1.0)
-        self.play_rest(duration)
-    
-    def _get_note_string(self, note_node):
-        """從節點獲取音符字符串"""
-        if isinstance(note_node, dict):
-            return note_node.get('value', 'C4')
-        else:
-            return str(note_node)
-    
-    def _get_value(self, node, default=0):
-        """從節點獲取數值"""
-        if not isinstance(node, dict):
-            return default
-        
-        node_type = node.get('type', '')
-        
-        if node_type == 'number':
-            return node.get('value', default)
-        elif node_type == 'identifier':
-            var_name = node.get('name', '')
-            return self.variables.get(var_name, default)
-        elif node_type == 'binop':
-            left = self._get_value(node.get('left', {}), 0)
-            right = self._get_value(node.get('right', {}), 0)
-            op = node.get('op', '+')
-            
-            if op == '+':
-                return left + right
-            elif op == '-':
-                return left - right
-            elif op == '*':
-                return left * right
-            elif op == '/':
-                return left / right if right != 0 else left
-        
-        return default
-    
-    def _get_name(self, node):
-        """從節點獲取名稱"""
-        if isinstance(node, dict):
-            return node.get('name', '')
-        else:
-            return str(node)
-    
-    def _evaluate_condition(self, condition):
-        """評估條件表達式"""
-        if not isinstance(condition, dict):
-            return False
-        
-        cond_type = condition.get('type', '')
-        
-        if cond_type == 'comparison':
-            left = self._get_value(condition.get('left', {}), 0)
-            right = self._get_value(condition.get('right', {}), 0)
-            op = condition.get('op', '==')
-            
-            if op == '==':
-                return left == right
-            elif op == '!=':
-                return left != right
-            elif op == '<':
-                return left < right
-            elif op == '>':
-                return left > right
-            elif op == '<=':
-                return left <= right
-            elif op == '>=':
-                return left >= right
-        
-        elif cond_type == 'logical_op':
-            left_result = self._evaluate_condition(condition.get('left', {}))
-            right_result = self._evaluate_condition(condition.get('right', {}))
-            op = condition.get('op', 'and')
-            
-            if op == 'and':
-                return left_result and right_result
-            elif op == 'or':
-                return left_result or right_result
-        
-        elif cond_type == 'unary_op':
-            operand_result = self._evaluate_condition(condition.get('operand', {}))
-            op = condition.get('op', 'not')
-            
-            if op == 'not':
-                return not operand_result
-        
-        elif cond_type == 'number':
-            return condition.get('value', 0) != 0
-        
-        elif cond_type == 'identifier':
-            var_name = condition.get('name', '')
-            return self.variables.get(var_name, 0) != 0
-        
-        return False
+        ProgramCompiler(self).compile(Program([node])).run()
     
     def _show_track_summary(self):
         """顯示軌道摘要"""
-        if not self.tracks:
+        if not self.recorder:
             return
         
         print("\n📊 演奏摘要:")
-        for instrument, events in self.tracks.items():
-            note_count = len([e for e in events if e.get('type') == 'note'])
-            rest_count = len([e for e in events if e.get('type') == 'rest'])
+        for instrument, (note_count, rest_count) in self.recorder.counts().items():
             print(f"  🎹 {instrument}: {note_count} 個音符, {rest_count} 個休止符")
         
-        total_notes = sum(len([e for e in events if e.get('type') == 'note']) for events in self.tracks.values())
-        total_rests = sum(len([e for e in events if e.get('type') == 'rest']) for events in self.tracks.values())
-        print(f"  🎵 總計: {total_notes} 個音符, {total_rests} 個休止符")
+        print(f"  🎵 總計: {self.recorder.note_count} 個音符, {self.recorder.rest_count} 個休止符")
     
     def stop(self):
         """停止所有播放"""
-        pygame.mixer.stop()
+        self.backend.stop()
         print("⏹️  停止播放")
     
     def get_supported_instruments(self):
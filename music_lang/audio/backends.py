@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+backends.py - 可抽換的音訊輸出後端
+引擎只負責合成 16-bit PCM，實際輸出交給後端：pygame 即時播放、寫出 WAV 檔、
+原始 PCM 串流到 stdout，或直接丟棄（無音效裝置的容器與效能測試用）
+"""
+
+import math
+import sys
+import time
+import wave
+from collections import deque
+
+import numpy as np
+
+from .tracing import WARNING, tracer
+
+# 浮點波形轉換為 16-bit PCM 的比例（與 AudioEngine._to_pcm 相同）
+PCM_SCALE = 20000
+
+# 串流輸出預設先渲染好的音訊長度（秒）
+STREAM_LOOKAHEAD = 0.4
+
+
+def write_pcm_wav(path, pcm, sample_rate=44100, channels=2):
+    """將 int16 PCM 陣列寫成 WAV 檔"""
+    with wave.open(str(path), 'wb') as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(np.ascontiguousarray(pcm, dtype='<i2').tobytes())
+
+
+class WavStreamWriter:
+    """逐區塊寫出 16-bit PCM WAV 檔，不需要把整首音訊放在記憶體中
+
+    標頭中的長度在 close() 時補上
+    """
+
+    def __init__(self, path, sample_rate=44100, channels=2):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.frames = 0
+        self._stream = open(path, 'wb')
+        self._file = wave.open(self._stream, 'wb')
+        self._file.setnchannels(channels)
+        self._file.setsampwidth(2)
+        self._file.setframerate(sample_rate)
+
+    def write(self, pcm):
+        """寫出一個 int16 PCM 區塊（形狀為 (取樣點, 聲道)）"""
+        self._file.writeframesraw(np.ascontiguousarray(pcm, dtype='<i2').tobytes())
+        self.frames += len(pcm)
+
+    def flush(self):
+        """把已寫出的區塊送到磁碟（標頭長度仍待 close() 補上）"""
+        self._stream.flush()
+
+    def close(self):
+        self._file.close()
+        self._stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class AudioBackend:
+    """音訊輸出後端介面
+
+    play(sound, start_sample) 的 start_sample 是輸出時間軸上的取樣點位置；
+    即時後端忽略它並立即發聲，非即時後端依它把聲音放到正確位置
+    """
+
+    name = 'base'
+    realtime = False   # True 時引擎需要依實際時間等待音符結束
+    streaming = False  # True 時引擎改以 stream() 輸出整段時間軸的混音區塊
+
+    def __init__(self, sample_rate=44100, channels=2):
+        self.sample_rate = sample_rate
+        self.channels = channels
+
+    def open(self):
+        """開啟輸出裝置，成功時回傳 True"""
+        return True
+
+    def make_sound(self, pcm):
+        """將 PCM 陣列轉換為後端可播放的物件（預設直接使用陣列）"""
+        return pcm
+
+    def play(self, sound, start_sample):
+        """在指定位置輸出聲音"""
+        raise NotImplementedError
+
+    def stop(self):
+        """停止所有正在輸出的聲音"""
+        pass
+
+    def flush(self):
+        """輸出所有尚未寫出的資料"""
+        pass
+
+    def close(self):
+        """關閉後端"""
+        self.flush()
+
+
+class PygameBackend(AudioBackend):
+    """pygame mixer 即時播放"""
+
+    name = 'pygame'
+    realtime = True
+
+    def __init__(self, sample_rate=44100, channels=2, buffer=512):
+        super().__init__(sample_rate, channels)
+        self.buffer = buffer
+
+    def open(self):
+        """初始化 pygame mixer"""
+        try:
+            import pygame
+            pygame.mixer.pre_init(frequency=self.sample_rate, size=-16,
+                                  channels=self.channels, buffer=self.buffer)
+            pygame.mixer.init()
+        except Exception as e:
+            print(f"❌ pygame mixer 初始化失敗: {e}")
+            return False
+
+        # 實際的取樣率與聲道數以 mixer 回報為準
+        mixer_init = pygame.mixer.get_init()
+        if mixer_init is None:
+            print("❌ pygame mixer 未正確初始化")
+            return False
+        self.sample_rate, _, self.channels = mixer_init[:3]
+        self._pygame = pygame
+        print("🎵 pygame mixer 初始化成功")
+        return True
+
+    def make_sound(self, pcm):
+        return self._pygame.sndarray.make_sound(pcm)
+
+    def play(self, sound, start_sample):
+        sound.play()
+
+    def stop(self):
+        self._pygame.mixer.stop()
+
+
+class PygameStreamBackend(PygameBackend):
+    """pygame 連續串流播放：整段時間軸預先逐區塊混音，輪流送進保留的單一 Channel
+
+    正在播放與排隊中的兩個區塊交替（Channel.queue），另外保持 lookahead 秒已渲染好的區塊，
+    區塊之間沒有間隙，也不會因為同時發聲的音符太多而用光 channel；
+    排隊的區塊在上一個播完前沒有送到時記為欠載（underrun）
+    """
+
+    name = 'stream'
+    streaming = True
+
+    def __init__(self, sample_rate=44100, channels=2, buffer=512, lookahead=STREAM_LOOKAHEAD):
+        super().__init__(sample_rate, channels, buffer)
+        self.lookahead = lookahead  # 預先渲染的音訊長度（秒）
+        self.underruns = 0
+        self._channel = None
+
+    def open(self):
+        if not super().open():
+            return False
+        self._pygame.mixer.set_reserved(1)
+        self._channel = self._pygame.mixer.Channel(0)
+        return True
+
+    def stream(self, blocks, block_size):
+        """依序播放 PCM 區塊直到全部播完，回傳（播放的區塊數, 欠載次數）"""
+        channel = self._channel
+        block_seconds = block_size / self.sample_rate
+        depth = max(1, math.ceil(self.lookahead / block_seconds))
+        blocks = iter(blocks)
+        pending = deque()
+        exhausted = False
+        played = 0
+        underruns = 0
+
+        def render_ahead():
+            nonlocal exhausted
+            pcm = next(blocks, None)
+            if pcm is None:
+                exhausted = True
+            else:
+                pending.append(self.make_sound(pcm))
+
+        # 開始前先填滿預先渲染的區塊
+        while not exhausted and len(pending) < depth:
+            render_ahead()
+
+        while pending or not exhausted:
+            if not pending:
+                render_ahead()
+            elif not channel.get_busy():
+                # 播放中與排隊中的區塊都已播完：輸出出現間隙
+                if played:
+                    underruns += 1
+                    if tracer.warning:
+                        tracer.emit(WARNING, 'underrun', f"⚠️  串流欠載: 第 {played} 個區塊後輸出中斷",
+                                    block=played, lookahead=self.lookahead)
+                channel.play(pending.popleft())
+                played += 1
+            elif channel.get_queue() is None:
+                channel.queue(pending.popleft())
+                played += 1
+            elif not exhausted and len(pending) < depth:
+                render_ahead()
+            else:
+                time.sleep(block_seconds / 4)
+
+        while channel.get_busy():
+            time.sleep(block_seconds / 4)
+
+        self.underruns += underruns
+        return played, underruns
+
+    def stop(self):
+        if self._channel is not None:
+            self._channel.stop()
+        super().stop()
+
+
+class _MixingBackend(AudioBackend):
+    """非即時後端的共用混音緩衝區：依 start_sample 疊加到 int32 緩衝區"""
+
+    def __init__(self, sample_rate=44100, channels=2):
+        super().__init__(sample_rate, channels)
+        self._mix = np.zeros((0, channels), dtype=np.int32)
+        self._offset = 0  # _mix[0] 在輸出時間軸上的位置
+        self._end = 0     # _mix 中已寫入資料的長度
+
+    def _as_frames(self, pcm):
+        pcm = np.asarray(pcm)
+        if pcm.ndim == 1:
+            pcm = pcm[:, None]
+        if pcm.shape[1] != self.channels:
+            pcm = np.repeat(pcm[:, :1], self.channels, axis=1)
+        return pcm
+
+    def play(self, sound, start_sample):
+        frames = self._as_frames(sound)
+        begin = max(int(start_sample) - self._offset, 0)
+        end = begin + len(frames)
+        if end > len(self._mix):
+            grown = np.zeros((max(end, len(self._mix) * 2), self.channels), dtype=np.int32)
+            grown[:len(self._mix)] = self._mix
+            self._mix = grown
+        self._mix[begin:end] += frames
+        self._end = max(self._end, end)
+
+    def _take(self, upto=None):
+        """取出 upto 之前（預設全部）已完成混音的資料，轉換為 int16"""
+        end = self._end
+        count = end if upto is None else min(max(int(upto) - self._offset, 0), end)
+        pcm = np.clip(self._mix[:count], -32768, 32767).astype('<i2')
+        self._mix = self._mix[count:].copy()
+        self._end = end - count
+        self._offset += count
+        return pcm
+
+
+class WavFileBackend(_MixingBackend):
+    """將輸出混音後寫成 WAV 檔
+
+    標頭只在第一次寫出時建立，之後的混音區塊直接附加到檔尾，close() 時補上 RIFF/data 長度
+    """
+
+    name = 'wav'
+
+    def __init__(self, path, sample_rate=44100, channels=2):
+        super().__init__(sample_rate, channels)
+        self.path = path
+        self._writer = None
+
+    def flush(self):
+        """附加目前為止已完成混音的資料"""
+        pcm = self._take()
+        if not len(pcm):
+            return
+        if self._writer is None:
+            self._writer = WavStreamWriter(self.path, self.sample_rate, self.channels)
+        self._writer.write(pcm)
+        self._writer.flush()
+        print(f"💾 已寫出 {self.path}: {self._writer.frames / self.sample_rate:.1f}s 音訊")
+
+    def close(self):
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class RawPCMBackend(_MixingBackend):
+    """將 16-bit little-endian 交錯 PCM 串流輸出（預設為 stdout）
+
+    輸出到 stdout 時，文字訊息會改印到 stderr，避免混入音訊資料；close() 時恢復 sys.stdout
+    """
+
+    name = 'raw'
+
+    def __init__(self, stream=None, sample_rate=44100, channels=2):
+        super().__init__(sample_rate, channels)
+        self.stream = stream
+        self._stdout = None  # 改印到 stderr 前的 sys.stdout
+
+    def open(self):
+        if self.stream is None:
+            self._stdout = sys.stdout
+            self.stream = sys.stdout.buffer
+            sys.stdout = sys.stderr
+        return True
+
+    def play(self, sound, start_sample):
+        # 之後的聲音不會早於 start_sample，之前的資料已混音完成，可以先寫出
+        self._write(self._take(start_sample))
+        super().play(sound, start_sample)
+
+    def _write(self, pcm):
+        if len(pcm):
+            self.stream.write(pcm.tobytes())
+
+    def flush(self):
+        self._write(self._take())
+        self.stream.flush()
+
+    def close(self):
+        self.flush()
+        if self._stdout is not None:
+            sys.stdout = self._stdout
+            self._stdout = None
+        elif self.stream is not sys.__stdout__.buffer:
+            self.stream.close()
+
+
+class NullBackend(AudioBackend):
+    """丟棄所有輸出，以最高速度執行（用於無音效裝置環境與效能測試）"""
+
+    name = 'null'
+
+    def __init__(self, sample_rate=44100, channels=2):
+        super().__init__(sample_rate, channels)
+        self.sounds_played = 0
+
+    def play(self, sound, start_sample):
+        self.sounds_played += 1
+
+
+BACKENDS = ('pygame', 'stream', 'wav', 'raw', 'null')
+
+
+def create_backend(name='pygame', output=None, sample_rate=44100, channels=2, lookahead=STREAM_LOOKAHEAD):
+    """依名稱建立後端；wav 需要輸出路徑，raw 未指定路徑（或為 '-'）時輸出到 stdout，
+    stream 以 lookahead（秒）設定預先渲染的長度"""
+    if name == 'pygame':
+        return PygameBackend(sample_rate, channels)
+    if name == 'stream':
+        return PygameStreamBackend(sample_rate, channels, lookahead=lookahead)
+    if name == 'wav':
+        if not output:
+            raise ValueError("wav 後端需要指定輸出檔案")
+        return WavFileBackend(output, sample_rate, channels)
+    if name == 'raw':
+        stream = None if output in (None, '-') else open(output, 'wb')
+        return RawPCMBackend(stream, sample_rate, channels)
+    if name == 'null':
+        return NullBackend(sample_rate, channels)
+    raise ValueError(f"未知的音訊後端: {name}（可用: {', '.join(BACKENDS)}）")
+
+
+def open_backend(backend=None):
+    """開啟後端（預設 pygame），開啟失敗時改用 NullBackend，引擎仍可正常執行"""
+    if backend is None:
+        backend = PygameBackend()
+    if backend.open():
+        return backend
+
+    print(f"⚠️  無法開啟 {backend.name} 音訊後端，改用 null 後端（不輸出聲音）")
+    fallback = NullBackend(backend.sample_rate, backend.channels)
+    fallback.open()
+    return fallback
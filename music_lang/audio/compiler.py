@@ -0,0 +1,733 @@
+#!/usr/bin/env python3
+"""
+compiler.py - 編譯式直譯器
+主程式與每個函式主體各編譯成一段扁平的指令串列（迴圈與條件化為跳躍），表達式編譯為閉包；
+執行時以明確的呼叫框堆疊在單一迴圈中推進，不經過 Python 遞迴，深度遞迴的生成式程式
+不會觸發 RecursionError。函式參數與迴圈計數器是呼叫框內依槽位編號存取的區域變數，
+全域變數同樣解析為槽位編號，存取速度不隨變數數量變慢
+"""
+
+import operator
+
+from parser.ast_nodes import Node, NodeKind, as_program
+from parser.optimizer import TEMP_PREFIX
+
+from .tracing import DEBUG, INFO, WARNING, tracer
+
+# 尚未賦值的變數槽位
+UNSET = object()
+
+# 函式呼叫深度上限（超過時略過呼叫，避免無窮遞迴耗盡記憶體）
+MAX_CALL_DEPTH = 10000
+
+# while 迴圈的最大次數
+MAX_WHILE_ITERATIONS = 1000
+
+# 指令回傳此值表示切換到堆疊頂端的呼叫框
+SWITCH = -1
+
+_ARITHMETIC = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+}
+
+_COMPARISON = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '>': operator.gt,
+    '<=': operator.le,
+    '>=': operator.ge,
+}
+
+
+class SlotTable:
+    """變數名稱 -> 槽位編號"""
+
+    def __init__(self):
+        self.slots = {}
+
+    def slot(self, name):
+        index = self.slots.get(name)
+        if index is None:
+            index = self.slots[name] = len(self.slots)
+        return index
+
+    @property
+    def names(self):
+        return list(self.slots)
+
+    def __len__(self):
+        return len(self.slots)
+
+
+class Label:
+    """跳躍目標，連結時換成指令位置"""
+
+    __slots__ = ('pc',)
+
+    def __init__(self):
+        self.pc = None
+
+
+class CodeUnit:
+    """一段編譯後的指令：主程式或一個函式主體
+
+    參數佔用前幾個區域變數槽位，之後是迴圈計數器等隱藏槽位；
+    每個指令是 ins(frame, pc) -> 下一個指令位置
+    """
+
+    def __init__(self, name, params=()):
+        self.name = name
+        self.scope = {}
+        for param in params:
+            self.scope.setdefault(param, len(self.scope))
+        self.nlocals = len(self.scope)
+        self.pure = False
+        self.code = []
+
+    def local(self):
+        """配置一個隱藏的區域變數槽位"""
+        index = self.nlocals
+        self.nlocals += 1
+        return index
+
+    def emit(self, factory, *operands):
+        """加入指令，factory(*operands) 在連結時建立指令閉包（Label 換成指令位置）"""
+        self.code.append((factory, operands))
+
+    def mark(self, label):
+        label.pc = len(self.code)
+
+    def link(self):
+        """解析跳躍目標，建立指令閉包"""
+        self.code = [
+            factory(*(operand.pc if isinstance(operand, Label) else operand for operand in operands))
+            for factory, operands in self.code
+        ]
+
+
+class Frame:
+    """呼叫框：執行位置與區域變數"""
+
+    __slots__ = ('unit', 'pc', 'locals', 'segment')
+
+    def __init__(self, unit, args=()):
+        self.unit = unit
+        self.pc = 0
+        # 引數依序綁定到參數，缺少的參數讀取時取預設值，多餘的引數忽略
+        bound = list(args[:len(unit.scope)])
+        self.locals = bound + [UNSET] * (unit.nlocals - len(bound))
+        self.segment = False  # 返回時需要結束時間軸片段的記錄
+
+
+class CompiledProgram:
+    """編譯完成的程式，可重複執行"""
+
+    def __init__(self, engine, main, slots, env, stack):
+        self.engine = engine
+        self.main = main
+        self.slots = slots
+        self.env = env
+        self.stack = stack
+
+    def run(self):
+        """以引擎目前的變數執行程式，結束後把變數寫回引擎"""
+        engine = self.engine
+        variables = engine.variables
+        self.env[:] = [variables.get(name, UNSET) for name in self.slots.names]
+        end_segment = getattr(engine, 'end_segment', None)
+
+        stack = self.stack
+        stack[:] = [Frame(self.main)]
+        try:
+            while stack:
+                frame = stack[-1]
+                code = frame.unit.code
+                end = len(code)
+                pc = frame.pc
+                while 0 <= pc < end:
+                    pc = code[pc](frame, pc)
+                if pc == SWITCH:
+                    # 呼叫指令已保存返回位置並推入新的呼叫框
+                    continue
+
+                stack.pop()
+                if frame.segment:
+                    end_segment()
+        finally:
+            stack.clear()
+            # 執行中才編譯的函式可能新增了槽位，重新取得名稱
+            # 最佳化器提出的暫存變數只屬於這次執行，不寫回（互動模式下也不會累積）
+            for name, value in zip(self.slots.names, self.env):
+                if value is not UNSET and not name.startswith(TEMP_PREFIX):
+                    variables[name] = value
+
+
+# === 指令工廠 ===
+
+def _step(action):
+    """執行 action(frame) 後繼續下一個指令"""
+    def ins(frame, pc):
+        action(frame)
+        return pc + 1
+    return ins
+
+
+def _jump(target):
+    def ins(frame, pc):
+        return target
+    return ins
+
+
+def _debug(event, message):
+    """只記錄固定除錯訊息的動作"""
+    def action(frame):
+        if tracer.debug:
+            tracer.emit(DEBUG, event, message)
+    return action
+
+
+class ProgramCompiler:
+    """AST -> 指令串列編譯器，指令直接呼叫引擎的播放與狀態方法"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.slots = SlotTable()
+        self.env = []
+        self.stack = []
+        self._functions = {}
+        # 時間軸編譯器可以把只依賴引數與進入狀態的主體記錄為可重用片段
+        self._begin_segment = getattr(engine, 'begin_segment', None)
+        self._end_segment = getattr(engine, 'end_segment', None)
+
+    def compile(self, ast):
+        """編譯整個程式，無效的 AST 回傳 None"""
+        program = as_program(ast)
+        if program is None:
+            return None
+        main = CodeUnit('<main>')
+        self.compile_block(program.body, main)
+        main.link()
+        return CompiledProgram(self.engine, main, self.slots, self.env, self.stack)
+
+    def compile_block(self, statements, unit):
+        for node in statements or []:
+            self.compile_statement(node, unit)
+
+    def function_unit(self, statements, params):
+        """取得函式主體的指令（依主體串列快取，先前程式定義的函式在第一次呼叫時編譯）"""
+        entry = self._functions.get(id(statements))
+        if entry is None:
+            unit = CodeUnit('<function>', [self._name(param) for param in params or []])
+            # 先登記再編譯，遞迴呼叫自己時取得同一個 unit；同時保存主體串列，避免 id 被重複使用
+            entry = self._functions[id(statements)] = (statements, unit)
+            self.compile_block(statements, unit)
+            unit.link()
+            unit.pure = self._pure_block(statements, set(unit.scope))
+
+            # 執行中編譯的主體可能用到新的全域變數，補上槽位
+            variables = self.engine.variables
+            self.env.extend(variables.get(name, UNSET) for name in self.slots.names[len(self.env):])
+        return entry[1]
+
+    # === 變數存取 ===
+
+    def _reader(self, name, unit, default):
+        """讀取變數的閉包：參數讀取呼叫框的區域變數，其他名稱讀取全域變數"""
+        index = unit.scope.get(name)
+        if index is not None:
+            def load_local(frame):
+                value = frame.locals[index]
+                return default if value is UNSET else value
+            return load_local
+
+        env = self.env
+        slot = self.slots.slot(name)
+
+        def load_global(frame):
+            value = env[slot]
+            return default if value is UNSET else value
+        return load_global
+
+    def _writer(self, name, unit):
+        """寫入變數的閉包"""
+        index = unit.scope.get(name)
+        if index is not None:
+            def store_local(frame, value):
+                frame.locals[index] = value
+            return store_local
+
+        env = self.env
+        slot = self.slots.slot(name)
+
+        def store_global(frame, value):
+            env[slot] = value
+        return store_global
+
+    # === 語句 ===
+
+    def compile_statement(self, node, unit):
+        """編譯單一語句，將指令加入 unit"""
+        if not isinstance(node, Node):
+            return
+        method = getattr(self, f"_compile_{node.kind.type_name}", None)
+        if method:
+            method(node, unit)
+
+    def _compile_tempo(self, node, unit):
+        engine = self.engine
+        bpm = self.compile_value(node.bpm, unit, 120)
+        unit.emit(_step, lambda frame: engine.set_tempo(bpm(frame)))
+
+    def _compile_volume(self, node, unit):
+        engine = self.engine
+        volume = self.compile_value(node.volume, unit, 0.8)
+        unit.emit(_step, lambda frame: engine.set_volume(volume(frame)))
+
+    def _compile_instrument(self, node, unit):
+        engine = self.engine
+        name = node.instrument.name if node.instrument else 'piano'
+        unit.emit(_step, lambda frame: engine.set_instrument(name))
+
+    def _duration(self, duration_node, unit, default, beats):
+        """音符長度：有指定時取值，否則依執行當下的速度計算"""
+        engine = self.engine
+        if duration_node:
+            return self.compile_value(duration_node, unit, default)
+        return lambda frame: 60.0 / engine.current_tempo * beats
+
+    def _compile_note(self, node, unit):
+        engine = self.engine
+        duration = self._duration(node.duration, unit, 1.0, 1)
+        note_value = node.note_value
+
+        if note_value.kind == NodeKind.NOTE_ARRAY:
+            notes = [self._note_string(note) for note in note_value.notes]
+
+            def play_array(frame):
+                length = duration(frame)
+                if tracer.debug:
+                    tracer.emit(DEBUG, 'note_array',
+                                f"🎵 播放音符陣列 ({engine.current_instrument}): {' '.join(notes)}",
+                                notes=notes, duration=length, instrument=engine.current_instrument)
+                for note_str in notes:
+                    engine._play_single_note(note_str, length)
+            unit.emit(_step, play_array)
+            return
+
+        note_str = self._note_string(note_value)
+        unit.emit(_step, lambda frame: engine._play_single_note(note_str, duration(frame)))
+
+    def _compile_chord(self, node, unit):
+        engine = self.engine
+        duration = self._duration(node.duration, unit, 2.0, 2)
+        notes = [self._note_string(note) for note in node.chord.notes]
+        unit.emit(_step, lambda frame: engine.play_chord(notes, duration(frame)))
+
+    def _compile_rest(self, node, unit):
+        engine = self.engine
+        duration = self.compile_value(node.duration, unit, 1.0)
+        unit.emit(_step, lambda frame: engine.play_rest(duration(frame)))
+
+    def _compile_loop(self, node, unit):
+        count = self.compile_value(node.count, unit, 1)
+        counter = unit.local()
+        total = unit.local()
+        top = Label()
+        done = Label()
+
+        def loop_init(frame):
+            times = int(count(frame))
+            if tracer.debug:
+                tracer.emit(DEBUG, 'loop', f"🔄 迴圈 {times} 次", times=times)
+            frame.locals[total] = times
+            frame.locals[counter] = 0
+
+        def loop_test(target):
+            def ins(frame, pc):
+                local = frame.locals
+                i = local[counter]
+                if i < local[total]:
+                    local[counter] = i + 1
+                    if tracer.debug:
+                        tracer.emit(DEBUG, 'iteration', f"   第 {i+1}/{local[total]} 次迴圈", index=i)
+                    return pc + 1
+                return target
+            return ins
+
+        unit.emit(_step, loop_init)
+        unit.mark(top)
+        unit.emit(loop_test, done)
+        self._loop_body(node.body, unit, top)
+        unit.emit(_jump, top)
+        unit.mark(done)
+
+    def _loop_body(self, statements, unit, top):
+        """迴圈主體；主體不讀寫變數時，每次迭代的輸出只取決於進入狀態，
+        時間軸編譯器只執行一次，之後的迭代直接重用同一個片段"""
+        if self._begin_segment is None or not self._pure_block(statements, ()):
+            self.compile_block(statements, unit)
+            return
+
+        begin_segment = self._begin_segment
+        end_segment = self._end_segment
+        key = (id(statements), ())
+
+        def segment_begin(target):
+            def ins(frame, pc):
+                # 片段已記錄過時直接回到迴圈條件
+                return target if begin_segment(key) else pc + 1
+            return ins
+
+        unit.emit(segment_begin, top)
+        self.compile_block(statements, unit)
+        unit.emit(_step, lambda frame: end_segment())
+
+    def _compile_while(self, node, unit):
+        condition = self.compile_condition(node.condition, unit)
+        counter = unit.local()
+        top = Label()
+        done = Label()
+
+        def while_init(frame):
+            if tracer.debug:
+                tracer.emit(DEBUG, 'while', "🔄 while 迴圈開始")
+            frame.locals[counter] = 0
+
+        def while_test(target):
+            def ins(frame, pc):
+                local = frame.locals
+                if condition(frame) and local[counter] < MAX_WHILE_ITERATIONS:
+                    local[counter] += 1
+                    if tracer.debug:
+                        tracer.emit(DEBUG, 'iteration', f"   第 {local[counter]} 次迴圈", index=local[counter] - 1)
+                    return pc + 1
+                return target
+            return ins
+
+        def while_end(frame):
+            if frame.locals[counter] >= MAX_WHILE_ITERATIONS and tracer.warning:
+                tracer.emit(WARNING, 'while_limit', "⚠️  迴圈達到最大次數限制，自動終止",
+                            limit=MAX_WHILE_ITERATIONS)
+            if tracer.debug:
+                tracer.emit(DEBUG, 'while_end', "🔄 while 迴圈結束", iterations=frame.locals[counter])
+
+        unit.emit(_step, while_init)
+        unit.mark(top)
+        unit.emit(while_test, done)
+        self.compile_block(node.body, unit)
+        unit.emit(_jump, top)
+        unit.mark(done)
+        unit.emit(_step, while_end)
+
+    def _compile_for(self, node, unit):
+        var_name = self._name(node.variable)
+        store = self._writer(var_name, unit)
+        start = self.compile_value(node.range.start, unit, 0)
+        end = self.compile_value(node.range.end, unit, 0)
+        index = unit.local()
+        stop = unit.local()
+        span = unit.local()
+        top = Label()
+        done = Label()
+
+        def for_init(frame):
+            start_val = int(start(frame))
+            end_val = int(end(frame))
+            if tracer.debug:
+                tracer.emit(DEBUG, 'for', f"🔄 for 迴圈開始 ({var_name}: {start_val} 到 {end_val})",
+                            variable=var_name, start=start_val, end=end_val)
+            local = frame.locals
+            local[index] = start_val
+            local[stop] = end_val
+            local[span] = end_val - start_val
+
+        def for_test(target):
+            def ins(frame, pc):
+                local = frame.locals
+                i = local[index]
+                if i < local[stop]:
+                    store(frame, i)
+                    local[index] = i + 1
+                    if tracer.debug:
+                        tracer.emit(DEBUG, 'iteration', f"   第 {i+1}/{local[span]} 次，{var_name} = {i}",
+                                    index=i, variable=var_name)
+                    return pc + 1
+                return target
+            return ins
+
+        unit.emit(_step, for_init)
+        unit.mark(top)
+        unit.emit(for_test, done)
+        # 主體不讀取迴圈變數時同樣可以重用片段
+        self._loop_body(node.body, unit, top)
+        unit.emit(_jump, top)
+        unit.mark(done)
+        unit.emit(_step, _debug('for_end', "🔄 for 迴圈結束"))
+
+    def _compile_if(self, node, unit):
+        branches = [(node.condition, node.then_body, "✅ if 條件成立")]
+        branches += [(clause.condition, clause.body, "✅ elseif 條件成立") for clause in node.elseif_clauses]
+        done = Label()
+
+        def branch_test(condition, message):
+            def factory(target):
+                def ins(frame, pc):
+                    if condition(frame):
+                        if tracer.debug:
+                            tracer.emit(DEBUG, 'branch', message)
+                        return pc + 1
+                    return target
+                return ins
+            return factory
+
+        for condition, body, message in branches:
+            following = Label()
+            unit.emit(branch_test(self.compile_condition(condition, unit), message), following)
+            self.compile_block(body, unit)
+            unit.emit(_jump, done)
+            unit.mark(following)
+
+        if node.else_body:
+            unit.emit(_step, _debug('branch', "✅ 執行 else 分支"))
+            self.compile_block(node.else_body, unit)
+        unit.mark(done)
+
+    def _compile_assign(self, node, unit):
+        var_name = self._name(node.var)
+        store = self._writer(var_name, unit)
+        value = self.compile_value(node.value, unit, 0)
+
+        def assign(frame):
+            result = value(frame)
+            store(frame, result)
+            if tracer.debug:
+                tracer.emit(DEBUG, 'assign', f"📝 設定變數: {var_name} = {result}", variable=var_name, value=result)
+        unit.emit(_step, assign)
+
+    def _compile_function_def(self, node, unit):
+        func_name = self._name(node.name)
+        store = self._writer(func_name, unit)
+        self.function_unit(node.body, node.params)
+
+        def define(frame):
+            # 函式值維持 dict 形式，引擎之間可以互相傳遞
+            store(frame, {
+                'type': 'function',
+                'params': node.params,
+                'body': node.body
+            })
+            if tracer.info:
+                tracer.emit(INFO, 'function_def', f"📋 定義函式: {func_name}", function=func_name)
+        unit.emit(_step, define)
+
+    def _compile_function_call(self, node, unit):
+        func_name = self._name(node.name)
+        load = self._reader(func_name, unit, None)
+        args = [self.compile_value(arg, unit, 0) for arg in node.args or []]
+        stack = self.stack
+        begin_segment = self._begin_segment
+
+        def call(frame, pc):
+            func_def = load(frame)
+            if not (isinstance(func_def, dict) and func_def.get('type') == 'function'):
+                return pc + 1
+
+            if tracer.debug:
+                tracer.emit(DEBUG, 'call', f"🎯 呼叫函式: {func_name}", function=func_name, depth=len(stack))
+            statements = func_def.get('body', [])
+            callee = self.function_unit(statements, func_def.get('params'))
+            values = [arg(frame) for arg in args]
+
+            if len(stack) >= MAX_CALL_DEPTH:
+                if tracer.warning:
+                    tracer.emit(WARNING, 'call_depth', f"⚠️  函式呼叫深度超過 {MAX_CALL_DEPTH} 層，略過呼叫: {func_name}",
+                                function=func_name, limit=MAX_CALL_DEPTH)
+                return pc + 1
+
+            segment = False
+            if begin_segment is not None and callee.pure and \
+                    all(isinstance(value, (int, float)) for value in values):
+                if begin_segment((id(statements), tuple(values))):
+                    return pc + 1
+                segment = True
+
+            # 保存返回位置，推入新的呼叫框
+            frame.pc = pc + 1
+            callee_frame = Frame(callee, values)
+            callee_frame.segment = segment
+            stack.append(callee_frame)
+            return SWITCH
+        unit.emit(lambda: call)
+
+    def _compile_ref_call(self, node, unit):
+        engine = self.engine
+        func_name = self._name(node.name)
+        args = node.args
+
+        if func_name == 'refVolume' and args:
+            value = self.compile_value(args[0], unit, 0.8)
+            action = lambda frame: engine.set_volume(value(frame))
+        elif func_name == 'refTempo' and args:
+            value = self.compile_value(args[0], unit, 120)
+            action = lambda frame: engine.set_tempo(value(frame))
+        elif func_name == 'refInst' and args:
+            instrument = self._name(args[0])
+            action = lambda frame: engine.set_instrument(instrument)
+        else:
+            action = None
+
+        def ref_call(frame):
+            if tracer.debug:
+                tracer.emit(DEBUG, 'ref_call', f"🔧 呼叫 ref 函式: {func_name}", function=func_name)
+            if action is not None:
+                action(frame)
+        unit.emit(_step, ref_call)
+
+    # === 純度分析 ===
+
+    def _pure_block(self, statements, params):
+        """主體是否只依賴參數與進入時的速度、音量、樂器：
+        只讀寫參數、不讀寫全域變數、不呼叫其他函式，結果可以依（主體, 引數, 進入狀態）重用"""
+        for node in statements or []:
+            if not isinstance(node, Node):
+                continue
+            kind = node.kind
+            if kind in (NodeKind.NOTE, NodeKind.CHORD, NodeKind.INSTRUMENT):
+                if self._reads(node.get('duration'), params):
+                    return False
+            elif kind == NodeKind.REST:
+                if self._reads(node.duration, params):
+                    return False
+            elif kind in (NodeKind.TEMPO, NodeKind.VOLUME):
+                if self._reads(node.bpm if kind == NodeKind.TEMPO else node.volume, params):
+                    return False
+            elif kind == NodeKind.REF_CALL:
+                # refInst 的引數是樂器名稱，不是變數讀取
+                if self._name(node.name) != 'refInst' and any(self._reads(arg, params) for arg in node.args):
+                    return False
+            elif kind == NodeKind.ASSIGN:
+                if self._name(node.var) not in params or self._reads(node.value, params):
+                    return False
+            elif kind == NodeKind.LOOP:
+                if self._reads(node.count, params) or not self._pure_block(node.body, params):
+                    return False
+            elif kind == NodeKind.FOR:
+                if self._name(node.variable) not in params or \
+                        self._reads(node.range.start, params) or self._reads(node.range.end, params) or \
+                        not self._pure_block(node.body, params):
+                    return False
+            elif kind == NodeKind.WHILE:
+                if self._reads(node.condition, params) or not self._pure_block(node.body, params):
+                    return False
+            elif kind == NodeKind.IF:
+                clauses = [(node.condition, node.then_body)]
+                clauses += [(clause.condition, clause.body) for clause in node.elseif_clauses]
+                clauses.append((None, node.else_body or []))
+                for condition, body in clauses:
+                    if self._reads(condition, params) or not self._pure_block(body, params):
+                        return False
+            else:
+                # 函式定義與呼叫取決於執行當下的全域變數
+                return False
+        return True
+
+    def _reads(self, node, params):
+        """表達式是否讀取參數以外的變數"""
+        if not isinstance(node, Node):
+            return False
+        kind = node.kind
+        if kind == NodeKind.IDENTIFIER:
+            return node.name not in params
+        if kind in (NodeKind.BINOP, NodeKind.COMPARISON, NodeKind.LOGICAL_OP):
+            return self._reads(node.left, params) or self._reads(node.right, params)
+        if kind == NodeKind.UNARY_OP:
+            return self._reads(node.operand, params)
+        return False
+
+    # === 表達式 ===
+
+    def compile_value(self, node, unit, default=0):
+        """編譯數值表達式，回傳 f(frame) 閉包；無法求值的節點回傳 default"""
+        if not isinstance(node, Node):
+            return lambda frame: default
+
+        kind = node.kind
+        if kind == NodeKind.NUMBER:
+            value = node.value
+            return lambda frame: value
+
+        if kind == NodeKind.IDENTIFIER:
+            return self._reader(node.name, unit, default)
+
+        if kind == NodeKind.BINOP:
+            left = self.compile_value(node.left, unit, 0)
+            right = self.compile_value(node.right, unit, 0)
+            if node.op == '/':
+                def divide(frame):
+                    numerator = left(frame)
+                    denominator = right(frame)
+                    return numerator / denominator if denominator != 0 else numerator
+                return divide
+
+            op = _ARITHMETIC.get(node.op)
+            if op is None:
+                return lambda frame: default
+            return lambda frame: op(left(frame), right(frame))
+
+        return lambda frame: default
+
+    def compile_condition(self, node, unit):
+        """編譯條件表達式，回傳 f(frame) 閉包"""
+        if not isinstance(node, Node):
+            return lambda frame: False
+
+        kind = node.kind
+        if kind == NodeKind.COMPARISON:
+            op = _COMPARISON.get(node.op)
+            if op is None:
+                return lambda frame: False
+            left = self.compile_value(node.left, unit, 0)
+            right = self.compile_value(node.right, unit, 0)
+            return lambda frame: op(left(frame), right(frame))
+
+        if kind == NodeKind.LOGICAL_OP:
+            left = self.compile_condition(node.left, unit)
+            right = self.compile_condition(node.right, unit)
+            if node.op == 'and':
+                return lambda frame: left(frame) and right(frame)
+            if node.op == 'or':
+                return lambda frame: left(frame) or right(frame)
+            return lambda frame: False
+
+        if kind == NodeKind.UNARY_OP:
+            operand = self.compile_condition(node.operand, unit)
+            if node.op == 'not':
+                return lambda frame: not operand(frame)
+            return lambda frame: False
+
+        if kind == NodeKind.NUMBER:
+            truth = node.value != 0
+            return lambda frame: truth
+
+        if kind == NodeKind.IDENTIFIER:
+            value = self.compile_value(node, unit, 0)
+            return lambda frame: value(frame) != 0
+
+        return lambda frame: False
+
+    # === 輔助 ===
+
+    @staticmethod
+    def _name(node):
+        if isinstance(node, Node):
+            return node.get('name', '')
+        return str(node)
+
+    @staticmethod
+    def _note_string(node):
+        if isinstance(node, Node):
+            return node.get('value', 'C4')
+        return str(node)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+dsp.py - 向量化的區塊濾波器
+以狀態空間形式表示 IIR 濾波器，將訊號切成固定長度的子區塊：
+區塊內的零狀態響應用一次矩陣乘法算完，區塊之間只傳遞少量狀態，
+不需要逐取樣點的 Python 迴圈；狀態保留在物件內，可跨區塊串流處理
+"""
+
+import math
+
+import numpy as np
+
+# 子區塊長度，越長矩陣乘法越大、區塊間的狀態傳遞次數越少
+BLOCK_SIZE = 256
+
+
+class LinearFilter:
+    """狀態空間 IIR 濾波器
+
+    s[n+1] = A s[n] + B x[n]
+    y[n]   = C s[n] + D x[n]
+    """
+
+    def __init__(self, block_size=BLOCK_SIZE):
+        self.block_size = block_size
+        self.state = None
+
+    def _set_state_space(self, A, B, C, D):
+        """設定狀態空間係數並預先計算子區塊矩陣（狀態保留）"""
+        A = np.atleast_2d(np.asarray(A, dtype=np.float64))
+        B = np.asarray(B, dtype=np.float64).reshape(-1)
+        C = np.asarray(C, dtype=np.float64).reshape(-1)
+        order = len(B)
+        L = self.block_size
+
+        # A 的 0..L 次方
+        powers = np.empty((L + 1, order, order))
+        powers[0] = np.eye(order)
+        for n in range(1, L + 1):
+            powers[n] = powers[n - 1] @ A
+
+        # 脈衝響應 h[0] = D, h[n] = C A^(n-1) B
+        impulse = np.empty(L)
+        impulse[0] = D
+        impulse[1:] = powers[:L - 1] @ B @ C
+
+        # 零狀態響應：y = T x（下三角 Toeplitz 矩陣）
+        lags = np.arange(L)[:, None] - np.arange(L)[None, :]
+        self._toeplitz = np.where(lags >= 0, impulse[np.clip(lags, 0, None)], 0.0)
+        # 初始狀態的響應：y[n] += C A^n s
+        self._observe = np.einsum('j,njk->nk', C, powers[:L])
+        # 區塊結束時的狀態：s[L] = A^L s + Σ A^(L-1-k) B x[k]
+        self._control = np.einsum('njk,k->jn', powers[L - 1::-1], B)
+        self._powers = powers
+
+        self._A, self._B, self._C, self._D = A, B, C, float(D)
+        if self.state is None or len(self.state) != order:
+            self.state = np.zeros(order)
+
+    @property
+    def order(self):
+        return len(self._B)
+
+    def reset(self, value=0.0):
+        """重設狀態為輸入恆為 value 時的穩態，使輸出從 value 開始而非從 0 爬升"""
+        identity = np.eye(self.order)
+        try:
+            self.state = np.linalg.solve(identity - self._A, self._B * value)
+        except np.linalg.LinAlgError:
+            self.state = np.zeros(self.order)
+
+    def process(self, signal):
+        """濾波一段訊號，狀態延續到下一次呼叫"""
+        signal = np.asarray(signal, dtype=np.float64)
+        samples = len(signal)
+        if samples == 0:
+            return np.zeros(0)
+
+        L = self.block_size
+        blocks = -(-samples // L)
+        padded = np.zeros(blocks * L)
+        padded[:samples] = signal
+        X = padded.reshape(blocks, L)
+
+        # 各子區塊的零狀態響應與零狀態結束狀態，一次算完
+        output = X @ self._toeplitz.T
+        zero_state_end = X @ self._control.T
+
+        # 只有區塊之間的狀態需要依序傳遞
+        A_L = self._powers[L]
+        starts = np.empty((blocks, self.order))
+        state = self.state
+        for j in range(blocks):
+            starts[j] = state
+            state = A_L @ state + zero_state_end[j]
+
+        output += starts @ self._observe.T
+
+        # 最後一個區塊可能不滿，依實際長度計算結束狀態
+        tail = samples - (blocks - 1) * L
+        self.state = (self._powers[tail] @ starts[-1]
+                      + self._control[:, L - tail:] @ X[-1, :tail])
+
+        return output.reshape(-1)[:samples]
+
+
+class OnePoleLowpass(LinearFilter):
+    """一階低通濾波器 y[n] = α x[n] + (1 - α) y[n-1]"""
+
+    def __init__(self, cutoff, sample_rate=44100, block_size=BLOCK_SIZE):
+        super().__init__(block_size)
+        self.sample_rate = sample_rate
+        self.set_cutoff(cutoff)
+
+    def set_cutoff(self, cutoff):
+        """設定截止頻率 (Hz)"""
+        self.cutoff = cutoff
+        alpha = cutoff / (cutoff + self.sample_rate / (2 * np.pi))
+        self.alpha = alpha
+        # 狀態為前一個輸出
+        self._set_state_space([[1 - alpha]], [alpha], [1 - alpha], alpha)
+
+
+class Biquad(LinearFilter):
+    """二階 IIR 濾波器（Direct Form II Transposed），係數依 RBJ Audio EQ Cookbook 設計"""
+
+    def __init__(self, b, a, block_size=BLOCK_SIZE):
+        super().__init__(block_size)
+        self.set_coefficients(b, a)
+
+    def set_coefficients(self, b, a):
+        """設定係數 b = (b0, b1, b2), a = (a0, a1, a2)"""
+        a0 = a[0]
+        b0, b1, b2 = (v / a0 for v in b)
+        a1, a2 = a[1] / a0, a[2] / a0
+        self.b = (b0, b1, b2)
+        self.a = (1.0, a1, a2)
+        self._set_state_space(
+            [[-a1, 1.0], [-a2, 0.0]],
+            [b1 - a1 * b0, b2 - a2 * b0],
+            [1.0, 0.0],
+            b0
+        )
+
+    @staticmethod
+    def _design(cutoff, sample_rate, q):
+        w0 = 2 * math.pi * cutoff / sample_rate
+        return math.cos(w0), math.sin(w0) / (2 * q)
+
+    @classmethod
+    def lowpass(cls, cutoff, sample_rate=44100, q=1 / math.sqrt(2)):
+        """低通濾波器"""
+        cos_w0, alpha = cls._design(cutoff, sample_rate, q)
+        b = ((1 - cos_w0) / 2, 1 - cos_w0, (1 - cos_w0) / 2)
+        a = (1 + alpha, -2 * cos_w0, 1 - alpha)
+        return cls(b, a)
+
+    @classmethod
+    def highpass(cls, cutoff, sample_rate=44100, q=1 / math.sqrt(2)):
+        """高通濾波器"""
+        cos_w0, alpha = cls._design(cutoff, sample_rate, q)
+        b = ((1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2)
+        a = (1 + alpha, -2 * cos_w0, 1 - alpha)
+        return cls(b, a)
+
+    @classmethod
+    def bandpass(cls, center, sample_rate=44100, q=1.0):
+        """帶通濾波器（峰值增益 0dB）"""
+        cos_w0, alpha = cls._design(center, sample_rate, q)
+        b = (alpha, 0.0, -alpha)
+        a = (1 + alpha, -2 * cos_w0, 1 - alpha)
+        return cls(b, a)
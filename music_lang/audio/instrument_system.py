@@ -5,11 +5,15 @@ PyTune 音色系統
 """
 
 import numpy as np
-import pygame
+import time
 from enum import Enum
 from typing import Dict, Optional
 import math
 
+from .additive import additive_synthesis
+from .backends import AudioBackend, PygameBackend, open_backend
+from .dsp import OnePoleLowpass
+
 class InstrumentType(Enum):
     """音色類型枚舉"""
     PIANO = "piano"
@@ -26,6 +30,9 @@ class InstrumentType(Enum):
 class InstrumentSynthesizer:
     """音色合成器"""
     
+    # 由泛音列加法合成的音色，可一次計算多個音符
+    ADDITIVE_WAVE_TYPES = {'complex', 'sine_pure', 'brass', 'organ_complex', 'reed'}
+    
     def __init__(self, sample_rate=44100):
         self.sample_rate = sample_rate
         self.current_instrument = InstrumentType.PIANO
@@ -151,15 +158,28 @@ class InstrumentSynthesizer:
         
         return wave
     
-    def _generate_complex_wave(self, frequency: float, duration: float, harmonics: list) -> np.ndarray:
+    def generate_chord_wave(self, frequencies: list, duration: float, amplitude: float = 0.5) -> np.ndarray:
+        """生成和弦波形，加法合成的音色一次計算所有聲部的泛音"""
+        config = self.instrument_configs[self.current_instrument]
+        
+        if config['wave_type'] in self.ADDITIVE_WAVE_TYPES:
+            wave = self.generate_wave(np.asarray(frequencies, dtype=np.float64), duration, amplitude)
+        else:
+            wave = sum(self.generate_wave(frequency, duration, amplitude) for frequency in frequencies)
+        
+        # 聲部疊加後避免削波
+        peak = np.max(np.abs(wave)) if len(wave) else 0.0
+        if peak > 1.0:
+            wave = wave / peak
+        
+        return wave
+    
+    def _generate_complex_wave(self, frequency, duration: float, harmonics: list) -> np.ndarray:
         """生成複雜波形（鋼琴）"""
         samples = int(self.sample_rate * duration)
         t = np.linspace(0, duration, samples, False)
         
-        wave = np.zeros(samples)
-        for i, harmonic_amp in enumerate(harmonics):
-            harmonic_freq = frequency * (i + 1)
-            wave += harmonic_amp * np.sin(2 * np.pi * harmonic_freq * t)
+        wave = additive_synthesis(frequency, harmonics, samples, self.sample_rate)
         
         # 添加輕微的調制
         modulation = 1 + 0.02 * np.sin(2 * np.pi * 5 * t)  # 5Hz 顫音
@@ -230,15 +250,11 @@ class InstrumentSynthesizer:
         
         return wave
     
-    def _generate_pure_sine(self, frequency: float, duration: float, harmonics: list) -> np.ndarray:
+    def _generate_pure_sine(self, frequency, duration: float, harmonics: list) -> np.ndarray:
         """生成純正弦波音色（長笛）"""
         samples = int(self.sample_rate * duration)
-        t = np.linspace(0, duration, samples, False)
         
-        wave = np.zeros(samples)
-        for i, harmonic_amp in enumerate(harmonics):
-            harmonic_freq = frequency * (i + 1)
-            wave += harmonic_amp * np.sin(2 * np.pi * harmonic_freq * t)
+        wave = additive_synthesis(frequency, harmonics, samples, self.sample_rate)
         
         # 添加輕微的氣息效果
         breath_noise = 0.01 * np.random.normal(0, 1, samples)
@@ -246,17 +262,13 @@ class InstrumentSynthesizer:
         
         return wave / len(harmonics)
     
-    def _generate_brass_sound(self, frequency: float, duration: float, harmonics: list) -> np.ndarray:
+    def _generate_brass_sound(self, frequency, duration: float, harmonics: list) -> np.ndarray:
         """生成銅管樂器音色（小號）"""
         samples = int(self.sample_rate * duration)
-        t = np.linspace(0, duration, samples, False)
         
-        wave = np.zeros(samples)
-        for i, harmonic_amp in enumerate(harmonics):
-            harmonic_freq = frequency * (i + 1)
-            # 銅管樂器的諧波有輕微的相位偏移
-            phase = i * 0.2
-            wave += harmonic_amp * np.sin(2 * np.pi * harmonic_freq * t + phase)
+        # 銅管樂器的諧波有輕微的相位偏移
+        phases = np.arange(len(harmonics)) * 0.2
+        wave = additive_synthesis(frequency, harmonics, samples, self.sample_rate, phases=phases)
         
         # 添加銅管特有的邊音
         if samples > 0:
@@ -279,29 +291,22 @@ class InstrumentSynthesizer:
         
         return smoothed
     
-    def _generate_organ_sound(self, frequency: float, duration: float, harmonics: list) -> np.ndarray:
+    def _generate_organ_sound(self, frequency, duration: float, harmonics: list) -> np.ndarray:
         """生成管風琴音色"""
         samples = int(self.sample_rate * duration)
-        t = np.linspace(0, duration, samples, False)
         
-        wave = np.zeros(samples)
-        for i, harmonic_amp in enumerate(harmonics):
-            harmonic_freq = frequency * (i + 1)
-            wave += harmonic_amp * np.sin(2 * np.pi * harmonic_freq * t)
+        wave = additive_synthesis(frequency, harmonics, samples, self.sample_rate)
         
         # 管風琴特有的穩定性
         return wave / len(harmonics)
     
-    def _generate_reed_sound(self, frequency: float, duration: float, harmonics: list) -> np.ndarray:
+    def _generate_reed_sound(self, frequency, duration: float, harmonics: list) -> np.ndarray:
         """生成簧片樂器音色（薩克斯風）"""
         samples = int(self.sample_rate * duration)
         t = np.linspace(0, duration, samples, False)
         
-        wave = np.zeros(samples)
-        for i, harmonic_amp in enumerate(harmonics):
-            harmonic_freq = frequency * (i + 1)
-            # 簧片樂器有特殊的諧波結構
-            wave += harmonic_amp * np.sin(2 * np.pi * harmonic_freq * t)
+        # 簧片樂器有特殊的諧波結構
+        wave = additive_synthesis(frequency, harmonics, samples, self.sample_rate)
         
         # 添加簧片振動的特色
         reed_vibration = 0.05 * np.sin(2 * np.pi * 8 * t)  # 8Hz 振動
@@ -348,23 +353,20 @@ class InstrumentSynthesizer:
     
     def _apply_lowpass_filter(self, signal: np.ndarray, cutoff_freq: float) -> np.ndarray:
         """簡單的低通濾波器"""
-        # 簡化的一階低通濾波器
-        alpha = cutoff_freq / (cutoff_freq + self.sample_rate / (2 * np.pi))
-        filtered = np.zeros_like(signal)
-        
+        # 一階低通濾波器，輸出從第一個取樣點開始而非從 0 爬升
+        lowpass = OnePoleLowpass(cutoff_freq, self.sample_rate)
         if len(signal) > 0:
-            filtered[0] = signal[0]
-            for i in range(1, len(signal)):
-                filtered[i] = alpha * signal[i] + (1 - alpha) * filtered[i-1]
-        
-        return filtered
+            lowpass.reset(signal[0])
+        return lowpass.process(signal)
 
 class InstrumentEngine:
     """音色引擎 - 整合到現有的音訊系統"""
     
-    def __init__(self, sample_rate=44100):
-        self.synthesizer = InstrumentSynthesizer(sample_rate)
-        pygame.mixer.init(frequency=sample_rate, size=-16, channels=2, buffer=1024)
+    def __init__(self, sample_rate=44100, backend: Optional[AudioBackend] = None):
+        # 開啟音訊輸出後端（預設 pygame，無音效裝置時改用 null 後端）
+        self.backend = open_backend(backend or PygameBackend(sample_rate, buffer=1024))
+        self.synthesizer = InstrumentSynthesizer(self.backend.sample_rate)
+        self.cursor = 0  # 輸出時間軸上的目前位置（取樣點）
         
         # 音符頻率映射
         self.note_frequencies = {
@@ -404,6 +406,13 @@ class InstrumentEngine:
             wave_data = self.synthesizer.generate_wave(frequency, duration, volume)
             self._play_wave(wave_data)
     
+    def play_chord(self, notes: list, duration: float, volume: float = 0.7):
+        """播放和弦，所有聲部合成為單一波形"""
+        frequencies = [f for f in (self._note_to_frequency(note) for note in notes) if f]
+        if frequencies:
+            wave_data = self.synthesizer.generate_chord_wave(frequencies, duration, volume)
+            self._play_wave(wave_data)
+    
     def _note_to_frequency(self, note: str) -> Optional[float]:
         """將音符轉換為頻率"""
         if len(note) < 2:
@@ -421,18 +430,21 @@ class InstrumentEngine:
     
     def _play_wave(self, wave_data: np.ndarray):
         """播放波形數據"""
-        # 轉換為 pygame 可播放的格式
+        # 轉換為 16-bit PCM
         wave_data = np.clip(wave_data, -1, 1)
         wave_data = (wave_data * 32767).astype(np.int16)
         
         # 立體聲
-        stereo_wave = np.column_stack((wave_data, wave_data))
+        if self.backend.channels == 2:
+            wave_data = np.column_stack((wave_data, wave_data))
         
-        sound = pygame.sndarray.make_sound(stereo_wave)
-        sound.play()
+        sound = self.backend.make_sound(wave_data)
+        self.backend.play(sound, self.cursor)
+        self.cursor += len(wave_data)
         
-        # 等待播放完成
-        pygame.time.wait(int(len(wave_data) / self.synthesizer.sample_rate * 1000))
+        # 等待播放完成（非即時後端不需等待）
+        if self.backend.realtime:
+            time.sleep(len(wave_data) / self.synthesizer.sample_rate)
 
 # 使用範例
 if __name__ == "__main__":
@@ -456,4 +468,4 @@ if __name__ == "__main__":
             for note in ["C4", "D4", "E4", "F4", "G4"]:
                 engine.play_note(note, 0.5)
     
-    pygame.quit()
\ No newline at end of file
+    engine.backend.close()
\ No newline at end of file
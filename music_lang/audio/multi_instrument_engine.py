@@ -3,13 +3,14 @@
 multi_instrument_engine.py - 支援多樂器的音訊引擎
 """
 
-import pygame
 import numpy as np
-import threading
 import time
 from collections import defaultdict
 import math
 
+from .backends import open_backend
+from .tracing import DEBUG, ERROR, INFO, WARNING, tracer
+
 class InstrumentSynthesizer:
     """樂器合成器 - 為不同樂器生成不同音色"""
     
@@ -277,12 +278,11 @@ class InstrumentSynthesizer:
 class MultiInstrumentAudioEngine:
     """多樂器音訊引擎"""
     
-    def __init__(self):
-        # 初始化 pygame mixer
-        pygame.mixer.pre_init(frequency=44100, size=-16, channels=2, buffer=512)
-        pygame.mixer.init()
+    def __init__(self, backend=None):
+        # 開啟音訊輸出後端（預設 pygame，無音效裝置時改用 null 後端）
+        self.backend = open_backend(backend)
         
-        self.synthesizer = InstrumentSynthesizer()
+        self.synthesizer = InstrumentSynthesizer(self.backend.sample_rate)
         
         # 音樂狀態
         self.current_tempo = 120  # BPM
@@ -293,6 +293,9 @@ class MultiInstrumentAudioEngine:
         self.tracks = defaultdict(list)  # {instrument: [sounds]}
         self.active_sounds = []
         
+        # 輸出時間軸上的目前位置（取樣點）
+        self.cursor = 0
+        
         # 變數存儲
         self.variables = {}
         
@@ -309,18 +312,21 @@ class MultiInstrumentAudioEngine:
         if node_type == 'tempo':
             bpm = self._get_value(node.get('bpm', {}), 120)
             self.current_tempo = bpm
-            print(f"🎼 設定速度: {bpm} BPM")
+            if tracer.info:
+                tracer.emit(INFO, 'tempo', f"🎼 設定速度: {bpm} BPM")
         
         elif node_type == 'volume':
             volume = self._get_value(node.get('volume', {}), 0.8)
             self.current_volume = max(0.0, min(1.0, volume))
-            print(f"🔊 設定音量: {self.current_volume:.1f}")
+            if tracer.info:
+                tracer.emit(INFO, 'volume', f"🔊 設定音量: {self.current_volume:.1f}")
         
         elif node_type == 'instrument':
             instrument_node = node.get('instrument', {})
             instrument_name = instrument_node.get('name', 'piano')
             self.current_instrument = instrument_name
-            print(f"🎹 切換樂器: {instrument_name}")
+            if tracer.info:
+                tracer.emit(INFO, 'instrument', f"🎹 切換樂器: {instrument_name}")
         
         elif node_type == 'note':
             self._play_note(node)
@@ -332,9 +338,11 @@ class MultiInstrumentAudioEngine:
             count = int(self._get_value(node.get('count', {}), 1))
             body = node.get('body', [])
             
-            print(f"🔄 迴圈 {count} 次")
+            if tracer.debug:
+                tracer.emit(DEBUG, 'loop', f"🔄 迴圈 {count} 次")
             for i in range(count):
-                print(f"   第 {i+1}/{count} 次迴圈")
+                if tracer.debug:
+                    tracer.emit(DEBUG, 'iteration', f"   第 {i+1}/{count} 次迴圈")
                 for stmt in body:
                     self._execute_node(stmt)
         
@@ -342,20 +350,23 @@ class MultiInstrumentAudioEngine:
             condition = node.get('condition', {})
             body = node.get('body', [])
             
-            print("🔄 while 迴圈開始")
+            if tracer.debug:
+                tracer.emit(DEBUG, 'while', "🔄 while 迴圈開始")
             loop_count = 0
             max_iterations = 1000
             
             while self._evaluate_condition(condition) and loop_count < max_iterations:
                 loop_count += 1
-                print(f"   第 {loop_count} 次迴圈")
+                if tracer.debug:
+                    tracer.emit(DEBUG, 'iteration', f"   第 {loop_count} 次迴圈")
                 for stmt in body:
                     self._execute_node(stmt)
             
-            if loop_count >= max_iterations:
-                print("⚠️  迴圈達到最大次數限制，自動終止")
+            if loop_count >= max_iterations and tracer.warning:
+                tracer.emit(WARNING, 'while_limit', "⚠️  迴圈達到最大次數限制，自動終止")
             
-            print("🔄 while 迴圈結束")
+            if tracer.debug:
+                tracer.emit(DEBUG, 'while_end', "🔄 while 迴圈結束")
         
         elif node_type == 'for':
             variable = node.get('variable', {})
@@ -366,16 +377,19 @@ class MultiInstrumentAudioEngine:
             start_val = int(self._get_value(range_expr.get('start', {}), 0))
             end_val = int(self._get_value(range_expr.get('end', {}), 0))
             
-            print(f"🔄 for 迴圈開始 ({var_name}: {start_val} 到 {end_val})")
+            if tracer.debug:
+                tracer.emit(DEBUG, 'for', f"🔄 for 迴圈開始 ({var_name}: {start_val} 到 {end_val})")
             
             for i in range(start_val, end_val):
                 self.variables[var_name] = i
-                print(f"   第 {i+1}/{end_val-start_val} 次，{var_name} = {i}")
+                if tracer.debug:
+                    tracer.emit(DEBUG, 'iteration', f"   第 {i+1}/{end_val-start_val} 次，{var_name} = {i}")
                 
                 for stmt in body:
                     self._execute_node(stmt)
             
-            print("🔄 for 迴圈結束")
+            if tracer.debug:
+                tracer.emit(DEBUG, 'for_end', "🔄 for 迴圈結束")
         
         elif node_type == 'if':
             condition = node.get('condition', {})
@@ -384,7 +398,8 @@ class MultiInstrumentAudioEngine:
             else_body = node.get('else_body', [])
             
             if self._evaluate_condition(condition):
-                print("✅ if 條件成立")
+                if tracer.debug:
+                    tracer.emit(DEBUG, 'branch', "✅ if 條件成立")
                 for stmt in then_body:
                     self._execute_node(stmt)
             else:
@@ -393,7 +408,8 @@ class MultiInstrumentAudioEngine:
                 for elseif_clause in elseif_clauses:
                     elseif_condition = elseif_clause.get('condition', {})
                     if self._evaluate_condition(elseif_condition):
-                        print("✅ elseif 條件成立")
+                        if tracer.debug:
+                            tracer.emit(DEBUG, 'branch', "✅ elseif 條件成立")
                         for stmt in elseif_clause.get('body', []):
                             self._execute_node(stmt)
                         executed = True
@@ -401,7 +417,8 @@ class MultiInstrumentAudioEngine:
                 
                 # 如果沒有 elseif 條件成立，執行 else
                 if not executed and else_body:
-                    print("✅ 執行 else 分支")
+                    if tracer.debug:
+                        tracer.emit(DEBUG, 'branch', "✅ 執行 else 分支")
                     for stmt in else_body:
                         self._execute_node(stmt)
         
@@ -413,7 +430,8 @@ class MultiInstrumentAudioEngine:
             value = self._get_value(value_node, 0)
             
             self.variables[var_name] = value
-            print(f"📝 設定變數: {var_name} = {value}")
+            if tracer.debug:
+                tracer.emit(DEBUG, 'assign', f"📝 設定變數: {var_name} = {value}")
         
         elif node_type == 'function_def':
             name_node = node.get('name', {})
@@ -426,7 +444,8 @@ class MultiInstrumentAudioEngine:
                 'params': params,
                 'body': body
             }
-            print(f"📋 定義函式: {func_name}")
+            if tracer.info:
+                tracer.emit(INFO, 'function_def', f"📋 定義函式: {func_name}")
         
         elif node_type == 'function_call':
             name_node = node.get('name', {})
@@ -436,7 +455,8 @@ class MultiInstrumentAudioEngine:
             if func_name in self.variables:
                 func_def = self.variables[func_name]
                 if isinstance(func_def, dict) and func_def.get('type') == 'function':
-                    print(f"🎯 呼叫函式: {func_name}")
+                    if tracer.debug:
+                        tracer.emit(DEBUG, 'call', f"🎯 呼叫函式: {func_name}")
                     # 簡化的函式執行
                     for stmt in func_def.get('body', []):
                         self._execute_node(stmt)
@@ -446,25 +466,29 @@ class MultiInstrumentAudioEngine:
             func_name = self._get_name(name_node)
             args = node.get('args', [])
             
-            print(f"🔧 呼叫 ref 函式: {func_name}")
+            if tracer.debug:
+                tracer.emit(DEBUG, 'ref_call', f"🔧 呼叫 ref 函式: {func_name}")
             
             if func_name == 'refVolume':
                 if args:
                     volume = self._get_value(args[0], 0.8)
                     self.current_volume = max(0.0, min(1.0, volume))
-                    print(f"🔊 ref設定音量: {self.current_volume:.1f}")
+                    if tracer.info:
+                        tracer.emit(INFO, 'volume', f"🔊 ref設定音量: {self.current_volume:.1f}")
             
             elif func_name == 'refTempo':
                 if args:
                     tempo = self._get_value(args[0], 120)
                     self.current_tempo = tempo
-                    print(f"🎼 ref設定速度: {tempo} BPM")
+                    if tracer.info:
+                        tracer.emit(INFO, 'tempo', f"🎼 ref設定速度: {tempo} BPM")
             
             elif func_name == 'refInst':
                 if args:
                     instrument = self._get_name(args[0])
                     self.current_instrument = instrument
-                    print(f"🎹 ref設定樂器: {instrument}")
+                    if tracer.info:
+                        tracer.emit(INFO, 'instrument', f"🎹 ref設定樂器: {instrument}")
     
     def _play_note(self, node):
         """播放音符或音符陣列"""
@@ -480,17 +504,16 @@ class MultiInstrumentAudioEngine:
         # 處理音符值
         if note_value.get('type') == 'note_array':
             # 音符陣列 - 依序播放
-            notes = note_value.get('notes', [])
-            print(f"🎵 播放音符陣列 ({self.current_instrument}): ", end='')
-            for note in notes:
-                note_str = self._get_note_string(note)
-                print(f"{note_str} ", end='')
+            notes = [self._get_note_string(note) for note in note_value.get('notes', [])]
+            if tracer.debug:
+                tracer.emit(DEBUG, 'note_array', f"🎵 播放音符陣列 ({self.current_instrument}): {' '.join(notes)}")
+            for note_str in notes:
                 self._play_single_note(note_str, duration)
-            print()
         else:
             # 單個音符
             note_str = self._get_note_string(note_value)
-            print(f"♪ 播放音符 ({self.current_instrument}): {note_str}, 時長: {duration:.1f}s")
+            if tracer.debug:
+                tracer.emit(DEBUG, 'note', f"♪ 播放音符 ({self.current_instrument}): {note_str}, 時長: {duration:.1f}s")
             self._play_single_note(note_str, duration)
     
     def _play_chord(self, node):
@@ -506,18 +529,33 @@ class MultiInstrumentAudioEngine:
         notes = chord_node.get('notes', [])
         chord_notes = [self._get_note_string(note) for note in notes]
         
-        print(f"🎹 播放和弦 ({self.current_instrument}): [{', '.join(chord_notes)}], 時長: {duration:.1f}s")
-        
-        # 同時播放所有音符
-        threads = []
-        for note_str in chord_notes:
-            thread = threading.Thread(target=self._play_single_note, args=(note_str, duration))
-            threads.append(thread)
-            thread.start()
+        if tracer.debug:
+            tracer.emit(DEBUG, 'chord', f"🎹 播放和弦 ({self.current_instrument}): [{', '.join(chord_notes)}], 時長: {duration:.1f}s")
         
-        # 等待所有音符播放完成
-        for thread in threads:
-            thread.join()
+        try:
+            # 所有聲部相加成單一緩衝區，以一個 Sound 播放
+            wave = None
+            for note_str in chord_notes:
+                voice = self.synthesizer.generate_waveform(
+                    self.synthesizer.note_to_frequency(note_str),
+                    duration,
+                    self.current_instrument
+                )
+                wave = voice if wave is None else wave + voice
+            if wave is None:
+                return
+            
+            # 應用音量後整體正規化，而非逐聲部削波
+            wave = wave * self.current_volume
+            peak = np.max(np.abs(wave)) if len(wave) else 0.0
+            if peak > 1.0:
+                wave /= peak
+            
+            self._play_wave(wave, chord_notes, duration)
+            
+        except Exception as e:
+            if tracer.error:
+                tracer.emit(ERROR, 'chord_error', f"❌ 播放和弦時發生錯誤: {e}")
     
     def _play_single_note(self, note_str, duration):
         """播放單個音符"""
@@ -535,31 +573,38 @@ class MultiInstrumentAudioEngine:
             # 確保音量在合理範圍內
             wave = np.clip(wave, -1.0, 1.0)
             
-            # 轉換為 pygame 可用的格式
-            wave_int = (wave * 32767).astype(np.int16)
-            
-            # 如果是立體聲，複製到兩個聲道
-            if pygame.mixer.get_init()[3] == 2:
-                stereo_wave = np.array([wave_int, wave_int]).T
-                sound = pygame.sndarray.make_sound(stereo_wave)
-            else:
-                sound = pygame.sndarray.make_sound(wave_int)
+            self._play_wave(wave, [note_str], duration)
             
-            # 播放音效
-            channel = sound.play()
-            
-            # 記錄到對應軌道
+        except Exception as e:
+            if tracer.error:
+                tracer.emit(ERROR, 'note_error', f"❌ 播放音符時發生錯誤: {e}")
+    
+    def _play_wave(self, wave, notes, duration):
+        """播放已合成的波形並記錄到軌道"""
+        # 轉換為 16-bit PCM
+        wave_int = (wave * 32767).astype(np.int16)
+        
+        # 如果是立體聲，複製到兩個聲道
+        if self.backend.channels == 2:
+            sound = self.backend.make_sound(np.column_stack((wave_int, wave_int)))
+        else:
+            sound = self.backend.make_sound(wave_int)
+        
+        # 播放音效
+        self.backend.play(sound, self.cursor)
+        self.cursor += len(wave_int)
+        
+        # 記錄到對應軌道
+        for note_str in notes:
             self.tracks[self.current_instrument].append({
                 'note': note_str,
                 'duration': duration,
                 'timestamp': time.time()
             })
-            
-            # 等待播放完成
+        
+        # 等待播放完成（非即時後端不需等待）
+        if self.backend.realtime:
             time.sleep(duration)
-            
-        except Exception as e:
-            print(f"❌ 播放音符時發生錯誤: {e}")
     
     def _get_note_string(self, note_node):
         """從節點獲取音符字符串"""
@@ -656,6 +701,9 @@ class MultiInstrumentAudioEngine:
     
     def execute(self, ast):
         """執行 AST"""
+        # 此引擎直譯 dict 形式的 AST，節點物件先轉換
+        if hasattr(ast, 'to_dict'):
+            ast = ast.to_dict()
         if not isinstance(ast, dict):
             print("❌ 無效的 AST")
             return
@@ -666,10 +714,12 @@ class MultiInstrumentAudioEngine:
         print(f"📊 程式包含 {len(program_body)} 個語句")
         
         for i, stmt in enumerate(program_body, 1):
-            print(f"\n--- 執行語句 {i}/{len(program_body)} ---")
+            if tracer.debug:
+                tracer.emit(DEBUG, 'statement', f"\n--- 執行語句 {i}/{len(program_body)} ---")
             self._execute_node(stmt)
         
         print("\n🎵 音樂程式執行完成！")
+        self.backend.flush()
         self._show_track_summary()
     
     def _show_track_summary(self):
@@ -686,7 +736,7 @@ class MultiInstrumentAudioEngine:
     
     def stop(self):
         """停止所有播放"""
-        pygame.mixer.stop()
+        self.backend.stop()
         print("⏹️  停止播放")
     
     def get_supported_instruments(self):
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+offline_renderer.py - 離線渲染器
+將編譯後的事件時間軸逐區塊混音後串流寫出 WAV 檔，
+不需要音效裝置，也不需要即時等待；每個區塊只混音在區塊內發聲的聲部，
+記憶體用量取決於同時發聲的聲部，與曲長無關
+"""
+
+import bisect
+import time
+
+import numpy as np
+
+from .audio_engine import InstrumentSynthesizer
+from .backends import PCM_SCALE, WavStreamWriter, write_pcm_wav
+from .sound_cache import SoundCache
+from .timeline import EVENT_NOTE, TimelineCompiler
+from .tracing import ERROR, tracer
+
+# 串流渲染的區塊大小（取樣點）
+BLOCK_SIZE = 4096
+
+
+def to_pcm(samples, channels=2):
+    """將浮點單聲道波形轉換為 16-bit PCM（單聲道複製到各聲道）"""
+    pcm = np.clip(samples * PCM_SCALE, -32768, 32767).astype('<i2')
+    if channels == 2:
+        pcm = np.column_stack((pcm, pcm))
+    return pcm
+
+
+def write_wav(path, samples, sample_rate=44100, channels=2):
+    """將浮點單聲道波形寫成 16-bit PCM WAV 檔"""
+    write_pcm_wav(path, to_pcm(samples, channels), sample_rate, channels)
+
+
+class OfflineRenderer:
+    """離線渲染引擎 - 讀取事件時間軸並混音"""
+
+    def __init__(self, sample_rate=44100, sound_cache=None, sample_bank=None):
+        self.sample_rate = sample_rate
+        self.synthesizer = InstrumentSynthesizer(sample_rate)
+        if sample_bank is not None:
+            # sample_bank 為樣本庫目錄，空字串使用預設目錄
+            from .sample_bank import SampleBank
+            self.synthesizer.sample_bank = SampleBank(self.synthesizer, sample_bank or None)
+        self.sound_cache = sound_cache if sound_cache is not None else SoundCache()
+
+    def _render_group(self, frequencies, length, instrument, gain):
+        """合成一組同時起奏的音符，確定性樂器優先從快取取得"""
+        key = None
+        if self.synthesizer.is_deterministic(instrument):
+            key = SoundCache.make_key(frequencies, instrument, length, gain)
+            entry = self.sound_cache.get(key)
+            if entry is not None:
+                return entry.buffer
+
+        wave = self.synthesizer.render_chord(
+            frequencies, length / self.sample_rate, instrument, gain
+        )[:length].astype(np.float32)
+        if key is not None:
+            self.sound_cache.put(key, wave)
+        return wave
+
+    def _render_segment(self, timeline, segment):
+        """取得片段的混音，內容相同的片段只混音一次"""
+        key = timeline.segment_key(segment)
+        entry = self.sound_cache.get(key)
+        if entry is not None:
+            return entry.buffer
+
+        mix = timeline.mix_segment(segment, self._render_group)
+        self.sound_cache.put(key, mix)
+        return mix
+
+    def _voices(self, timeline):
+        """時間軸上的聲部：(起點, 長度, 混音順序, 取得波形的函式)，依起點排序
+
+        重複的函式片段整段是一個聲部，其餘每組同時起奏的音符（和弦）是一個聲部；
+        混音順序固定為片段在前、音符組在後，與區塊切法無關
+        """
+        voices = []
+        for segment in timeline.segments:
+            voices.append((int(segment['start']), int(segment['length']), len(voices),
+                           lambda segment=segment: self._render_segment(timeline, segment)))
+
+        events = timeline.events
+        in_segment = timeline.segment_mask()
+        for begin, end in timeline.group_bounds(events, timeline.segment_breaks()):
+            if in_segment[begin]:
+                continue
+            group = events[begin:end]
+            first = group[0]
+            if first['kind'] != EVENT_NOTE:
+                continue
+            voices.append((int(first['start']), int(first['length']), len(voices),
+                           lambda group=group, first=first: self._render_group(
+                               group['frequency'].tolist(),
+                               int(first['length']),
+                               timeline.instrument_name(first['instrument']),
+                               float(first['gain'])
+                           )))
+
+        voices.sort(key=lambda voice: voice[0])
+        return voices
+
+    def stream_timeline(self, timeline, block_size=BLOCK_SIZE):
+        """逐區塊產生浮點單聲道混音（最後一個區塊可能較短）
+
+        聲部在進入區塊時才合成，播完即釋放，同一時間只保留正在發聲的聲部
+        """
+        voices = self._voices(timeline)
+        upcoming = 0
+        active = []  # (混音順序, 起點, 波形)，依混音順序排列
+        total = timeline.total_samples
+
+        for block_start in range(0, total, block_size):
+            block_end = min(block_start + block_size, total)
+
+            # 啟動在此區塊內開始的聲部
+            while upcoming < len(voices) and voices[upcoming][0] < block_end:
+                start, length, order, render = voices[upcoming]
+                upcoming += 1
+                if length <= 0:
+                    continue
+                try:
+                    wave_data = render()
+                except Exception as e:
+                    # 與即時播放相同：單個音符失敗時略過，不中斷整首渲染
+                    if tracer.error:
+                        tracer.emit(ERROR, 'render_error', f"❌ 渲染音符時發生錯誤: {e}", error=repr(e))
+                    continue
+                bisect.insort(active, (order, start, wave_data), key=lambda voice: voice[0])
+
+            block = np.zeros(block_end - block_start)
+            remaining = []
+            for voice in active:
+                _, start, wave_data = voice
+                begin = max(block_start - start, 0)
+                end = min(block_end - start, len(wave_data))
+                if begin < end:
+                    block[start + begin - block_start:start + end - block_start] += wave_data[begin:end]
+                if start + len(wave_data) > block_end:
+                    remaining.append(voice)
+            active = remaining
+
+            yield block
+
+    def stream_pcm(self, timeline, block_size=BLOCK_SIZE, channels=2):
+        """逐區塊產生 16-bit PCM（形狀為 (取樣點, 聲道)），可直接交給任何輸出端"""
+        for block in self.stream_timeline(timeline, block_size):
+            yield to_pcm(block, channels)
+
+    def render_timeline(self, timeline):
+        """將時間軸混音為浮點單聲道主緩衝區（整首放在記憶體中，長曲請改用 stream_timeline）"""
+        blocks = list(self.stream_timeline(timeline))
+        return np.concatenate(blocks) if blocks else np.zeros(0)
+
+    def render(self, ast, output_path, block_size=BLOCK_SIZE):
+        """編譯並串流渲染 AST，寫出為 WAV 檔，回傳音訊長度（秒）"""
+        start = time.perf_counter()
+        timeline = TimelineCompiler(self.sample_rate).compile(ast)
+        if timeline is None:
+            return 0.0
+        timeline.show_summary()
+
+        with WavStreamWriter(output_path, self.sample_rate) as writer:
+            for pcm in self.stream_pcm(timeline, block_size):
+                writer.write(pcm)
+        self.sound_cache.show_stats()
+        if self.synthesizer.sample_bank is not None:
+            self.synthesizer.sample_bank.show_stats()
+
+        elapsed = time.perf_counter() - start
+        speed = timeline.duration / elapsed if elapsed > 0 else float('inf')
+        print(f"💾 已寫出 {output_path}: {timeline.duration:.1f}s 音訊，耗時 {elapsed:.2f}s（{speed:.1f}x 即時）")
+        return timeline.duration
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+recorder.py - 欄式演奏記錄
+每個播放過的音符或休止符記錄在預先配置、可成長的型別化欄位（種類、樂器、音符、長度、
+預定時間、實際時間），到達上限後覆寫最舊的記錄；各樂器的音符數與休止符數另外以計數器累計，
+摘要是 O(1)，長時間執行的 while/loop 程式不會為了記錄而持續佔用記憶體
+"""
+
+import csv
+
+import numpy as np
+
+# 記錄種類（與 timeline.EVENT_NOTE / EVENT_REST 相同）
+RECORD_NOTE = 0
+RECORD_REST = 1
+
+# 匯出格式
+RECORD_DTYPE = np.dtype([
+    ('kind', np.uint8),        # RECORD_NOTE / RECORD_REST
+    ('instrument', np.int16),  # 樂器編號，對應 EventRecorder.instruments
+    ('note', np.int32),        # 音符名稱編號，對應 EventRecorder.notes，休止符為 -1
+    ('duration', np.float32),  # 長度（秒）
+    ('scheduled', np.float64), # 預定起點（輸出時間軸上的秒數）
+    ('actual', np.float64),    # 實際起點（同一時間軸，實際 - 預定 = 延遲）
+])
+
+
+class EventRecorder:
+    """欄式演奏記錄器"""
+
+    def __init__(self, capacity=1024, max_records=65536):
+        self.max_records = max_records  # 保留的記錄上限，超過後覆寫最舊的記錄
+        self._columns = {name: np.zeros(capacity, dtype=RECORD_DTYPE[name]) for name in RECORD_DTYPE.names}
+        self._size = 0       # 目前保留的記錄數
+        self._next = 0       # 下一筆寫入的位置
+        self.total = 0       # 累計記錄數（含已覆寫的）
+        self.instruments = []
+        self.notes = []
+        self._instrument_ids = {}
+        self._note_ids = {}
+        self._counts = []    # 樂器編號 -> [音符數, 休止符數]
+
+    def __len__(self):
+        return self._size
+
+    def __bool__(self):
+        return self.total > 0
+
+    @property
+    def capacity(self):
+        return len(self._columns['kind'])
+
+    # === 名稱編號 ===
+
+    def instrument_id(self, name):
+        index = self._instrument_ids.get(name)
+        if index is None:
+            index = self._instrument_ids[name] = len(self.instruments)
+            self.instruments.append(name)
+            self._counts.append([0, 0])
+        return index
+
+    def note_id(self, name):
+        if name is None:
+            return -1
+        index = self._note_ids.get(name)
+        if index is None:
+            index = self._note_ids[name] = len(self.notes)
+            self.notes.append(name)
+        return index
+
+    # === 記錄 ===
+
+    def _advance(self, count):
+        """保留接下來 count 筆記錄的位置（必要時擴充欄位），回傳第一筆的寫入位置；
+        到達上限後位置繞回開頭"""
+        # 到達上限前不會覆寫，記錄依序放在 [0, _size)；剛好填滿時 _next 已繞回 0，
+        # 所以以記錄數而非寫入位置判斷是否需要擴充
+        needed = self._size + count
+        if needed > self.capacity and self.capacity < self.max_records:
+            grown = min(max(needed, self.capacity * 2), self.max_records)
+            for name, column in self._columns.items():
+                resized = np.zeros(grown, dtype=column.dtype)
+                resized[:self._size] = column[:self._size]
+                self._columns[name] = resized
+            self._next = self._size
+
+        capacity = self.capacity
+        start = self._next
+        self._next = (start + count) % capacity
+        self._size = min(self._size + count, capacity)
+        self.total += count
+        return start
+
+    def record(self, kind, instrument, note, duration, scheduled, actual=None):
+        """記錄一個音符或休止符"""
+        instrument_id = self.instrument_id(instrument)
+        position = self._advance(1)
+        columns = self._columns
+        columns['kind'][position] = kind
+        columns['instrument'][position] = instrument_id
+        columns['note'][position] = self.note_id(note) if kind == RECORD_NOTE else -1
+        columns['duration'][position] = duration
+        columns['scheduled'][position] = scheduled
+        columns['actual'][position] = scheduled if actual is None else actual
+        self._counts[instrument_id][0 if kind == RECORD_NOTE else 1] += 1
+
+    def record_many(self, kinds, instruments, notes, durations, scheduled, actual):
+        """一次記錄多筆（instruments / notes 為名稱序列，其餘為陣列或純量）"""
+        count = len(kinds)
+        if not count:
+            return
+        kinds = np.asarray(kinds, dtype=np.uint8)
+        instrument_ids = np.array([self.instrument_id(name) for name in instruments], dtype=np.int16)
+        note_ids = np.array([self.note_id(name) for name in notes], dtype=np.int32)
+        note_ids[kinds != RECORD_NOTE] = -1
+
+        # 數量超過容量時只保留最後的部分，計數器仍然全部累計
+        for instrument_id, kind in zip(instrument_ids.tolist(), kinds.tolist()):
+            self._counts[instrument_id][0 if kind == RECORD_NOTE else 1] += 1
+
+        values = {
+            'kind': kinds,
+            'instrument': instrument_ids,
+            'note': note_ids,
+            'duration': np.broadcast_to(durations, count),
+            'scheduled': np.broadcast_to(scheduled, count),
+            'actual': np.broadcast_to(actual, count),
+        }
+        start = self._advance(count)
+        capacity = self.capacity
+        keep = min(count, capacity)
+        positions = (start + np.arange(count - keep, count)) % capacity
+        for name, column in self._columns.items():
+            column[positions] = values[name][-keep:]
+
+    def clear(self):
+        """清除記錄與計數器（保留已配置的欄位）"""
+        self._size = 0
+        self._next = 0
+        self.total = 0
+        self.instruments = []
+        self.notes = []
+        self._instrument_ids = {}
+        self._note_ids = {}
+        self._counts = []
+
+    # === 摘要 ===
+
+    def counts(self):
+        """樂器名稱 -> (音符數, 休止符數)，包含已覆寫的記錄"""
+        return {name: tuple(self._counts[index]) for index, name in enumerate(self.instruments)}
+
+    @property
+    def note_count(self):
+        return sum(notes for notes, _ in self._counts)
+
+    @property
+    def rest_count(self):
+        return sum(rests for _, rests in self._counts)
+
+    # === 匯出 ===
+
+    def to_numpy(self):
+        """保留中的記錄，依記錄順序排成 RECORD_DTYPE 結構化陣列"""
+        size = self._size
+        start = (self._next - size) % self.capacity
+        order = (start + np.arange(size)) % self.capacity
+        records = np.zeros(size, dtype=RECORD_DTYPE)
+        for name, column in self._columns.items():
+            records[name] = column[order]
+        return records
+
+    def to_csv(self, path):
+        """以樂器與音符名稱寫出 CSV"""
+        records = self.to_numpy()
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['kind', 'instrument', 'note', 'duration', 'scheduled', 'actual'])
+            for record in records:
+                writer.writerow([
+                    'note' if record['kind'] == RECORD_NOTE else 'rest',
+                    self.instruments[record['instrument']],
+                    self.notes[record['note']] if record['note'] >= 0 else '',
+                    f"{record['duration']:.6f}",
+                    f"{record['scheduled']:.6f}",
+                    f"{record['actual']:.6f}",
+                ])
+        return len(records)
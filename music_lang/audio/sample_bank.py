@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+sample_bank.py - 磁碟上的預先合成樣本庫
+確定性樂器的每個音高預先合成一段 MAX_SECONDS 秒、尚未套用包絡的音色（基礎波形、泛音、顫音），
+每個樂器存成一個 .npy 檔，以記憶體映射讀取；播放時切出音符需要的長度，
+再套用該長度的 ADSR 包絡與音量縮放，結果與即時合成相同，但不需要重新合成。
+檔名含樂器設定的雜湊，設定變更後會重新建立，舊的樣本直接刪除
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+# 樣本格式版本，合成方式改變時遞增，讓舊的樣本失效
+BANK_VERSION = 1
+
+# 每個音高保存的長度（秒），較長的音符改為即時合成
+MAX_SECONDS = 4.0
+
+# 收錄的音高：八度 1-7 的半音階
+OCTAVES = range(1, 8)
+NOTE_NAMES = ('C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B')
+
+
+def default_bank_dir():
+    """預設樣本庫目錄：$PYTUNE_CACHE_DIR/samples，或 $XDG_CACHE_HOME/pytune/samples（預設 ~/.cache）"""
+    if os.environ.get('PYTUNE_CACHE_DIR'):
+        return Path(os.environ['PYTUNE_CACHE_DIR']) / 'samples'
+    base = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(base) / 'pytune' / 'samples'
+
+
+class SampleBank:
+    """依樂器設定雜湊保存的音色樣本庫"""
+
+    def __init__(self, synthesizer, root=None, max_seconds=MAX_SECONDS):
+        self.synthesizer = synthesizer
+        self.root = Path(root) if root else default_bank_dir()
+        self.max_samples = int(synthesizer.sample_rate * max_seconds)
+        self.frequencies = [
+            synthesizer.note_to_frequency(f"{name}{octave}") for octave in OCTAVES for name in NOTE_NAMES
+        ]
+        self._pitches = {round(frequency, 4): index for index, frequency in enumerate(self.frequencies)}
+        self._tones = {}  # 樂器 -> 記憶體映射的音色陣列（不能收錄時為 None）
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def config_hash(self, instrument):
+        """樂器設定、取樣率、波表大小與音高表的雜湊，任何一項改變都會產生新的樣本檔"""
+        synth = self.synthesizer
+        payload = json.dumps({
+            'version': BANK_VERSION,
+            'sample_rate': synth.sample_rate,
+            'max_samples': self.max_samples,
+            'table_size': synth.wavetables.table_size,
+            'frequencies': self.frequencies,
+            'config': synth.instrument_configs[instrument],
+        }, sort_keys=True, default=repr)
+        return hashlib.blake2b(payload.encode('utf-8'), digest_size=8).hexdigest()
+
+    def path(self, instrument):
+        return self.root / f"{instrument}-{self.config_hash(instrument)}.npy"
+
+    def supports(self, instrument):
+        """含噪音成分的樂器每次合成都不同，不收錄"""
+        synth = self.synthesizer
+        return instrument in synth.instrument_configs and synth.is_deterministic(instrument)
+
+    # === 讀取 ===
+
+    def tones(self, instrument):
+        """樂器所有音高的音色陣列（記憶體映射），第一次使用時建立；不能收錄時回傳 None"""
+        if instrument in self._tones:
+            return self._tones[instrument]
+        with self._lock:
+            if instrument not in self._tones:
+                self._tones[instrument] = self._load(instrument)
+            return self._tones[instrument]
+
+    def _load(self, instrument):
+        if not self.supports(instrument):
+            return None
+        path = self.path(instrument)
+        try:
+            if not path.exists():
+                self._build(instrument, path)
+            return np.load(path, mmap_mode='r')
+        except (OSError, ValueError) as e:
+            print(f"⚠️  無法使用 {instrument} 樣本庫，改為即時合成: {e}")
+            return None
+
+    def render(self, frequency, duration, instrument):
+        """從樣本庫切出音符並套用包絡（與 generate_waveform 相同的波形），無法提供時回傳 None"""
+        samples = int(self.synthesizer.sample_rate * duration)
+        index = self._pitches.get(round(frequency, 4))
+        if index is None or samples > self.max_samples:
+            self.misses += 1
+            return None
+        tones = self.tones(instrument)
+        if tones is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        wave = np.array(tones[index, :samples], dtype=np.float64)
+        return self.synthesizer.apply_envelope(wave, instrument)
+
+    # === 建立 ===
+
+    def _build(self, instrument, path):
+        """合成所有音高的音色寫成 .npy，同一樂器設定已變更的舊樣本一併刪除"""
+        synth = self.synthesizer
+        started = time.perf_counter()
+        print(f"🏗️  建立 {instrument} 樣本庫: {len(self.frequencies)} 個音高 × "
+              f"{self.max_samples / synth.sample_rate:.1f}s ...")
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        for stale in self.root.glob(f"{instrument}-*.npy"):
+            if stale != path:
+                stale.unlink(missing_ok=True)
+
+        # 先寫到暫存檔再改名，其他行程不會讀到寫到一半的檔案
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        os.close(fd)
+        try:
+            tones = np.lib.format.open_memmap(
+                tmp_path, mode='w+', dtype=np.float32, shape=(len(self.frequencies), self.max_samples)
+            )
+            for index, frequency in enumerate(self.frequencies):
+                tones[index] = synth.generate_tone(frequency, self.max_samples, instrument)
+            tones.flush()
+            del tones
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        elapsed = time.perf_counter() - started
+        print(f"✅ {instrument} 樣本庫完成: {path.stat().st_size / 1024 / 1024:.0f}MB, 耗時 {elapsed:.1f}s")
+
+    def build(self, instruments=None):
+        """預先建立所有（或指定）可收錄樂器的樣本庫，回傳可用的樂器數"""
+        if instruments is None:
+            instruments = list(self.synthesizer.instrument_configs)
+        return sum(self.tones(instrument) is not None for instrument in instruments)
+
+    def show_stats(self):
+        """顯示樣本庫統計"""
+        if not self.hits and not self.misses:
+            return
+        total = self.hits + self.misses
+        print(f"  🗃️  樣本庫: 命中 {self.hits}, 即時合成 {self.misses} ({self.hits / total:.0%}), "
+              f"{self.root}")
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+sequencer.py - 絕對期限音序器
+每個事件的起奏時間由它在時間軸上的位置換算成 time.perf_counter 期限，
+合成、輸出與執行緒啟動的耗時不會累加，長曲目也不會逐漸落後；
+非即時後端（WAV、原始 PCM、null）不等待，直接依取樣點位置輸出；
+串流後端（stream）則把整段時間軸逐區塊混音後連續送出
+"""
+
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from .audio_engine import wait_until
+from .offline_renderer import BLOCK_SIZE
+from .timeline import EVENT_NOTE
+from .tracing import DEBUG, ERROR, tracer
+
+# 提前送去合成的事件數與合成執行緒數
+SYNTH_LOOKAHEAD = 8
+SYNTH_WORKERS = min(4, os.cpu_count() or 1)
+
+# 即時播放期間的 GIL 切換間隔（秒）
+SWITCH_INTERVAL = 0.0005
+
+
+class SequencerReport:
+    """起奏時間誤差報告"""
+
+    def __init__(self, lateness, scheduled_duration, elapsed):
+        self.lateness = lateness                      # 每個音符或和弦起奏的延遲（秒）
+        self.scheduled_duration = scheduled_duration  # 時間軸總長（秒）
+        self.elapsed = elapsed                        # 實際播放耗時（秒）
+
+    @property
+    def max_lateness(self):
+        return float(self.lateness.max()) if len(self.lateness) else 0.0
+
+    @property
+    def mean_lateness(self):
+        return float(self.lateness.mean()) if len(self.lateness) else 0.0
+
+    @property
+    def drift(self):
+        """整首曲目結束時間與預定長度的差距（秒）"""
+        return self.elapsed - self.scheduled_duration
+
+    def show(self):
+        """顯示時間精度摘要"""
+        if not len(self.lateness):
+            if self.elapsed > 0 and self.scheduled_duration > 0:
+                # 非即時輸出沒有起奏延遲，只顯示輸出速度
+                speed = self.scheduled_duration / self.elapsed
+                print(f"\n⚡ 非即時輸出: {self.scheduled_duration:.1f}s 音訊，"
+                      f"耗時 {self.elapsed:.2f}s（{speed:.1f}x 即時）")
+            return
+        p95 = float(np.percentile(self.lateness, 95))
+        print("\n⏱️  時間精度:")
+        print(f"  起奏延遲: 平均 {self.mean_lateness * 1000:.2f}ms, "
+              f"P95 {p95 * 1000:.2f}ms, 最大 {self.max_lateness * 1000:.2f}ms")
+        print(f"  總長偏差: {self.drift * 1000:+.1f}ms（預定 {self.scheduled_duration:.2f}s）")
+
+
+class StreamReport:
+    """串流播放報告"""
+
+    def __init__(self, blocks, underruns, block_size, lookahead, scheduled_duration, elapsed):
+        self.blocks = blocks                          # 播放的區塊數
+        self.underruns = underruns                    # 欠載次數（輸出出現間隙）
+        self.block_size = block_size                  # 區塊大小（取樣點）
+        self.lookahead = lookahead                    # 預先渲染的長度（秒）
+        self.scheduled_duration = scheduled_duration  # 時間軸總長（秒）
+        self.elapsed = elapsed                        # 實際播放耗時（秒）
+
+    @property
+    def drift(self):
+        """整首曲目結束時間與預定長度的差距（秒）"""
+        return self.elapsed - self.scheduled_duration
+
+    def show(self):
+        """顯示串流摘要"""
+        print("\n🌊 串流輸出:")
+        print(f"  區塊: {self.blocks} 個 × {self.block_size} 取樣點, 預先渲染 {self.lookahead:.2f}s")
+        status = "無間隙" if not self.underruns else f"{self.underruns} 次欠載（可加大 --lookahead）"
+        print(f"  欠載: {status}")
+        print(f"  總長偏差: {self.drift * 1000:+.1f}ms（預定 {self.scheduled_duration:.2f}s）")
+
+
+class Sequencer:
+    """即時音序器 - 依時間軸位置排程事件
+
+    合成交給工作執行緒池，提前 lookahead 個事件開始（NumPy 運算期間會釋放 GIL），
+    播放迴圈只取出已完成的緩衝區，起奏延遲不再取決於樂器合成的複雜度
+    """
+
+    def __init__(self, engine, preroll=0.05, lookahead=SYNTH_LOOKAHEAD, workers=SYNTH_WORKERS):
+        self.engine = engine
+        self.preroll = preroll      # 第一個事件前預留的準備時間（秒）
+        self.lookahead = lookahead  # 提前送去合成的事件數
+        self.workers = workers      # 合成執行緒數
+
+    def play(self, timeline):
+        """依絕對期限播放時間軸，回傳 SequencerReport"""
+        engine = self.engine
+        realtime = engine.backend.realtime
+        items = self._items(timeline)
+
+        # 時間軸在輸出上的起點（互動模式下多次執行會接續輸出）
+        base = engine.cursor
+        # 合成執行緒持有 GIL 時，播放執行緒最多要等一個切換間隔才能在期限醒來；播放期間縮短間隔
+        switch_interval = sys.getswitchinterval()
+        if realtime:
+            sys.setswitchinterval(SWITCH_INTERVAL)
+        try:
+            return self._play(timeline, items, base)
+        finally:
+            sys.setswitchinterval(switch_interval)
+
+    def _play(self, timeline, items, base):
+        engine = self.engine
+        backend = engine.backend
+        realtime = backend.realtime
+        sample_rate = timeline.sample_rate
+        lateness = np.zeros(len(items))
+        played = 0
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='synth') as pool:
+            jobs = deque()
+            inflight = {}  # 快取鍵 -> 合成中的 Future，相同的音符只合成一次
+            submitted = 0
+
+            def submit_until(limit):
+                nonlocal submitted
+                while submitted < min(limit, len(items)):
+                    jobs.append(self._submit(pool, timeline, *items[submitted], inflight))
+                    submitted += 1
+
+            # 預留的準備時間內先開始合成最前面的事件
+            submit_until(self.lookahead)
+            origin = time.perf_counter() + (self.preroll if realtime else 0.0)
+            for index, (group, segment) in enumerate(items):
+                submit_until(index + 1 + self.lookahead)
+                job = jobs.popleft()
+                if job is None:
+                    self._track(timeline, group, base, 0.0)
+                    continue
+
+                # 期限之前取出合成結果，期限一到立即播放
+                first = group[0]
+                deadline = origin + first['start'] / sample_rate
+                try:
+                    sound = self._collect(job, inflight)
+                except Exception as e:
+                    if tracer.error:
+                        tracer.emit(ERROR, 'note_error', f"❌ 播放音符時發生錯誤: {e}", error=repr(e))
+                    sound = None
+
+                if realtime:
+                    wait_until(deadline)
+                if sound is not None:
+                    backend.play(sound, base + int(first['start']))
+                if realtime:
+                    lateness[played] = time.perf_counter() - deadline
+                    played += 1
+
+                self._track(timeline, group, base, lateness[played - 1] if realtime else 0.0)
+
+        # 等到整個時間軸結束
+        if realtime:
+            wait_until(origin + timeline.total_samples / sample_rate)
+        elapsed = time.perf_counter() - origin
+        engine.cursor = base + timeline.total_samples
+
+        return SequencerReport(lateness[:played], timeline.duration, elapsed)
+
+    def warmup(self, timeline):
+        """預熱：開始播放前，以執行緒池平行合成時間軸中所有不重複、可快取的聲音，放進引擎的快取
+
+        含噪音成分的樂器每次合成都不同，不預熱，播放時仍由提前合成處理；回傳合成的聲音數
+        """
+        engine = self.engine
+        cache = engine.sound_cache
+        renders = {}
+        for group, segment in self._items(timeline):
+            job = self._job(timeline, group, segment)
+            if job is not None and job[0] is not None and job[0] not in cache:
+                renders.setdefault(job[0], job[1])
+        if not renders:
+            return 0
+
+        total = len(renders)
+        print(f"🔥 預熱: 平行合成 {total} 個不重複的聲音（{self.workers} 個執行緒）...")
+        started = time.perf_counter()
+        evictions = cache.evictions
+        step = max(1, total // 10)
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='warmup') as pool:
+            futures = {pool.submit(*render): key for key, render in renders.items()}
+            for done, future in enumerate(as_completed(futures), 1):
+                try:
+                    engine._store_sound(futures[future], future.result())
+                except Exception as e:
+                    if tracer.error:
+                        tracer.emit(ERROR, 'render_error', f"❌ 渲染音符時發生錯誤: {e}", error=repr(e))
+                if done % step == 0 or done == total:
+                    print(f"\r  ⏳ {done}/{total} ({done / total:.0%})", end='', flush=True)
+        print()
+
+        elapsed = time.perf_counter() - started
+        print(f"✅ 預熱完成: {total} 個聲音, 快取 {cache.current_bytes / 1024 / 1024:.1f}MB, 耗時 {elapsed:.2f}s")
+        if cache.evictions > evictions:
+            print(f"⚠️  音效快取容量不足，預熱期間淘汰了 {cache.evictions - evictions} 個聲音")
+        return total
+
+    def _items(self, timeline):
+        """依播放順序排出（事件組, 片段）：重複的函式片段整段合成為一個聲音，在片段起點播放"""
+        events = timeline.events
+        segments = {int(segment['first']): segment for segment in timeline.segments}
+        in_segment = timeline.segment_mask()
+        items = []
+        for begin, end in timeline.group_bounds(events, timeline.segment_breaks()):
+            segment = segments.get(begin)
+            if segment is not None:
+                items.append((events[begin:begin + segment['count']], segment))
+            elif not in_segment[begin]:
+                items.append((events[begin:end], None))
+        return items
+
+    def _job(self, timeline, group, segment):
+        """事件組的（快取鍵, 合成函式與引數）；休止符回傳 None，不可快取時鍵為 None"""
+        engine = self.engine
+        first = group[0]
+        if segment is not None:
+            return timeline.segment_key(segment), (engine._render_segment_pcm, timeline, segment)
+        if first['kind'] != EVENT_NOTE:
+            return None
+        frequencies = group['frequency'].tolist()
+        duration = first['length'] / timeline.sample_rate
+        instrument = timeline.instrument_name(first['instrument'])
+        gain = float(first['gain'])
+        key = engine._sound_key(frequencies, duration, instrument, gain)
+        return key, (engine._render_pcm, frequencies, duration, instrument, gain)
+
+    def _submit(self, pool, timeline, group, segment, inflight):
+        """送出一個事件組的合成工作，回傳（快取鍵, Future, 合成函式與引數）；休止符回傳 None
+
+        已在快取或正在合成的聲音不重複送出（Future 為 None 或共用同一個 Future）
+        """
+        job = self._job(timeline, group, segment)
+        if job is None:
+            return None
+        key, render = job
+        engine = self.engine
+        if key is not None:
+            if key in inflight:
+                return key, inflight[key], render
+            if key in engine.sound_cache:
+                return key, None, render
+        future = pool.submit(*render)
+        if key is not None:
+            inflight[key] = future
+        return key, future, render
+
+    def _collect(self, job, inflight):
+        """取得合成結果的可播放物件（快取、PCM 與後端物件都只在播放執行緒存取）"""
+        engine = self.engine
+        key, future, render = job
+        sound = engine._cached_sound(key)
+        if sound is not None:
+            return sound
+        if future is None:
+            # 送出時已在快取、之後被淘汰：改為立即合成
+            return engine._store_sound(key, render[0](*render[1:]))
+        try:
+            pcm = future.result()
+        finally:
+            inflight.pop(key, None)
+        return engine._store_sound(key, pcm)
+
+    def stream(self, timeline, block_size=BLOCK_SIZE):
+        """以串流後端播放時間軸：逐區塊混音，交給後端連續輸出，回傳 StreamReport"""
+        engine = self.engine
+        backend = engine.backend
+        base = engine.cursor
+        renderer = engine.stream_renderer()
+
+        started = time.perf_counter()
+        blocks, underruns = backend.stream(
+            renderer.stream_pcm(timeline, block_size, backend.channels), block_size
+        )
+        elapsed = time.perf_counter() - started
+
+        self._track(timeline, timeline.events, base, 0.0)
+        engine.cursor = base + timeline.total_samples
+        return StreamReport(blocks, underruns, block_size, backend.lookahead, timeline.duration, elapsed)
+
+    def _track(self, timeline, events, base, lateness):
+        """將已播放的事件（一個和弦或片段）一次寫入引擎的演奏記錄"""
+        sample_rate = timeline.sample_rate
+        scheduled = (base + events['start']) / sample_rate
+        self.engine.recorder.record_many(
+            events['kind'],
+            [timeline.instrument_name(index) for index in events['instrument'].tolist()],
+            [timeline.note_name(index) for index in events['note'].tolist()],
+            events['length'] / sample_rate,
+            scheduled,
+            scheduled + lateness,
+        )
+        if tracer.debug:
+            self._trace(timeline, events, base, lateness)
+
+    def _trace(self, timeline, events, base, lateness):
+        """為已播放的每個音符、和弦與休止符送出一筆 DEBUG 追蹤事件（含預定時間與起奏延遲）"""
+        sample_rate = timeline.sample_rate
+        for begin, end in timeline.group_bounds(events):
+            group = events[begin:end]
+            first = group[0]
+            instrument = timeline.instrument_name(first['instrument'])
+            duration = first['length'] / sample_rate
+            scheduled = (base + int(first['start'])) / sample_rate
+            timing = {'scheduled': scheduled, 'actual': scheduled + lateness, 'lateness': float(lateness)}
+            if first['kind'] != EVENT_NOTE:
+                tracer.emit(DEBUG, 'rest', f"🔇 休止符: {duration:.1f}s",
+                            duration=duration, instrument=instrument, **timing)
+                continue
+            notes = [timeline.note_name(index) for index in group['note'].tolist()]
+            if len(notes) == 1:
+                tracer.emit(DEBUG, 'note', f"♪ 播放音符 ({instrument}): {notes[0]}, 時長: {duration:.1f}s",
+                            note=notes[0], duration=duration, instrument=instrument, **timing)
+            else:
+                tracer.emit(DEBUG, 'chord', f"🎹 播放和弦 ({instrument}): [{', '.join(notes)}], 時長: {duration:.1f}s",
+                            notes=notes, duration=duration, instrument=instrument, **timing)
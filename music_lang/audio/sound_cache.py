@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+sound_cache.py - 有上限的 LRU 音效快取
+以（音符頻率, 樂器, 長度, 音量）為鍵，保存合成完成的緩衝區與後端的可播放物件，
+重複出現的音符不必重新合成
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class CachedSound:
+    """快取項目 - 合成完成的緩衝區與（可選的）後端可播放物件（如 pygame Sound）"""
+
+    __slots__ = ('buffer', 'sound')
+
+    def __init__(self, buffer, sound=None):
+        self.buffer = buffer
+        self.sound = sound
+
+    @property
+    def nbytes(self):
+        # pygame Sound 會複製一份取樣資料，佔用與緩衝區相同的記憶體；
+        # 非即時後端直接使用緩衝區本身，不另外佔用
+        copied = self.sound is not None and self.sound is not self.buffer
+        return self.buffer.nbytes * (2 if copied else 1)
+
+
+class SoundCache:
+    """LRU 音效快取，依記憶體用量與項目數淘汰最久未使用的項目"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_entries=None):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(frequencies, instrument, length, gain):
+        """建立快取鍵，頻率與增益取固定精度避免浮點誤差造成重複項目"""
+        return (
+            tuple(round(float(f), 4) for f in frequencies),
+            instrument,
+            int(length),
+            round(float(gain), 6),
+        )
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        """取得快取項目並標記為最近使用，未命中時回傳 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, buffer, sound=None):
+        """加入快取項目，超過上限時淘汰最久未使用的項目"""
+        entry = CachedSound(buffer, sound)
+        if entry.nbytes > self.max_bytes:
+            return entry
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old.nbytes
+            self._entries[key] = entry
+            self.current_bytes += entry.nbytes
+            self._evict()
+        return entry
+
+    def attach_sound(self, key, sound):
+        """為既有項目補上可播放物件，並更新記憶體用量"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.sound is not None:
+                return
+            self.current_bytes -= entry.nbytes
+            entry.sound = sound
+            self.current_bytes += entry.nbytes
+            self._evict()
+
+    def _evict(self):
+        """淘汰項目直到符合記憶體與數量上限（呼叫時需持有鎖）"""
+        while self._entries and (
+            self.current_bytes > self.max_bytes
+            or (self.max_entries is not None and len(self._entries) > self.max_entries)
+        ):
+            _, entry = self._entries.popitem(last=False)
+            self.current_bytes -= entry.nbytes
+            self.evictions += 1
+
+    def clear(self):
+        """清空快取（統計數字保留）"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def show_stats(self):
+        """顯示快取統計"""
+        if not self.hits and not self.misses:
+            return
+        print(f"  💾 音效快取: 命中 {self.hits}, 未命中 {self.misses} "
+              f"({self.hit_rate:.0%}), 淘汰 {self.evictions}, "
+              f"{len(self._entries)} 項 / {self.current_bytes / 1024 / 1024:.1f}MB")
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+timeline.py - 事件時間軸編譯器
+先執行一次迴圈、條件、函式呼叫與 tempo/volume/refinst 等控制流程，
+將整個程式攤平成 NumPy 結構化陣列，之後的播放、渲染與分析都只讀這個陣列
+"""
+
+import hashlib
+
+import numpy as np
+
+from parser.ast_nodes import as_program
+
+from .audio_engine import AudioEngine, InstrumentSynthesizer
+from .compiler import ProgramCompiler
+from .tracing import DEBUG, ERROR, tracer
+
+# 事件種類
+EVENT_NOTE = 0
+EVENT_REST = 1
+
+# 事件陣列格式
+EVENT_DTYPE = np.dtype([
+    ('start', np.int64),       # 起始取樣點
+    ('length', np.int64),      # 長度（取樣點）
+    ('frequency', np.float64), # 頻率 (Hz)，休止符為 0
+    ('instrument', np.int16),  # 樂器編號，對應 EventTimeline.instruments
+    ('gain', np.float32),      # 實際增益，休止符為 0
+    ('note', np.int32),        # 音符名稱編號，對應 EventTimeline.notes，休止符為 -1
+    ('kind', np.uint8),        # EVENT_NOTE / EVENT_REST
+])
+
+# 片段表格式：重複呼叫的純函式產生的事件區段，渲染時整段混音一次後重用
+SEGMENT_DTYPE = np.dtype([
+    ('id', np.int32),          # 片段編號，內容相同的片段編號相同
+    ('start', np.int64),       # 起始取樣點
+    ('first', np.int64),       # 第一個事件在事件陣列中的位置
+    ('count', np.int64),       # 事件數
+    ('length', np.int64),      # 長度（取樣點）
+])
+
+
+class EventTimeline:
+    """編譯後的事件時間軸"""
+
+    def __init__(self, events, instruments, notes, sample_rate, total_samples, segments=None):
+        self.events = events
+        self.instruments = instruments
+        self.notes = notes
+        self.sample_rate = sample_rate
+        self.total_samples = total_samples
+        self.segments = segments if segments is not None else np.zeros(0, dtype=SEGMENT_DTYPE)
+
+    def __len__(self):
+        return len(self.events)
+
+    @property
+    def duration(self):
+        """總長度（秒）"""
+        return self.total_samples / self.sample_rate
+
+    def instrument_name(self, instrument_id):
+        """由樂器編號取得樂器名稱"""
+        return self.instruments[instrument_id]
+
+    def note_name(self, note_id):
+        """由音符編號取得音符名稱"""
+        return self.notes[note_id] if note_id >= 0 else None
+
+    @staticmethod
+    def group_bounds(events, breaks=()):
+        """事件分組的（起點, 終點）位置：同時起奏、同樂器、同長度與增益的音符為一組（和弦），
+        休止符各自一組；breaks 中的位置一定是新分組的起點"""
+        if not len(events):
+            return []
+
+        # 與前一個事件屬於同一組的位置
+        same = np.zeros(len(events), dtype=bool)
+        same[1:] = (events['kind'][1:] == EVENT_NOTE) & (events['kind'][:-1] == EVENT_NOTE)
+        for field in ('start', 'length', 'instrument', 'gain'):
+            same[1:] &= events[field][1:] == events[field][:-1]
+        breaks = np.asarray(breaks, dtype=np.int64)
+        same[breaks[breaks < len(events)]] = False
+        bounds = np.append(np.flatnonzero(~same), len(events))
+        return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+    def groups(self):
+        """依序產生事件分組"""
+        events = self.events
+        for begin, end in self.group_bounds(events):
+            yield events[begin:end]
+
+    # === 片段 ===
+
+    def segment_mask(self):
+        """屬於片段的事件"""
+        mask = np.zeros(len(self.events), dtype=bool)
+        for segment in self.segments:
+            mask[segment['first']:segment['first'] + segment['count']] = True
+        return mask
+
+    def segment_breaks(self):
+        """片段的起點與終點，分組不能跨越這些位置"""
+        segments = self.segments
+        return np.concatenate((segments['first'], segments['first'] + segments['count']))
+
+    def segment_events(self, segment):
+        """片段內的事件，起始位置改為相對於片段起點"""
+        events = self.events[segment['first']:segment['first'] + segment['count']].copy()
+        events['start'] -= segment['start']
+        return events
+
+    def segment_key(self, segment):
+        """以片段內容（相對時間、頻率、樂器、長度、增益）建立的快取鍵，跨時間軸共用"""
+        events = self.segment_events(segment)
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{self.sample_rate}:{int(segment['length'])}:".encode('utf-8'))
+        digest.update('\0'.join(self.instrument_name(i) for i in np.unique(events['instrument'])).encode('utf-8'))
+        for field in ('start', 'length', 'frequency', 'instrument', 'gain', 'kind'):
+            digest.update(np.ascontiguousarray(events[field]).tobytes())
+        return ('segment', digest.hexdigest())
+
+    def mix_segment(self, segment, render_group):
+        """將片段內的音符混音成一個浮點緩衝區
+
+        render_group(frequencies, length, instrument, gain) 回傳一組音符的波形（取樣點數為 length）
+        """
+        events = self.segment_events(segment)
+        mix = np.zeros(int(segment['length']), dtype=np.float32)
+        for begin, end in self.group_bounds(events):
+            group = events[begin:end]
+            first = group[0]
+            if first['kind'] != EVENT_NOTE:
+                continue
+
+            start = int(first['start'])
+            try:
+                wave_data = render_group(
+                    group['frequency'].tolist(),
+                    int(first['length']),
+                    self.instrument_name(first['instrument']),
+                    float(first['gain'])
+                )
+            except Exception as e:
+                if tracer.error:
+                    tracer.emit(ERROR, 'render_error', f"❌ 渲染音符時發生錯誤: {e}", error=repr(e))
+                continue
+            mix[start:start + len(wave_data)] += wave_data
+        return mix
+
+    def show_summary(self):
+        """顯示時間軸摘要"""
+        print(f"\n📊 時間軸摘要: {len(self.events)} 個事件, 總長 {self.duration:.1f}s")
+        kinds = self.events['kind']
+        instruments = self.events['instrument']
+        for instrument_id in np.unique(instruments):
+            mask = instruments == instrument_id
+            note_count = int(np.count_nonzero(kinds[mask] == EVENT_NOTE))
+            rest_count = int(np.count_nonzero(kinds[mask] == EVENT_REST))
+            print(f"  🎹 {self.instrument_name(instrument_id)}: {note_count} 個音符, {rest_count} 個休止符")
+
+
+class TimelineCompiler(AudioEngine):
+    """時間軸編譯器 - 重用 AudioEngine 的直譯邏輯，但只記錄事件不發聲"""
+
+    def __init__(self, sample_rate=44100):
+        # 不執行 AudioEngine.__init__：編譯階段不開啟輸出後端、不建立合成器與快取，也不顯示初始化訊息
+        self.sample_rate = sample_rate
+        # 樂器配置與音高換算都在類別層級，不需要合成器實例
+        self.synthesizer = InstrumentSynthesizer
+        self._init_music_state()
+        self.instrument_ids = {
+            name: i for i, name in enumerate(self.synthesizer.instrument_configs)
+        }
+        self.instrument_names = list(self.instrument_ids)
+        self._reset()
+
+    def _reset(self):
+        """清空事件緩衝區與虛擬時鐘"""
+        self.position = 0.0
+        self.total_samples = 0
+        self.note_ids = {}
+        self._events = np.zeros(1024, dtype=EVENT_DTYPE)
+        self._count = 0
+        self._segment_memo = {}
+        self._segments = []
+        self._segment_stack = []
+
+    def _offset(self, seconds):
+        """將秒數轉換為取樣點位置"""
+        return int(round(seconds * self.sample_rate))
+
+    def _note_id(self, note_str):
+        """取得音符名稱編號"""
+        note_id = self.note_ids.get(note_str)
+        if note_id is None:
+            note_id = self.note_ids[note_str] = len(self.note_ids)
+        return note_id
+
+    def _reserve(self, count):
+        """確保事件緩衝區還能再放入 count 個事件"""
+        needed = self._count + count
+        if needed > len(self._events):
+            grown = np.zeros(max(needed, len(self._events) * 2), dtype=EVENT_DTYPE)
+            grown[:self._count] = self._events[:self._count]
+            self._events = grown
+
+    def _emit(self, kind, duration, note_str=None):
+        """在目前的虛擬時間位置新增一個事件"""
+        self._reserve(1)
+
+        event = self._events[self._count]
+        event['start'] = self._offset(self.position)
+        event['length'] = int(self.sample_rate * duration)
+        event['instrument'] = self.instrument_ids[self.current_instrument]
+        event['kind'] = kind
+        if kind == EVENT_NOTE:
+            event['frequency'] = self.synthesizer.note_to_frequency(note_str)
+            event['gain'] = self.effective_volume()
+            event['note'] = self._note_id(note_str)
+        else:
+            event['note'] = -1
+        self._count += 1
+
+        self.total_samples = max(self.total_samples, int(event['start'] + event['length']))
+
+    def _advance(self, duration):
+        """推進虛擬時鐘"""
+        self.position += duration
+        self.total_samples = max(self.total_samples, self._offset(self.position))
+
+    def _play_single_note(self, note_str, duration):
+        """記錄單個音符事件"""
+        self._emit(EVENT_NOTE, duration, note_str)
+        self._advance(duration)
+
+    def play_chord(self, notes, duration=None):
+        """和弦的每個音符記錄在同一個起點"""
+        if duration is None:
+            duration = 60.0 / self.current_tempo * 2
+
+        for note in notes:
+            self._emit(EVENT_NOTE, duration, note)
+        self._advance(duration)
+
+    def play_rest(self, duration):
+        """記錄休止符事件"""
+        self._emit(EVENT_REST, duration)
+        self._advance(duration)
+
+    def stop(self):
+        """編譯階段沒有正在播放的聲音"""
+        pass
+
+    # === 片段記憶化（函式呼叫與迴圈主體） ===
+
+    def begin_segment(self, key):
+        """開始只依賴引數與進入狀態的函式主體或迴圈主體
+
+        相同 key 且速度、音量、樂器相同的主體記錄過時，直接複製事件並回傳 True，呼叫端略過主體；
+        否則開始記錄並回傳 False，呼叫端執行完主體後必須呼叫 end_segment()
+        """
+        if self._segment_stack:
+            # 片段不巢狀：外層片段已經包含內層產生的事件
+            self._segment_stack.append(None)
+            return False
+
+        key = key + (self.current_tempo, self.current_volume, self.current_instrument)
+        start = self._offset(self.position)
+        memo = self._segment_memo.get(key)
+        if memo is not None:
+            self._replay_segment(memo, start)
+            return True
+
+        self._segment_stack.append((key, start, self._count, self.position))
+        return False
+
+    def end_segment(self):
+        """結束記錄，保存主體產生的事件與結束狀態"""
+        entry = self._segment_stack.pop()
+        if entry is None:
+            return
+
+        key, start, first, position = entry
+        events = self._events[first:self._count].copy()
+        events['start'] -= start
+        length = int((events['start'] + events['length']).max()) if len(events) else 0
+        deterministic = all(
+            self.synthesizer.is_deterministic(self.instrument_name(i))
+            for i in np.unique(events['instrument'])
+        )
+        memo = self._segment_memo[key] = {
+            'id': len(self._segment_memo),
+            'events': events,
+            'length': length,
+            'advance': self.position - position,
+            'state': (self.current_tempo, self.current_volume, self.current_instrument),
+            # 含噪音成分的樂器每次合成都不同，只重用事件、不重用音訊
+            'reusable': deterministic and length > 0,
+        }
+        self._add_segment(memo, start, first)
+
+    def _replay_segment(self, memo, start):
+        """複製記憶化的事件到目前位置，並還原函式結束時的狀態"""
+        events = memo['events']
+        first = self._count
+        self._reserve(len(events))
+        self._events[first:first + len(events)] = events
+        self._events['start'][first:first + len(events)] += start
+        self._count += len(events)
+
+        self.current_tempo, self.current_volume, self.current_instrument = memo['state']
+        self.total_samples = max(self.total_samples, start + memo['length'])
+        self._advance(memo['advance'])
+        self._add_segment(memo, start, first)
+        if tracer.debug:
+            tracer.emit(DEBUG, 'segment_replay', f"♻️  重用片段: {len(events)} 個事件",
+                        segment=memo['id'], events=len(events))
+
+    def _add_segment(self, memo, start, first):
+        if memo['reusable']:
+            self._segments.append((memo['id'], start, first, len(memo['events']), memo['length']))
+
+    def instrument_name(self, instrument_id):
+        """由樂器編號取得樂器名稱"""
+        return self.instrument_names[instrument_id]
+
+    def _segment_table(self):
+        """片段表：只保留出現兩次以上的片段，只出現一次的片段照一般事件渲染"""
+        segments = np.array(self._segments, dtype=SEGMENT_DTYPE)
+        if not len(segments):
+            return segments
+        _, inverse, counts = np.unique(segments['id'], return_inverse=True, return_counts=True)
+        return segments[counts[inverse] > 1]
+
+    def compile(self, ast):
+        """將 AST 編譯為 EventTimeline"""
+        ast = as_program(ast)
+        if ast is None:
+            print("❌ 無效的 AST")
+            return None
+
+        # 先編譯成指令再執行，迴圈主體不必每次重新分派節點種類
+        program = ProgramCompiler(self).compile(ast)
+        self._reset()
+        program.run()
+
+        notes = [None] * len(self.note_ids)
+        for note_str, note_id in self.note_ids.items():
+            notes[note_id] = note_str
+
+        return EventTimeline(
+            self._events[:self._count].copy(),
+            list(self.instrument_names),
+            notes,
+            self.sample_rate,
+            self.total_samples,
+            self._segment_table()
+        )
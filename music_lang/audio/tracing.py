@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+tracing.py - 結構化事件追蹤
+音符、休止符、迴圈、賦值等執行事件不直接 print，而是交給追蹤器：
+依等級過濾、保存在有上限的環狀緩衝區，再分送到可替換的輸出端（主控台、JSONL 檔）。
+呼叫端先檢查 tracer.debug / tracer.info 等布林屬性再組訊息，
+停用時每個事件只多一次屬性讀取，不組字串、不寫輸出
+"""
+
+import json
+import sys
+import time
+from collections import deque
+
+# 追蹤等級
+DEBUG = 10     # 逐音符、逐次迴圈的執行細節
+INFO = 20      # 速度、音量、樂器等狀態變更
+WARNING = 30   # 未知樂器、迴圈或呼叫深度達到上限
+ERROR = 40     # 合成或播放失敗
+OFF = 100      # 停用
+
+LEVEL_NAMES = {DEBUG: 'debug', INFO: 'info', WARNING: 'warning', ERROR: 'error'}
+
+
+class TraceRecord:
+    """一筆追蹤事件"""
+
+    __slots__ = ('time', 'level', 'event', 'message', 'fields')
+
+    def __init__(self, level, event, message, fields):
+        self.time = time.time()
+        self.level = level
+        self.event = event
+        self.message = message
+        self.fields = fields
+
+    def to_dict(self):
+        record = {
+            'time': self.time,
+            'level': LEVEL_NAMES.get(self.level, str(self.level)),
+            'event': self.event,
+            'message': self.message,
+        }
+        record.update(self.fields)
+        return record
+
+
+class ConsoleSink:
+    """輸出訊息文字到主控台（預設為寫出當下的 sys.stdout，重新導向後仍然有效）"""
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def write(self, record):
+        print(record.message, file=self.stream or sys.stdout)
+
+    def close(self):
+        pass
+
+
+class JSONLSink:
+    """每筆事件寫成一行 JSON"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def write(self, record):
+        self._file.write(json.dumps(record.to_dict(), ensure_ascii=False, default=str) + '\n')
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+class Tracer:
+    """追蹤器：等級過濾、環狀緩衝區與輸出端
+
+    debug / info / warning / error 屬性表示該等級目前是否啟用，呼叫端以此判斷要不要組訊息；
+    沒有任何輸出端時整個追蹤器停用
+    """
+
+    def __init__(self, level=DEBUG, capacity=4096, sinks=None):
+        self.records = deque(maxlen=capacity)
+        self.sinks = [ConsoleSink()] if sinks is None else list(sinks)
+        self.set_level(level)
+
+    def set_level(self, level):
+        """設定最低記錄等級"""
+        self.level = level
+        effective = level if self.sinks else OFF
+        self.debug = effective <= DEBUG
+        self.info = effective <= INFO
+        self.warning = effective <= WARNING
+        self.error = effective <= ERROR
+
+    def enabled(self, level):
+        return self.level <= level and bool(self.sinks)
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+        self.set_level(self.level)
+
+    def remove_sink(self, sink):
+        """移除輸出端（不關閉）"""
+        self.sinks.remove(sink)
+        self.set_level(self.level)
+
+    def remove_console(self):
+        """移除所有主控台輸出端"""
+        for sink in [sink for sink in self.sinks if isinstance(sink, ConsoleSink)]:
+            self.remove_sink(sink)
+
+    def emit(self, level, event, message, **fields):
+        """記錄一筆事件；低於目前等級時直接略過"""
+        if level < self.level or not self.sinks:
+            return
+        record = TraceRecord(level, event, message, fields)
+        self.records.append(record)
+        for sink in self.sinks:
+            sink.write(record)
+
+    def recent(self, count=None):
+        """環狀緩衝區中最近的事件"""
+        records = list(self.records)
+        return records if count is None else records[-count:]
+
+    def close(self):
+        """關閉所有輸出端"""
+        for sink in self.sinks:
+            sink.close()
+
+
+# 全域追蹤器
+tracer = Tracer()
+
+
+def configure(level=DEBUG, console=True, jsonl=None, capacity=4096):
+    """重新設定全域追蹤器的等級與輸出端，回傳追蹤器"""
+    tracer.close()
+    sinks = []
+    if console:
+        sinks.append(ConsoleSink())
+    if jsonl:
+        sinks.append(JSONLSink(jsonl))
+    tracer.records = deque(maxlen=capacity)
+    tracer.sinks = sinks
+    tracer.set_level(level)
+    return tracer
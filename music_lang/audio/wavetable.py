@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+wavetable.py - 波表振盪器
+依每個樂器的波形配方與泛音設定預先建立單一週期的波表，
+合成時只需向量化的相位累加與線性內插，不再對整個音符重複呼叫 np.sin
+"""
+
+import numpy as np
+
+# 分音振幅低於最大分音這個比例時略過（波表的數值雜訊與可忽略的高次分音）
+PARTIAL_THRESHOLD = 1e-4
+
+
+class Wavetable:
+    """單一樂器的波表"""
+
+    def __init__(self, table, cycles, table_size, decay=None, harmonics=None):
+        # 尾端多放一個取樣點，內插時不需要處理繞回
+        self.table = np.append(table, table[0])
+        self.harmonics = None if harmonics is None else np.append(harmonics, harmonics[0])
+        self.cycles = cycles          # 波表涵蓋的基頻週期數（含次諧波的配方需要 2）
+        self.table_size = table_size  # 每個基頻週期的取樣點數
+        self.decay = decay            # 只作用於基礎波形的指數衰減率
+        self._partials = None
+
+    @property
+    def length(self):
+        return self.table_size * self.cycles
+
+    def partials(self):
+        """波表的分音（加法合成用）：第 k 個是波表基頻（基頻 / cycles）k+1 倍的振幅與相位
+
+        回傳 (基礎波形分音, 泛音分音)，只有帶衰減的波表另外有泛音分音，否則第二項為 None
+        """
+        if self._partials is None:
+            harmonics = None if self.harmonics is None else self._spectrum(self.harmonics)
+            self._partials = (self._spectrum(self.table), harmonics)
+        return self._partials
+
+    @staticmethod
+    def _spectrum(table):
+        """以 FFT 把一張波表分解成正弦分音 (振幅, 相位)，不含直流"""
+        coefficients = np.fft.rfft(table[:-1])[1:]
+        amplitudes = np.abs(coefficients) * (2 / (len(table) - 1))
+        # rfft 的係數對應餘弦，加法合成核心使用正弦
+        phases = np.angle(coefficients) + np.pi / 2
+        amplitudes[amplitudes < PARTIAL_THRESHOLD * amplitudes.max(initial=0.0)] = 0.0
+        # 去掉最高的非零分音之後的部分
+        count = np.flatnonzero(amplitudes)[-1] + 1 if amplitudes.any() else 0
+        return amplitudes[:count], phases[:count]
+
+    @staticmethod
+    def _read(table, index, frac):
+        """線性內插讀取波表"""
+        lower = table[index]
+        lower += frac * (table[index + 1] - lower)
+        return lower
+
+    def render(self, frequency, samples, sample_rate, t=None):
+        """以相位累加器讀取指定頻率、長度的波形"""
+        # 相位以波表索引為單位
+        phase = np.arange(samples, dtype=np.float64)
+        phase *= frequency * self.table_size / sample_rate
+        np.mod(phase, self.length, out=phase)
+        index = phase.astype(np.intp)
+        phase -= index
+
+        wave = self._read(self.table, index, phase)
+        if self.decay:
+            if t is None:
+                t = np.arange(samples) / sample_rate
+            wave *= np.exp(-t * self.decay)
+        if self.harmonics is not None:
+            wave += self._read(self.harmonics, index, phase)
+        return wave
+
+
+class WavetableBank:
+    """依樂器延遲建立並保存波表"""
+
+    def __init__(self, synthesizer, table_size=2048):
+        self.synthesizer = synthesizer
+        self.table_size = table_size
+        self._tables = {}
+
+        # 純正弦波表，用於顫音等低頻調變
+        t = np.arange(table_size) / table_size
+        self._sine = Wavetable(np.sin(2 * np.pi * t), 1, table_size)
+
+    def get(self, instrument):
+        """取得樂器的波表，含隨機噪音的波形無法製表時回傳 None"""
+        if instrument not in self._tables:
+            self._tables[instrument] = self._build(instrument)
+        return self._tables[instrument]
+
+    def _build(self, instrument):
+        """以 1Hz 執行樂器的波形配方，取樣一個（或數個）週期建立波表"""
+        synth = self.synthesizer
+        config = synth.instrument_configs.get(instrument, synth.instrument_configs['piano'])
+        waveform = config['waveform']
+        if waveform in synth.NOISY_WAVEFORMS:
+            return None
+
+        cycles = synth.WAVEFORM_CYCLES.get(waveform, 1)
+        t = np.arange(self.table_size * cycles) / self.table_size
+        tone = synth._generate_tone(waveform, 1.0, t)
+        # 以 1Hz、每秒 table_size 個取樣點合成，剛好對應波表索引
+        harmonics = synth._generate_harmonics(config, 1.0, len(t), self.table_size)
+
+        decay = synth.WAVEFORM_DECAY.get(waveform)
+        if decay:
+            # 衰減只作用在基礎波形，泛音另存一張表
+            return Wavetable(tone, cycles, self.table_size, decay=decay, harmonics=harmonics)
+        return Wavetable(tone + harmonics, cycles, self.table_size)
+
+    def render(self, instrument, frequency, samples, t=None):
+        """讀取樂器波形，無法製表時回傳 None"""
+        table = self.get(instrument)
+        if table is None:
+            return None
+        return table.render(frequency, samples, self.synthesizer.sample_rate, t)
+
+    def sine(self, frequency, samples):
+        """讀取純正弦波"""
+        return self._sine.render(frequency, samples, self.synthesizer.sample_rate)
+
+    def clear(self):
+        """樂器配置變更後清除已建立的波表"""
+        self._tables.clear()
@@ -6,6 +6,7 @@ main.py - PyTune 音樂程式語言主執行檔（支援音色與休止符功能
 import sys
 import os
 import argparse
+import atexit
 from pathlib import Path
 
 # 添加專案根目錄到 Python 路徑
@@ -36,9 +37,10 @@ def import_parser():
     """動態導入解析器"""
     try:
         # 嘗試導入支援音色和休止符的解析器
-        from parser.parser import MusicLanguageParser
+        # 共用同一個已編譯的解析器，解析表由快取檔載入
+        from parser.parser import get_parser
         print("✅ 成功載入支援音色與休止符的解析器")
-        return MusicLanguageParser, True
+        return get_parser, True
     except ImportError:
         try:
             # 回退到原始解析器
@@ -49,8 +51,32 @@ def import_parser():
             print(f"❌ 無法導入解析器: {e}")
             return None, False
 
-def play_music_file(filename):
-    """播放音樂檔案"""
+def parse_source(code, MusicParser, use_cache=True, optimize=True):
+    """解析程式碼；啟用快取時，未修改的原始碼直接從 AST 快取載入，不需要建立解析器"""
+    if not use_cache:
+        ast = MusicParser().parse(code)
+    else:
+        from parser.ast_cache import ASTCache
+        ast_cache = ASTCache()
+        ast = ast_cache.parse(code, MusicParser)
+        if ast_cache.hits:
+            print("🗂️  使用快取的 AST（原始碼未變更）")
+    
+    if optimize:
+        ast = optimize_ast(ast)
+    return ast
+
+def optimize_ast(ast):
+    """執行前的 AST 最佳化：常數折疊、移除不會執行的分支、提出迴圈不變量"""
+    from parser.optimizer import ASTOptimizer
+    optimizer = ASTOptimizer()
+    ast = optimizer.optimize(ast)
+    optimizer.report.show()
+    return ast
+
+def play_music_file(filename, backend=None, use_cache=True, optimize=True, warmup=False, sample_bank=None,
+                    events_csv=None):
+    """播放音樂檔案（backend 為音訊輸出後端，預設 pygame；warmup 時播放前先合成所有不重複的聲音）"""
     try:
         # 檢查檔案是否存在
         if not os.path.exists(filename):
@@ -77,14 +103,13 @@ def play_music_file(filename):
         
         # 解析程式碼
         print("🔍 解析程式碼...")
-        parser = MusicParser()
-        ast = parser.parse(code)
+        ast = parse_source(code, MusicParser, use_cache, optimize)
         print("✅ 解析成功！")
         
         # 初始化音訊系統
         print("🎵 初始化音訊系統...")
         if engine_type == 'enhanced':
-            audio_engine = AudioEngine()
+            audio_engine = AudioEngine(backend=backend, warmup=warmup, sample_bank=sample_bank, events_csv=events_csv)
         else:
             # 原始引擎需要不同的初始化方式
             try:
@@ -92,7 +117,7 @@ def play_music_file(filename):
                 synthesizer = Synthesizer()
                 audio_engine = AudioEngine(synthesizer)
             except ImportError:
-                audio_engine = AudioEngine()
+                audio_engine = AudioEngine(backend=backend, warmup=warmup, sample_bank=sample_bank, events_csv=events_csv)
         
         # 檢查是否使用了音色功能
         if supports_instruments:
@@ -125,7 +150,7 @@ def play_music_file(filename):
         import traceback
         traceback.print_exc()
 
-def play_music_code(code):
+def play_music_code(code, backend=None, optimize=True, warmup=False, sample_bank=None, events_csv=None):
     """播放程式碼字串"""
     try:
         # 導入模組
@@ -138,20 +163,19 @@ def play_music_code(code):
         
         # 解析並執行
         print("🔍 解析程式碼...")
-        parser = MusicParser()
-        ast = parser.parse(code)
+        ast = parse_source(code, MusicParser, use_cache=False, optimize=optimize)
         print("✅ 解析成功！")
         
         print("🎵 初始化音訊系統...")
         if engine_type == 'enhanced':
-            audio_engine = AudioEngine()
+            audio_engine = AudioEngine(backend=backend, warmup=warmup, sample_bank=sample_bank, events_csv=events_csv)
         else:
             try:
                 from audio.synthesizer import Synthesizer
                 synthesizer = Synthesizer()
                 audio_engine = AudioEngine(synthesizer)
             except ImportError:
-                audio_engine = AudioEngine()
+                audio_engine = AudioEngine(backend=backend, warmup=warmup, sample_bank=sample_bank, events_csv=events_csv)
         
         print("🎵 開始播放音樂...")
         if hasattr(audio_engine, 'execute'):
@@ -172,7 +196,97 @@ def play_music_code(code):
         import traceback
         traceback.print_exc()
 
-def interactive_mode():
+def create_cli_backend(args):
+    """依命令列參數建立音訊輸出後端；pygame 回傳 None（由引擎開啟），參數不正確時引發 ValueError"""
+    if args.backend == 'pygame':
+        return None
+    
+    from audio.backends import create_backend
+    backend = create_backend(args.backend, args.output, lookahead=args.lookahead)
+    if args.backend == 'raw':
+        # 提早開啟，之後的文字訊息改印到 stderr，不會混入 PCM 資料
+        backend.open()
+    return backend
+
+def render_music_code(code, output_path, use_cache=False, optimize=True, sample_bank=None):
+    """離線渲染程式碼字串為 WAV 檔（不需要音效裝置）"""
+    try:
+        MusicParser, supports_instruments = import_parser()
+        if not MusicParser:
+            print("❌ 模組載入失敗，無法執行")
+            return
+        
+        from audio.offline_renderer import OfflineRenderer
+        
+        print("🔍 解析程式碼...")
+        ast = parse_source(code, MusicParser, use_cache, optimize)
+        print("✅ 解析成功！")
+        
+        print(f"🎚️  開始離線渲染: {output_path}")
+        renderer = OfflineRenderer(sample_bank=sample_bank)
+        renderer.render(ast, output_path)
+        
+        print("🎵 離線渲染完成！")
+        
+    except SyntaxError as e:
+        print(f"❌ 語法錯誤: {e}")
+    except Exception as e:
+        print(f"❌ 渲染錯誤: {e}")
+        import traceback
+        traceback.print_exc()
+
+def render_music_file(filename, output_path, use_cache=True, optimize=True, sample_bank=None):
+    """離線渲染音樂檔案為 WAV 檔"""
+    if not os.path.exists(filename):
+        print(f"❌ 找不到檔案: {filename}")
+        return
+    
+    with open(filename, 'r', encoding='utf-8') as f:
+        code = f.read()
+    
+    print(f"📁 讀取檔案: {filename}")
+    render_music_code(code, output_path, use_cache, optimize, sample_bank)
+
+def analyze_music_code(code, use_cache=False, optimize=True):
+    """乾跑分析程式碼字串：只在虛擬時鐘上執行，回報長度、音符數與渲染成本估計"""
+    try:
+        MusicParser, supports_instruments = import_parser()
+        if not MusicParser:
+            print("❌ 模組載入失敗，無法執行")
+            return None
+        
+        from audio.analyzer import ProgramAnalyzer
+        
+        print("🔍 解析程式碼...")
+        ast = parse_source(code, MusicParser, use_cache, optimize)
+        print("✅ 解析成功！")
+        
+        report = ProgramAnalyzer().analyze(ast)
+        if report is not None:
+            report.show()
+        return report
+        
+    except SyntaxError as e:
+        print(f"❌ 語法錯誤: {e}")
+    except Exception as e:
+        print(f"❌ 分析錯誤: {e}")
+        import traceback
+        traceback.print_exc()
+    return None
+
+def analyze_music_file(filename, use_cache=True, optimize=True):
+    """乾跑分析音樂檔案"""
+    if not os.path.exists(filename):
+        print(f"❌ 找不到檔案: {filename}")
+        return None
+    
+    with open(filename, 'r', encoding='utf-8') as f:
+        code = f.read()
+    
+    print(f"📁 讀取檔案: {filename}")
+    return analyze_music_code(code, use_cache, optimize)
+
+def interactive_mode(backend=None, optimize=True, warmup=False, sample_bank=None, events_csv=None):
     """互動模式"""
     print("🎹 PyTune 互動模式")
     print("輸入 'exit' 或 'quit' 離開")
@@ -192,14 +306,14 @@ def interactive_mode():
     # 初始化系統
     try:
         if engine_type == 'enhanced':
-            audio_engine = AudioEngine()
+            audio_engine = AudioEngine(backend=backend, warmup=warmup, sample_bank=sample_bank, events_csv=events_csv)
         else:
             try:
                 from audio.synthesizer import Synthesizer
                 synthesizer = Synthesizer()
                 audio_engine = AudioEngine(synthesizer)
             except ImportError:
-                audio_engine = AudioEngine()
+                audio_engine = AudioEngine(backend=backend, warmup=warmup, sample_bank=sample_bank, events_csv=events_csv)
         
         parser = MusicParser()
         print(f"🎼 系統狀態: 音色支援 {'✅' if supports_instruments else '❌'}, 休止符支援 ✅")
@@ -231,6 +345,8 @@ def interactive_mode():
             
             # 解析並執行
             ast = parser.parse(code)
+            if optimize:
+                ast = optimize_ast(ast)
             if hasattr(audio_engine, 'execute'):
                 audio_engine.execute(ast)
             else:
@@ -412,6 +528,12 @@ def main():
   python main.py -c "note C4, 1.0; rest 0.5"  # 執行程式碼（含休止符）
   python main.py -i                           # 互動模式
   python main.py -v examples/test.ptm         # 詳細模式
+  python main.py examples/canon.ptm --render canon.wav  # 離線渲染為 WAV
+  python main.py examples/canon.ptm -b wav -o canon.wav  # 以 WAV 後端執行
+  python main.py examples/canon.ptm -b raw | aplay -f S16_LE -r 44100 -c 2  # PCM 串流
+  python main.py examples/canon.ptm -b null   # 不輸出聲音（效能測試）
+  python main.py examples/canon.ptm --analyze # 乾跑分析長度與渲染成本
+  python main.py examples/canon.ptm -q --trace-file trace.jsonl  # 追蹤寫入檔案，不印到主控台
   python main.py --status                     # 系統狀態
   python main.py --test                       # 音訊系統測試
         """
@@ -458,6 +580,90 @@ def main():
         help='演示休止符功能'
     )
     
+    parser.add_argument(
+        '--render', '-r',
+        metavar='OUTPUT.wav',
+        help='離線渲染為 WAV 檔（不即時播放，不需要音效裝置）'
+    )
+    
+    parser.add_argument(
+        '--analyze', '-a',
+        action='store_true',
+        help='乾跑分析：不合成音訊，回報總長、各樂器音符數、最大同時發聲數與渲染成本估計'
+    )
+    
+    parser.add_argument(
+        '--backend', '-b',
+        choices=['pygame', 'stream', 'wav', 'raw', 'null'],
+        default='pygame',
+        help='音訊輸出後端：pygame 即時播放、stream 預先混音後連續串流播放（無間隙）、'
+             'wav 寫出檔案、raw 輸出 16-bit PCM、null 丟棄輸出（效能測試用）'
+    )
+    
+    parser.add_argument(
+        '--lookahead',
+        type=float,
+        default=0.4,
+        metavar='SECONDS',
+        help='stream 後端預先渲染的音訊長度（秒），出現欠載時加大（預設 0.4）'
+    )
+    
+    parser.add_argument(
+        '--output', '-o',
+        metavar='PATH',
+        help='wav/raw 後端的輸出路徑（raw 未指定或為 - 時輸出到 stdout）'
+    )
+    
+    parser.add_argument(
+        '--warmup', '-w',
+        action='store_true',
+        help='播放前先平行合成程式中所有不重複的音符與和弦（開頭不會因為合成而延遲）'
+    )
+    
+    parser.add_argument(
+        '--sample-bank',
+        nargs='?',
+        const='',
+        metavar='DIR',
+        help='使用磁碟上的預先合成樣本庫取代即時合成（未指定目錄時使用 ~/.cache/pytune/samples）'
+    )
+    
+    parser.add_argument(
+        '--build-sample-bank',
+        action='store_true',
+        help='預先建立所有樂器的樣本庫後結束（可與 --sample-bank DIR 併用）'
+    )
+    
+    parser.add_argument(
+        '--no-parse-cache',
+        action='store_true',
+        help='不使用 AST 快取，每次重新解析檔案'
+    )
+    
+    parser.add_argument(
+        '--quiet', '-q',
+        action='store_true',
+        help='不在主控台顯示逐音符、逐次迴圈的執行追蹤（停用時不產生任何追蹤負擔）'
+    )
+    
+    parser.add_argument(
+        '--trace-file',
+        metavar='PATH.jsonl',
+        help='將執行追蹤事件以 JSONL 格式寫入檔案（可與 --quiet 併用）'
+    )
+    
+    parser.add_argument(
+        '--events-csv',
+        metavar='PATH.csv',
+        help='播放後將每個音符與休止符的預定與實際起奏時間寫出為 CSV（實際 - 預定 = 起奏延遲）'
+    )
+    
+    parser.add_argument(
+        '--no-optimize',
+        action='store_true',
+        help='不執行 AST 最佳化（常數折疊、移除不會執行的分支、提出迴圈不變量）'
+    )
+    
     args = parser.parse_args()
     
     # 設定詳細模式
@@ -465,6 +671,13 @@ def main():
         import logging
         logging.basicConfig(level=logging.DEBUG)
     
+    optimize = not args.no_optimize
+    
+    # 執行追蹤：--quiet 移除主控台輸出，沒有任何輸出端時追蹤完全停用
+    from audio.tracing import configure as configure_tracing
+    tracer = configure_tracing(console=not args.quiet, jsonl=args.trace_file)
+    atexit.register(tracer.close)
+    
     # 系統狀態模式
     if args.status:
         AudioEngine, engine_type = import_audio_modules()
@@ -512,20 +725,67 @@ def main():
         
         melody_with_rests()
         '''
-        play_music_code(demo_code)
+        try:
+            backend = create_cli_backend(args)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return
+        play_music_code(demo_code, backend, optimize, args.warmup, args.sample_bank, args.events_csv)
+        if backend is not None:
+            backend.close()
+        return
+    
+    # 建立樣本庫模式
+    if args.build_sample_bank:
+        from audio.audio_engine import InstrumentSynthesizer
+        from audio.sample_bank import SampleBank
+        bank = SampleBank(InstrumentSynthesizer(), args.sample_bank or None)
+        count = bank.build()
+        print(f"🗃️  樣本庫就緒: {count} 個樂器（{bank.root}）")
+        return
+    
+    # 乾跑分析模式
+    if args.analyze:
+        if args.code:
+            analyze_music_code(args.code, optimize=optimize)
+        elif args.file:
+            analyze_music_file(args.file, not args.no_parse_cache, optimize)
+        else:
+            print("❌ 乾跑分析需要指定檔案或 --code")
+        return
+    
+    # 離線渲染模式
+    if args.render:
+        if args.code:
+            render_music_code(args.code, args.render, optimize=optimize, sample_bank=args.sample_bank)
+        elif args.file:
+            render_music_file(args.file, args.render, not args.no_parse_cache, optimize, args.sample_bank)
+        else:
+            print("❌ 離線渲染需要指定檔案或 --code")
+        return
+    
+    # 建立音訊輸出後端
+    try:
+        backend = create_cli_backend(args)
+    except ValueError as e:
+        print(f"❌ {e}")
         return
     
     # 執行模式判斷
     if args.interactive:
-        interactive_mode()
+        interactive_mode(backend, optimize, args.warmup, args.sample_bank, args.events_csv)
     elif args.code:
-        play_music_code(args.code)
+        play_music_code(args.code, backend, optimize, args.warmup, args.sample_bank, args.events_csv)
     elif args.file:
-        play_music_file(args.file)
+        play_music_file(args.file, backend, not args.no_parse_cache, optimize, args.warmup, args.sample_bank,
+                        args.events_csv)
     else:
         print("❌ 請指定要執行的檔案或使用 --help 查看說明")
         show_examples()
         parser.print_help()
+    
+    if backend is not None:
+        backend.close()
 
 if __name__ == "__main__":
     try:
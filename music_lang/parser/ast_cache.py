@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+ast_cache.py - 磁碟上的 AST 快取
+以（原始碼雜湊, 語法版本, AST 格式版本）為鍵保存解析結果，
+未修改的 .ptm 檔案再次執行時直接載入 AST，完全不需要建立 Lark 解析器
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+from pathlib import Path
+
+from .parser import get_parser, grammar_hash, load_grammar
+
+# AST 結構改變時遞增，使舊的快取項目失效
+AST_FORMAT = 2
+
+
+def default_cache_dir():
+    """預設快取目錄：$PYTUNE_CACHE_DIR，或 $XDG_CACHE_HOME/pytune/ast（預設 ~/.cache）"""
+    if os.environ.get('PYTUNE_CACHE_DIR'):
+        return Path(os.environ['PYTUNE_CACHE_DIR'])
+    base = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(base) / 'pytune' / 'ast'
+
+
+class ASTCache:
+    """內容定址的 AST 快取，總大小超過上限時淘汰最久未使用的項目"""
+
+    def __init__(self, cache_dir=None, max_bytes=64 * 1024 * 1024, grammar_version=None):
+        self.cache_dir = Path(cache_dir) if cache_dir else default_cache_dir()
+        self.max_bytes = max_bytes
+        # 只讀取語法檔計算雜湊，不編譯解析器
+        self.grammar_version = grammar_version or grammar_hash(load_grammar())
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, source):
+        """快取鍵"""
+        digest = hashlib.sha256()
+        digest.update(f"{AST_FORMAT}:{self.grammar_version}:".encode('utf-8'))
+        digest.update(source.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return self.cache_dir / f"{key}.ast"
+
+    def get(self, source):
+        """取得快取的 AST，未命中時回傳 None"""
+        path = self._path(self.key(source))
+        try:
+            with open(path, 'rb') as f:
+                ast = pickle.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception:
+            # 損毀或不相容的快取檔：刪除後視為未命中
+            path.unlink(missing_ok=True)
+            self.misses += 1
+            return None
+
+        # 更新修改時間作為最近使用時間
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return ast
+
+    def put(self, source, ast):
+        """寫入快取（先寫暫存檔再改名，避免其他行程讀到寫到一半的檔案）"""
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(ast, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(self.key(source)))
+        except (OSError, pickle.PicklingError) as e:
+            print(f"⚠️  無法寫入 AST 快取: {e}")
+            return
+        self._evict()
+
+    def parse(self, source, parser_factory=get_parser):
+        """優先從快取取得 AST，未命中時才建立解析器並解析"""
+        ast = self.get(source)
+        if ast is None:
+            ast = parser_factory().parse(source)
+            self.put(source, ast)
+        return ast
+
+    def _entries(self):
+        """所有快取檔（路徑, 大小, 修改時間）"""
+        entries = []
+        for path in self.cache_dir.glob('*.ast'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _evict(self):
+        """總大小超過上限時，依修改時間由舊到新刪除"""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+
+        for path, size, _ in sorted(entries, key=lambda entry: entry[2]):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        """刪除所有快取檔"""
+        for path, _, _ in self._entries():
+            path.unlink(missing_ok=True)
+
+    @property
+    def size(self):
+        """快取總大小（位元組）"""
+        return sum(size for _, size, _ in self._entries())
+
+    def show_stats(self):
+        """顯示快取統計"""
+        if not self.hits and not self.misses:
+            return
+        print(f"  🗂️  AST 快取: 命中 {self.hits}, 未命中 {self.misses}, 淘汰 {self.evictions} "
+              f"({self.cache_dir})")
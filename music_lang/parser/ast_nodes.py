@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+ast_nodes.py - AST 節點類別
+每種節點是一個只有 __slots__ 的小類別，以整數列舉 NodeKind 區分種類，
+比巢狀 dict 省記憶體，直譯器也可以直接比較 kind、讀取屬性；
+to_dict() / from_dict() 與 get() 提供與舊版 dict AST 的相容性
+"""
+
+from enum import IntEnum
+
+
+class NodeKind(IntEnum):
+    """節點種類，名稱的小寫即為舊版 dict AST 的 'type' 字串"""
+    PROGRAM = 0
+    NOTE = 1
+    NOTE_ARRAY = 2
+    CHORD = 3
+    REST = 4
+    TEMPO = 5
+    VOLUME = 6
+    INSTRUMENT = 7
+    INSTRUMENT_NAME = 8
+    LOOP = 9
+    WHILE = 10
+    FOR = 11
+    RANGE = 12
+    IF = 13
+    ELSEIF_CLAUSE = 14
+    ELSE_CLAUSE = 15
+    FUNCTION_DEF = 16
+    FUNCTION_CALL = 17
+    REF_CALL = 18
+    ASSIGN = 19
+    NOTE_LITERAL = 20
+    CHORD_LITERAL = 21
+    IDENTIFIER = 22
+    REF_IDENTIFIER = 23
+    NUMBER = 24
+    BINOP = 25
+    LOGICAL_OP = 26
+    UNARY_OP = 27
+    COMPARISON = 28
+
+    @property
+    def type_name(self):
+        return self.name.lower()
+
+
+class Node:
+    """AST 節點基底類別，欄位即為子類別的 __slots__（依序對應建構子參數）"""
+
+    __slots__ = ()
+    kind = None
+
+    def __init__(self, *values, **fields):
+        slots = self.__slots__
+        for name, value in zip(slots, values):
+            object.__setattr__(self, name, value)
+        for name in slots[len(values):]:
+            object.__setattr__(self, name, fields.get(name))
+
+    @property
+    def type(self):
+        """舊版 dict AST 的 'type' 字串"""
+        return self.kind.type_name
+
+    # === 與 dict AST 相容的讀取介面 ===
+
+    def get(self, key, default=None):
+        if key == 'type':
+            return self.type
+        if key in self.__slots__:
+            return getattr(self, key)
+        return default
+
+    def __getitem__(self, key):
+        if key == 'type':
+            return self.type
+        if key in self.__slots__:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return key == 'type' or key in self.__slots__
+
+    def keys(self):
+        return ('type',) + self.__slots__
+
+    def to_dict(self):
+        """轉換為舊版的巢狀 dict AST"""
+        result = {'type': self.type}
+        for name in self.__slots__:
+            result[name] = _to_dict(getattr(self, name))
+        return result
+
+    # === 比較、顯示與序列化 ===
+
+    def __eq__(self, other):
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        if not isinstance(other, Node) or other.kind != self.kind:
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{self.__class__.__name__}({fields})"
+
+    def __reduce__(self):
+        # 以欄位值重建，pickle 結果比預設的 slots 狀態更精簡
+        return (self.__class__, tuple(getattr(self, name) for name in self.__slots__))
+
+
+def _to_dict(value):
+    if isinstance(value, Node):
+        return value.to_dict()
+    if isinstance(value, list):
+        return [_to_dict(item) for item in value]
+    return value
+
+
+# === 程式與音樂語句 ===
+
+class Program(Node):
+    __slots__ = ('body',)
+    kind = NodeKind.PROGRAM
+
+
+class Note(Node):
+    __slots__ = ('note_value', 'duration')
+    kind = NodeKind.NOTE
+
+
+class NoteArray(Node):
+    __slots__ = ('notes',)
+    kind = NodeKind.NOTE_ARRAY
+
+
+class Chord(Node):
+    __slots__ = ('chord', 'duration')
+    kind = NodeKind.CHORD
+
+
+class Rest(Node):
+    __slots__ = ('duration',)
+    kind = NodeKind.REST
+
+
+class Tempo(Node):
+    __slots__ = ('bpm',)
+    kind = NodeKind.TEMPO
+
+
+class Volume(Node):
+    __slots__ = ('volume',)
+    kind = NodeKind.VOLUME
+
+
+class Instrument(Node):
+    __slots__ = ('instrument',)
+    kind = NodeKind.INSTRUMENT
+
+
+class InstrumentName(Node):
+    __slots__ = ('name',)
+    kind = NodeKind.INSTRUMENT_NAME
+
+
+# === 控制流語句 ===
+
+class Loop(Node):
+    __slots__ = ('count', 'body')
+    kind = NodeKind.LOOP
+
+
+class While(Node):
+    __slots__ = ('condition', 'body')
+    kind = NodeKind.WHILE
+
+
+class For(Node):
+    __slots__ = ('variable', 'range', 'body')
+    kind = NodeKind.FOR
+
+
+class Range(Node):
+    __slots__ = ('start', 'end')
+    kind = NodeKind.RANGE
+
+
+class If(Node):
+    __slots__ = ('condition', 'then_body', 'elseif_clauses', 'else_body')
+    kind = NodeKind.IF
+
+
+class ElseIfClause(Node):
+    __slots__ = ('condition', 'body')
+    kind = NodeKind.ELSEIF_CLAUSE
+
+
+class ElseClause(Node):
+    __slots__ = ('body',)
+    kind = NodeKind.ELSE_CLAUSE
+
+
+# === 函式與賦值 ===
+
+class FunctionDef(Node):
+    __slots__ = ('name', 'params', 'body')
+    kind = NodeKind.FUNCTION_DEF
+
+
+class FunctionCall(Node):
+    __slots__ = ('name', 'args')
+    kind = NodeKind.FUNCTION_CALL
+
+
+class RefCall(Node):
+    __slots__ = ('name', 'args')
+    kind = NodeKind.REF_CALL
+
+
+class Assign(Node):
+    __slots__ = ('var', 'value')
+    kind = NodeKind.ASSIGN
+
+
+# === 基本類型與表達式 ===
+
+class NoteLiteral(Node):
+    __slots__ = ('value',)
+    kind = NodeKind.NOTE_LITERAL
+
+
+class ChordLiteral(Node):
+    __slots__ = ('notes',)
+    kind = NodeKind.CHORD_LITERAL
+
+
+class Identifier(Node):
+    __slots__ = ('name',)
+    kind = NodeKind.IDENTIFIER
+
+
+class RefIdentifier(Node):
+    __slots__ = ('name',)
+    kind = NodeKind.REF_IDENTIFIER
+
+
+class Number(Node):
+    __slots__ = ('value',)
+    kind = NodeKind.NUMBER
+
+
+class BinOp(Node):
+    __slots__ = ('op', 'left', 'right')
+    kind = NodeKind.BINOP
+
+
+class LogicalOp(Node):
+    __slots__ = ('op', 'left', 'right')
+    kind = NodeKind.LOGICAL_OP
+
+
+class UnaryOp(Node):
+    __slots__ = ('op', 'operand')
+    kind = NodeKind.UNARY_OP
+
+
+class Comparison(Node):
+    __slots__ = ('op', 'left', 'right')
+    kind = NodeKind.COMPARISON
+
+
+# 'type' 字串 -> 節點類別
+NODE_CLASSES = {cls.kind.type_name: cls for cls in Node.__subclasses__()}
+
+
+def from_dict(value):
+    """將舊版的巢狀 dict AST 轉換為節點物件（未知的 dict 原樣保留）"""
+    if isinstance(value, list):
+        return [from_dict(item) for item in value]
+    if isinstance(value, dict):
+        cls = NODE_CLASSES.get(value.get('type'))
+        if cls is None:
+            return value
+        return cls(**{name: from_dict(value.get(name)) for name in cls.__slots__})
+    return value
+
+
+def as_program(ast):
+    """取得 Program 節點：接受節點物件或舊版 dict AST，無效時回傳 None"""
+    if isinstance(ast, dict):
+        ast = from_dict(ast)
+    if isinstance(ast, Program):
+        return ast
+    if isinstance(ast, Node):
+        # 只有一個語句的程式，語法的 ?start 直接回傳該語句
+        return Program([ast])
+    return None
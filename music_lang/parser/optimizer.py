@@ -0,0 +1,523 @@
+#!/usr/bin/env python3
+"""
+optimizer.py - AST 最佳化
+在解析之後、執行之前改寫 AST：常數折疊、保守的常數傳播、移除永遠不會執行的分支與迴圈，
+並把迴圈中不變的算術表達式提到迴圈前的暫存變數；求值規則與 audio.compiler 的
+compile_value / compile_condition 完全相同，產生的事件時間軸不變
+"""
+
+from .ast_nodes import (
+    Node, NodeKind, Program, Loop, While, For, Range, If, ElseIfClause,
+    FunctionDef, RefCall, Assign, Rest, Identifier, Number, BinOp, LogicalOp, UnaryOp, Comparison,
+    as_program,
+)
+
+# 暫存變數名稱前綴（語法無法寫出 '$'，不會與使用者變數衝突；
+# 編譯後的程式把這些變數留在私有槽位，不寫回引擎的 variables）
+TEMP_PREFIX = '$hoist'
+
+# 引數為數值的 ref 函式（refInst 的引數是樂器名稱，不能代換）
+VALUE_REF_CALLS = ('refVolume', 'refTempo')
+
+
+def _arithmetic(op, left, right):
+    """與 ProgramCompiler.compile_value 相同的算術規則，未知運算子回傳 None"""
+    if op == '+':
+        return left + right
+    if op == '-':
+        return left - right
+    if op == '*':
+        return left * right
+    if op == '/':
+        return left / right if right != 0 else left
+    return None
+
+
+def _compare(op, left, right):
+    """與 ProgramCompiler.compile_condition 相同的比較規則"""
+    if op == '==':
+        return left == right
+    if op == '!=':
+        return left != right
+    if op == '<':
+        return left < right
+    if op == '>':
+        return left > right
+    if op == '<=':
+        return left <= right
+    if op == '>=':
+        return left >= right
+    return False
+
+
+def _is_number(node):
+    return isinstance(node, Node) and node.kind == NodeKind.NUMBER
+
+
+def _truth(value):
+    return Number(1 if value else 0)
+
+
+class OptimizationReport:
+    """最佳化統計"""
+
+    def __init__(self):
+        self.folded = 0            # 折疊的表達式
+        self.propagated = 0        # 代換為常數的變數讀取
+        self.branches_removed = 0  # 移除的 if/elseif/else 分支
+        self.loops_removed = 0     # 移除的零次迴圈
+        self.hoisted = 0           # 提到迴圈外的不變表達式
+
+    @property
+    def changed(self):
+        return any((self.folded, self.propagated, self.branches_removed,
+                    self.loops_removed, self.hoisted))
+
+    def show(self):
+        """顯示最佳化摘要"""
+        if not self.changed:
+            return
+        print(f"🛠️  AST 最佳化: 常數折疊 {self.folded}, 常數傳播 {self.propagated}, "
+              f"移除分支 {self.branches_removed}, 移除迴圈 {self.loops_removed}, "
+              f"提出迴圈不變量 {self.hoisted}")
+
+
+class ASTOptimizer:
+    """AST 最佳化器，產生新的 AST，不修改輸入
+
+    常數傳播只在執行順序確定的地方使用賦值過的常數：迴圈、if 分支與函式呼叫會改寫的變數
+    在進入時就視為未知；呼叫本程式中沒有定義的函式（例如互動模式先前定義的函式）時，
+    所有已知常數都失效
+    """
+
+    def __init__(self, fold=True, propagate=True, prune=True, hoist=True):
+        self.fold = fold
+        self.propagate = propagate
+        self.prune = prune
+        self.hoist = hoist
+        self.report = OptimizationReport()
+        self._functions = {}
+        self._temps = set()
+        self._function_depth = 0  # 目前在幾層函式主體內
+
+    def optimize(self, ast):
+        """最佳化整個程式，無效的 AST 原樣回傳"""
+        program = as_program(ast)
+        if program is None:
+            return ast
+
+        self._functions = {}
+        self._collect_functions(program.body)
+        return Program(self._block(program.body, {}))
+
+    # === 副作用分析 ===
+
+    def _collect_functions(self, statements):
+        """收集所有函式定義（同名函式可能重複定義，全部保留）"""
+        for node in statements:
+            if not isinstance(node, Node):
+                continue
+            if node.kind == NodeKind.FUNCTION_DEF:
+                self._functions.setdefault(self._name(node.name), []).append(node.body)
+            for body in self._child_blocks(node):
+                self._collect_functions(body)
+
+    def _assigned(self, statements, visiting=None):
+        """語句執行時可能改寫的變數名稱，呼叫未知函式時回傳 None"""
+        names = set()
+        for node in statements:
+            if not isinstance(node, Node):
+                continue
+            kind = node.kind
+            if kind == NodeKind.ASSIGN:
+                names.add(self._name(node.var))
+            elif kind == NodeKind.FOR:
+                names.add(self._name(node.variable))
+            elif kind == NodeKind.FUNCTION_DEF:
+                # 函式主體在呼叫時才執行，定義本身只改寫函式名稱
+                names.add(self._name(node.name))
+                continue
+            elif kind == NodeKind.FUNCTION_CALL:
+                effects = self._call_effects(self._name(node.name), visiting)
+                if effects is None:
+                    return None
+                names |= effects
+
+            for body in self._child_blocks(node):
+                inner = self._assigned(body, visiting)
+                if inner is None:
+                    return None
+                names |= inner
+        return names
+
+    def _call_effects(self, func_name, visiting=None):
+        """呼叫函式可能改寫的變數，本程式中沒有定義時回傳 None"""
+        bodies = self._functions.get(func_name)
+        if bodies is None:
+            return None
+        visiting = set() if visiting is None else visiting
+        if func_name in visiting:
+            return set()
+
+        visiting.add(func_name)
+        names = set()
+        for body in bodies:
+            inner = self._assigned(body, visiting)
+            if inner is None:
+                return None
+            names |= inner
+        visiting.discard(func_name)
+        return names
+
+    @staticmethod
+    def _child_blocks(node):
+        """節點直接包含的語句區塊（不含函式主體）"""
+        kind = node.kind
+        if kind in (NodeKind.LOOP, NodeKind.WHILE, NodeKind.FOR):
+            return [node.body]
+        if kind == NodeKind.IF:
+            return [node.then_body] + [clause.body for clause in node.elseif_clauses] + [node.else_body or []]
+        return []
+
+    @staticmethod
+    def _forget(env, names):
+        """讓可能被改寫的變數失效"""
+        if names is None:
+            env.clear()
+        else:
+            for name in names:
+                env.pop(name, None)
+
+    # === 語句 ===
+
+    def _block(self, statements, env):
+        """依執行順序最佳化語句區塊，env 為目前已知的常數變數（會被更新）"""
+        result = []
+        for node in statements:
+            if not isinstance(node, Node):
+                result.append(node)
+                continue
+
+            kind = node.kind
+            if kind == NodeKind.ASSIGN:
+                result.append(self._assign(node, env))
+            elif kind == NodeKind.REST:
+                result.append(Rest(self._value(node.duration, env)))
+            elif kind == NodeKind.REF_CALL:
+                result.append(self._ref_call(node, env))
+            elif kind == NodeKind.FUNCTION_DEF:
+                env.pop(self._name(node.name), None)
+                # 函式可能在任何時候被呼叫，主體不使用呼叫端的常數
+                self._function_depth += 1
+                try:
+                    body = self._block(node.body, {})
+                finally:
+                    self._function_depth -= 1
+                result.append(FunctionDef(node.name, node.params, body))
+            elif kind == NodeKind.FUNCTION_CALL:
+                self._forget(env, self._call_effects(self._name(node.name)))
+                result.append(node)
+            elif kind == NodeKind.IF:
+                result.extend(self._if(node, env))
+            elif kind in (NodeKind.LOOP, NodeKind.WHILE, NodeKind.FOR):
+                result.extend(self._loop(node, env))
+            else:
+                result.append(node)
+        return result
+
+    def _assign(self, node, env):
+        var_name = self._name(node.var)
+        value = self._value(node.value, env)
+        if self.propagate and _is_number(value):
+            env[var_name] = value.value
+        else:
+            env.pop(var_name, None)
+        return Assign(node.var, value)
+
+    def _ref_call(self, node, env):
+        if self._name(node.name) not in VALUE_REF_CALLS or not node.args:
+            return node
+        return RefCall(node.name, [self._value(arg, env) for arg in node.args])
+
+    def _if(self, node, env):
+        """最佳化 if 語句，回傳取代它的語句串列"""
+        branches = [(node.condition, node.then_body)]
+        branches += [(clause.condition, clause.body) for clause in node.elseif_clauses]
+
+        # 條件都在進入 if 時求值
+        has_else = 1 if node.else_body else 0
+        kept = []
+        else_body = node.else_body or []
+        for index, (condition, body) in enumerate(branches):
+            condition = self._condition(condition, env)
+            if self.prune and _is_number(condition):
+                if condition.value == 0:
+                    self.report.branches_removed += 1
+                    continue
+                # 條件恆成立：之後的分支與 else 都不會執行
+                self.report.branches_removed += len(branches) - index - 1 + has_else
+                if not kept:
+                    return self._block(body, env)
+                kept.append((condition, body))
+                else_body = []
+                break
+            kept.append((condition, body))
+
+        if not kept:
+            return self._block(else_body, env)
+
+        effects = self._assigned([node])
+        new_branches = [(condition, self._block(body, dict(env))) for condition, body in kept]
+        new_else = self._block(else_body, dict(env))
+        self._forget(env, effects)
+
+        (condition, then_body), rest = new_branches[0], new_branches[1:]
+        return [If(condition, then_body,
+                   [ElseIfClause(cond, body) for cond, body in rest],
+                   new_else)]
+
+    def _loop(self, node, env):
+        """最佳化迴圈，回傳取代它的語句串列（迴圈前可能多出提出的暫存變數賦值）"""
+        kind = node.kind
+
+        if self.prune and self._never_runs(node, dict(env)):
+            self.report.loops_removed += 1
+            return []
+
+        effects = self._assigned([node])
+        self._forget(env, effects)
+        # 迴圈主體中只剩下不會被改寫的常數
+        body = self._block(node.body, dict(env))
+
+        if kind == NodeKind.LOOP:
+            loop = Loop(self._value(node.count, env, 1), body)
+        elif kind == NodeKind.WHILE:
+            loop = While(self._condition(node.condition, env), body)
+        else:
+            loop = For(node.variable, Range(self._value(node.range.start, env),
+                                            self._value(node.range.end, env)), body)
+
+        if not self.hoist or effects is None or self._function_depth:
+            # 暫存變數是全域的：函式主體讀寫它就不再只依賴參數，無法記憶化（遞迴呼叫也會改寫它），
+            # 所以函式主體中的迴圈不提出不變量
+            return [loop]
+        if not self._always_runs(loop):
+            # 主體可能一次都不執行時，提到迴圈前的表達式會多算一次
+            return [loop]
+        return self._hoist(loop, effects)
+
+    def _never_runs(self, node, env):
+        """迴圈是否一次都不會執行（只做判斷，不計入統計）"""
+        report, self.report = self.report, OptimizationReport()
+        try:
+            kind = node.kind
+            if kind == NodeKind.LOOP:
+                count = self._value(node.count, env, 1)
+                return _is_number(count) and int(count.value) <= 0
+            if kind == NodeKind.WHILE:
+                condition = self._condition(node.condition, env)
+                return _is_number(condition) and condition.value == 0
+            start = self._value(node.range.start, env)
+            end = self._value(node.range.end, env)
+            return _is_number(start) and _is_number(end) and int(end.value) <= int(start.value)
+        finally:
+            self.report = report
+
+    @staticmethod
+    def _always_runs(loop):
+        """已最佳化的迴圈是否確定至少執行一次（次數或範圍為常數）"""
+        kind = loop.kind
+        if kind == NodeKind.LOOP:
+            return _is_number(loop.count) and int(loop.count.value) >= 1
+        if kind == NodeKind.WHILE:
+            return _is_number(loop.condition) and loop.condition.value != 0
+        start, end = loop.range.start, loop.range.end
+        return _is_number(start) and _is_number(end) and int(end.value) > int(start.value)
+
+    # === 迴圈不變量 ===
+
+    def _hoist(self, loop, assigned):
+        """把迴圈中不依賴迴圈內改寫變數的算術表達式移到迴圈前"""
+        prelude = []
+        temps = {}
+
+        def invariant(expr):
+            return self._identifiers(expr).isdisjoint(assigned)
+
+        def hoist_expr(expr):
+            if not isinstance(expr, Node):
+                return expr
+            kind = expr.kind
+            if kind == NodeKind.BINOP:
+                if invariant(expr) and self._identifiers(expr) and _arithmetic(expr.op, 0, 1) is not None:
+                    key = repr(expr)
+                    if key not in temps:
+                        temps[key] = self._new_temp()
+                        prelude.append(Assign(Identifier(temps[key]), expr))
+                        self.report.hoisted += 1
+                    return Identifier(temps[key])
+                return BinOp(expr.op, hoist_expr(expr.left), hoist_expr(expr.right))
+            if kind == NodeKind.COMPARISON:
+                return Comparison(expr.op, hoist_expr(expr.left), hoist_expr(expr.right))
+            if kind == NodeKind.LOGICAL_OP:
+                return LogicalOp(expr.op, hoist_expr(expr.left), hoist_expr(expr.right))
+            if kind == NodeKind.UNARY_OP:
+                return UnaryOp(expr.op, hoist_expr(expr.operand))
+            return expr
+
+        def hoist_block(statements):
+            result = []
+            for node in statements:
+                if not isinstance(node, Node):
+                    result.append(node)
+                    continue
+                kind = node.kind
+                if kind == NodeKind.ASSIGN:
+                    if self._name(node.var) in self._temps and invariant(node.value):
+                        # 內層迴圈提出的暫存變數，對外層迴圈也不變時繼續往外移
+                        prelude.append(node)
+                        continue
+                    result.append(Assign(node.var, hoist_expr(node.value)))
+                elif kind == NodeKind.REST:
+                    result.append(Rest(hoist_expr(node.duration)))
+                elif kind == NodeKind.REF_CALL and self._name(node.name) in VALUE_REF_CALLS:
+                    result.append(RefCall(node.name, [hoist_expr(arg) for arg in node.args]))
+                elif kind == NodeKind.LOOP:
+                    result.append(Loop(node.count, hoist_block(node.body)))
+                elif kind == NodeKind.WHILE:
+                    result.append(While(hoist_expr(node.condition), hoist_block(node.body)))
+                elif kind == NodeKind.FOR:
+                    result.append(For(node.variable, node.range, hoist_block(node.body)))
+                elif kind == NodeKind.IF:
+                    result.append(If(
+                        hoist_expr(node.condition),
+                        hoist_block(node.then_body),
+                        [ElseIfClause(hoist_expr(clause.condition), hoist_block(clause.body))
+                         for clause in node.elseif_clauses],
+                        hoist_block(node.else_body or [])
+                    ))
+                else:
+                    # 函式定義的主體在呼叫時才執行，不屬於這個迴圈
+                    result.append(node)
+            return result
+
+        kind = loop.kind
+        body = hoist_block(loop.body)
+        if kind == NodeKind.LOOP:
+            loop = Loop(loop.count, body)
+        elif kind == NodeKind.WHILE:
+            loop = While(hoist_expr(loop.condition), body)
+        else:
+            loop = For(loop.variable, loop.range, body)
+        return prelude + [loop]
+
+    def _new_temp(self):
+        name = f"{TEMP_PREFIX}{len(self._temps) + 1}"
+        self._temps.add(name)
+        return name
+
+    def _identifiers(self, expr):
+        """表達式讀取的變數名稱"""
+        if not isinstance(expr, Node):
+            return set()
+        kind = expr.kind
+        if kind == NodeKind.IDENTIFIER:
+            return {expr.name}
+        if kind in (NodeKind.BINOP, NodeKind.COMPARISON, NodeKind.LOGICAL_OP):
+            return self._identifiers(expr.left) | self._identifiers(expr.right)
+        if kind == NodeKind.UNARY_OP:
+            return self._identifiers(expr.operand)
+        return set()
+
+    # === 表達式 ===
+
+    def _value(self, node, env, default=0):
+        """折疊數值表達式（對應 ProgramCompiler.compile_value）"""
+        if not isinstance(node, Node):
+            return node
+        kind = node.kind
+
+        if kind == NodeKind.IDENTIFIER:
+            if self.propagate and node.name in env:
+                self.report.propagated += 1
+                return Number(env[node.name])
+            return node
+
+        if kind == NodeKind.BINOP:
+            left = self._value(node.left, env)
+            right = self._value(node.right, env)
+            if self.fold and _is_number(left) and _is_number(right):
+                value = _arithmetic(node.op, left.value, right.value)
+                if value is not None:
+                    self.report.folded += 1
+                    return Number(value)
+            return BinOp(node.op, left, right)
+
+        return node
+
+    def _condition(self, node, env):
+        """折疊條件表達式（對應 ProgramCompiler.compile_condition），結果為常數時回傳 Number(0/1)"""
+        if not isinstance(node, Node):
+            return Number(0) if self.fold else node
+        kind = node.kind
+
+        if kind == NodeKind.NUMBER:
+            return node
+
+        if kind == NodeKind.IDENTIFIER:
+            return self._value(node, env)
+
+        if kind == NodeKind.COMPARISON:
+            left = self._value(node.left, env)
+            right = self._value(node.right, env)
+            if self.fold and _is_number(left) and _is_number(right):
+                self.report.folded += 1
+                return _truth(_compare(node.op, left.value, right.value))
+            return Comparison(node.op, left, right)
+
+        if kind == NodeKind.LOGICAL_OP:
+            left = self._condition(node.left, env)
+            right = self._condition(node.right, env)
+            if self.fold and node.op in ('and', 'or'):
+                folded = self._fold_logical(node.op, left, right)
+                if folded is not None:
+                    self.report.folded += 1
+                    return folded
+            return LogicalOp(node.op, left, right)
+
+        if kind == NodeKind.UNARY_OP:
+            operand = self._condition(node.operand, env)
+            if self.fold and node.op == 'not' and _is_number(operand):
+                self.report.folded += 1
+                return _truth(operand.value == 0)
+            return UnaryOp(node.op, operand)
+
+        # 算術表達式或其他節點當作條件時恆為假
+        if self.fold:
+            self.report.folded += 1
+            return Number(0)
+        return node
+
+    @staticmethod
+    def _fold_logical(op, left, right):
+        """and/or 任一邊為常數時化簡（條件沒有副作用，不需要保留另一邊的求值）"""
+        for const, other in ((left, right), (right, left)):
+            if not _is_number(const):
+                continue
+            truth = const.value != 0
+            if op == 'and':
+                return other if truth else Number(0)
+            return Number(1) if truth else other
+        return None
+
+    @staticmethod
+    def _name(node):
+        if isinstance(node, Node):
+            return node.get('name', '')
+        return str(node)
+
+
+def optimize(ast):
+    """最佳化 AST，回傳（新的 AST, 最佳化統計）"""
+    optimizer = ASTOptimizer()
+    return optimizer.optimize(ast), optimizer.report
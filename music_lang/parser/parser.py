@@ -4,82 +4,84 @@ parser.py - 完整的音樂程式語言解析器
 支援多樂器、控制流、函式、休止符等完整功能
 """
 
+import hashlib
 import os
+import tempfile
+from pathlib import Path
+
+import lark
 from lark import Lark, Transformer, Tree, Token
 
+from .ast_nodes import (
+    Node, Program, Note, NoteArray, Chord, Rest, Tempo, Volume, Instrument, InstrumentName,
+    Loop, While, For, Range, If, ElseIfClause, ElseClause,
+    FunctionDef, FunctionCall, RefCall, Assign,
+    NoteLiteral, ChordLiteral, Identifier, RefIdentifier, Number,
+    BinOp, LogicalOp, UnaryOp, Comparison,
+)
+
 class MusicTransformer(Transformer):
-    """將解析樹轉換為 AST"""
+    """將解析樹轉換為 AST（ast_nodes 中的節點物件）"""
     
     def start(self, items):
-        return {"type": "program", "body": list(items)}
+        return Program(list(items))
     
     # === 音樂語句處理 ===
     
     def note_stmt(self, items):
         note_value = items[0]
         duration = items[1] if len(items) > 1 else None
-        return {"type": "note", "note_value": note_value, "duration": duration}
+        return Note(note_value, duration)
     
     def note_value(self, items):
         return items[0]
     
     def note_array(self, items):
-        return {"type": "note_array", "notes": items[0]}
+        return NoteArray(items[0])
     
     def chord_stmt(self, items):
         chord = items[0]
         duration = items[1] if len(items) > 1 else None
-        return {"type": "chord", "chord": chord, "duration": duration}
+        return Chord(chord, duration)
     
     def rest_stmt(self, items):
         """處理休止符語句"""
         expression = items[0]
-        return {"type": "rest", "duration": expression}
+        return Rest(expression)
     
     def tempo_stmt(self, items):
-        return {"type": "tempo", "bpm": items[0]}
+        return Tempo(items[0])
     
     def volume_stmt(self, items):
-        return {"type": "volume", "volume": items[0]}
+        return Volume(items[0])
     
     def instrument_stmt(self, items):
         # items[0] 是樂器名稱 (IDENTIFIER)
         instrument_name = str(items[0])
-        return {
-            "type": "instrument", 
-            "instrument": {
-                "type": "instrument_name", 
-                "name": instrument_name
-            }
-        }
+        return Instrument(InstrumentName(instrument_name))
     
     # === 控制流語句處理 ===
     
     def loop_stmt(self, items):
         count = items[0]
         body = items[1:]
-        return {"type": "loop", "count": count, "body": list(body)}
+        return Loop(count, list(body))
     
     def while_stmt(self, items):
         condition = items[0]
         body = items[1:]
-        return {"type": "while", "condition": condition, "body": list(body)}
+        return While(condition, list(body))
     
     def for_stmt(self, items):
         variable = items[0]  # 迴圈變數
         range_expr = items[1]  # 範圍表達式
         body = items[2:]  # 迴圈體
-        return {
-            "type": "for", 
-            "variable": variable, 
-            "range": range_expr, 
-            "body": list(body)
-        }
+        return For(variable, range_expr, list(body))
     
     def range_expr(self, items):
         start = items[0]  # 起始值
         end = items[1]    # 結束值
-        return {"type": "range", "start": start, "end": end}
+        return Range(start, end)
     
     def if_stmt(self, items):
         condition = items[0]
@@ -87,38 +89,24 @@ class MusicTransformer(Transformer):
         elseif_clauses = []
         else_body = []
         
-        # 解析 if 語句的各部分
-        i = 1
-        # 收集 then 部分的語句
-        while i < len(items) and not isinstance(items[i], dict):
-            then_body.append(items[i])
-            i += 1
+        # 解析 if 語句的各部分：先是 then 部分的語句，之後是 elseif / else 子句
+        for item in items[1:]:
+            if isinstance(item, ElseIfClause):
+                elseif_clauses.append(item)
+            elif isinstance(item, ElseClause):
+                else_body = item.body
+            elif not elseif_clauses:
+                then_body.append(item)
         
-        # 處理 elseif 和 else 子句
-        while i < len(items):
-            item = items[i]
-            if isinstance(item, dict):
-                if item.get('type') == 'elseif_clause':
-                    elseif_clauses.append(item)
-                elif item.get('type') == 'else_clause':
-                    else_body = item.get('body', [])
-            i += 1
-        
-        return {
-            "type": "if", 
-            "condition": condition, 
-            "then_body": then_body,
-            "elseif_clauses": elseif_clauses,
-            "else_body": else_body
-        }
+        return If(condition, then_body, elseif_clauses, else_body)
     
     def elseif_clause(self, items):
         condition = items[0]
         body = items[1:]
-        return {"type": "elseif_clause", "condition": condition, "body": list(body)}
+        return ElseIfClause(condition, list(body))
     
     def else_clause(self, items):
-        return {"type": "else_clause", "body": list(items)}
+        return ElseClause(list(items))
     
     # === 函式語句處理 ===
     
@@ -134,12 +122,7 @@ class MusicTransformer(Transformer):
         
         body = items[body_start:] if len(items) > body_start else []
         
-        return {
-            "type": "function_def", 
-            "name": name, 
-            "params": params, 
-            "body": list(body)
-        }
+        return FunctionDef(name, params, list(body))
     
     def fn_call_stmt(self, items):
         name = items[0]
@@ -148,13 +131,13 @@ class MusicTransformer(Transformer):
         # 檢查是否為 ref 函數
         func_name = self._get_name_from_node(name)
         if func_name.startswith('ref'):
-            return {"type": "ref_call", "name": name, "args": args}
+            return RefCall(name, args)
         else:
-            return {"type": "function_call", "name": name, "args": args}
+            return FunctionCall(name, args)
     
     def _get_name_from_node(self, node):
         """從節點獲取名稱字符串"""
-        if isinstance(node, dict):
+        if isinstance(node, Node):
             return node.get('name', '')
         elif isinstance(node, str):
             return node
@@ -168,38 +151,36 @@ class MusicTransformer(Transformer):
         return list(items)
     
     def assignment(self, items):
-        return {"type": "assign", "var": items[0], "value": items[1]}
+        return Assign(items[0], items[1])
     
     # === 基本類型處理 ===
     
     def note_literal(self, items):
         note_str = str(items[0])
-        return {"type": "note_literal", "value": note_str}
+        return NoteLiteral(note_str)
     
     def chord_literal(self, items):
-        return {"type": "chord_literal", "notes": items[0]}
+        return ChordLiteral(items[0])
     
     def note_list(self, items):
         result = []
         for item in items:
-            if isinstance(item, dict) and item.get('type') == 'note_literal':
-                result.append(item)
-            elif isinstance(item, list):
+            if isinstance(item, list):
                 result.extend(item)
             else:
                 result.append(item)
         return result
     
     def identifier(self, items):
-        return {"type": "identifier", "name": str(items[0])}
+        return Identifier(str(items[0]))
     
     def ref_identifier(self, items):
         name = str(items[0])
-        return {"type": "ref_identifier", "name": name}
+        return RefIdentifier(name)
     
     def number(self, items):
         val = str(items[0])
-        return {"type": "number", "value": float(val) if '.' in val else int(val)}
+        return Number(float(val) if '.' in val else int(val))
     
     def duration(self, items):
         return items[0]
@@ -208,229 +189,108 @@ class MusicTransformer(Transformer):
     
     # 算術運算
     def add(self, items):
-        return {"type": "binop", "op": "+", "left": items[0], "right": items[1]}
+        return BinOp('+', items[0], items[1])
     
     def sub(self, items):
-        return {"type": "binop", "op": "-", "left": items[0], "right": items[1]}
+        return BinOp('-', items[0], items[1])
     
     def mul(self, items):
-        return {"type": "binop", "op": "*", "left": items[0], "right": items[1]}
+        return BinOp('*', items[0], items[1])
     
     def div(self, items):
-        return {"type": "binop", "op": "/", "left": items[0], "right": items[1]}
+        return BinOp('/', items[0], items[1])
     
     # 邏輯運算
     def or_expr(self, items):
-        return {"type": "logical_op", "op": "or", "left": items[0], "right": items[1]}
+        return LogicalOp('or', items[0], items[1])
     
     def and_expr(self, items):
-        return {"type": "logical_op", "op": "and", "left": items[0], "right": items[1]}
+        return LogicalOp('and', items[0], items[1])
     
     def not_expr(self, items):
-        return {"type": "unary_op", "op": "not", "operand": items[0]}
+        return UnaryOp('not', items[0])
     
     # 比較運算
     def eq(self, items):
-        return {"type": "comparison", "op": "==", "left": items[0], "right": items[1]}
+        return Comparison('==', items[0], items[1])
     
     def neq(self, items):
-        return {"type": "comparison", "op": "!=", "left": items[0], "right": items[1]}
+        return Comparison('!=', items[0], items[1])
     
     def lt(self, items):
-        return {"type": "comparison", "op": "<", "left": items[0], "right": items[1]}
+        return Comparison('<', items[0], items[1])
     
     def gt(self, items):
-        return {"type": "comparison", "op": ">", "left": items[0], "right": items[1]}
+        return Comparison('>', items[0], items[1])
     
     def lte(self, items):
-        return {"type": "comparison", "op": "<=", "left": items[0], "right": items[1]}
+        return Comparison('<=', items[0], items[1])
     
     def gte(self, items):
-        return {"type": "comparison", "op": ">=", "left": items[0], "right": items[1]}
+        return Comparison('>=', items[0], items[1])
     
     def logical_primary(self, items):
         return items[0]
 
 
-class MusicLanguageParser:
-    """音樂程式語言解析器"""
-    
-    def __init__(self, grammar_file=None):
-        if grammar_file and os.path.exists(grammar_file):
-            with open(grammar_file, 'r', encoding='utf-8') as f:
-                grammar = f.read()
-        else:
-            # 內建語法定義（包含休止符支援）
-            grammar = '''
-// music_lang.lark - 完整的音樂程式語言語法定義
-
-?start: statement*
-
-?statement: note_stmt
-          | chord_stmt  
-          | tempo_stmt
-          | volume_stmt
-          | instrument_stmt
-          | rest_stmt
-          | loop_stmt
-          | fn_stmt
-          | fn_call_stmt
-          | if_stmt
-          | while_stmt
-          | for_stmt
-          | assignment
-          | expression ";"
-
-// === 音樂語句 ===
-
-// 音符語句 - 支援單個音符和音符陣列
-note_stmt: "note" note_value ("," duration)?
-
-// 音符值可以是單個音符或音符陣列
-note_value: note_literal
-          | note_array
-
-// 音符陣列
-note_array: "[" note_list "]"
-
-// 和弦語句  
-chord_stmt: "chord" chord_literal ("," duration)?
-
-// 休止符語句
-rest_stmt: "rest" expression
-
-// 速度設定
-tempo_stmt: "tempo" number
-
-// 音量設定
-volume_stmt: "volume" number
-
-// 樂器設定
-instrument_stmt: "refinst" "=" IDENTIFIER
-
-// === 控制流語句 ===
-
-// 固定次數迴圈語句
-loop_stmt: "loop" number "{" statement* "}"
-
-// 條件迴圈語句
-while_stmt: "while" "(" logical_expr ")" "{" statement* "}"
-
-// 範圍迴圈語句
-for_stmt: "for" "(" identifier "," range_expr ")" "{" statement* "}"
-
-// 範圍表達式
-range_expr: number ":" number
-
-// 條件判斷語句
-if_stmt: "if" "(" logical_expr ")" "{" statement* "}" elseif_clause* else_clause?
-
-elseif_clause: "elseif" "(" logical_expr ")" "{" statement* "}"
-
-else_clause: "else" "{" statement* "}"
+# 語法定義的唯一來源
+GRAMMAR_PATH = Path(__file__).resolve().parent.parent / 'grammar' / 'music_lang.lark'
 
-// === 函式語句 ===
+# 已編譯的 LALR 解析器（依語法檔路徑），同一行程內共用
+_compiled_parsers = {}
+_shared_parser = None
 
-// 函數定義
-fn_stmt: "fn" identifier "(" parameter_list? ")" "{" statement* "}"
 
-// 函數調用語句 - ref 函數優先匹配
-fn_call_stmt: ref_identifier "(" argument_list? ")"
-            | identifier "(" argument_list? ")"
+def grammar_hash(grammar):
+    """語法內容的雜湊值，用於快取檔名與 AST 快取鍵"""
+    return hashlib.sha256(grammar.encode('utf-8')).hexdigest()
 
-// 參數列表
-parameter_list: identifier ("," identifier)*
 
-// 參數列表
-argument_list: expression ("," expression)*
-
-// 賦值語句
-assignment: identifier "=" expression
-
-// === 表達式系統 ===
-
-// 表達式
-?expression: logical_expr
-           | note_literal
-           | chord_literal
-
-// 邏輯表達式
-?logical_expr: logical_or
-
-?logical_or: logical_or "or" logical_and   -> or_expr
-           | logical_and
-
-?logical_and: logical_and "and" comparison -> and_expr
-            | comparison
-
-?comparison: arithmetic_expr "==" arithmetic_expr  -> eq
-           | arithmetic_expr "!=" arithmetic_expr  -> neq
-           | arithmetic_expr "<" arithmetic_expr   -> lt
-           | arithmetic_expr ">" arithmetic_expr   -> gt
-           | arithmetic_expr "<=" arithmetic_expr  -> lte
-           | arithmetic_expr ">=" arithmetic_expr  -> gte
-           | "not" logical_primary                 -> not_expr
-           | logical_primary
-
-?logical_primary: "(" logical_expr ")"
-                | arithmetic_expr
-
-// 算術表達式
-?arithmetic_expr: arithmetic_expr "+" term   -> add
-                | arithmetic_expr "-" term   -> sub
-                | term
-
-?term: term "*" factor -> mul
-     | term "/" factor -> div
-     | factor
-
-?factor: "(" arithmetic_expr ")"
-       | atom
-
-?atom: number
-     | identifier
-
-// === 基本類型 ===
-
-// 音符字面值 - 支援無引號音符
-note_literal: SIMPLE_NOTE
-
-// 和弦字面值
-chord_literal: "[" note_list "]"
-
-// 音符列表
-note_list: note_literal ("," note_literal)*
-
-// 其他基本類型
-duration: number
-identifier: IDENTIFIER
-ref_identifier: REF_IDENTIFIER
-number: NUMBER
-
-// === Token 定義 ===
-
-// 音符 Token - 支援升降號和八度
-SIMPLE_NOTE: /[A-Ga-g][#b]?[0-9]/
-
-// 標識符 Token
-IDENTIFIER: /[a-zA-Z_][a-zA-Z0-9_]*/
-REF_IDENTIFIER: /ref[A-Z][a-zA-Z0-9_]*/
+def _cache_path(grammar):
+    """解析表快取檔路徑：以語法雜湊與 lark 版本命名，語法或 lark 更新後自動失效"""
+    name = f"music_lang.{grammar_hash(grammar)[:16]}.lark-{lark.__version__}.cache"
+    cache_dir = GRAMMAR_PATH.parent / '__pycache__'
+    try:
+        cache_dir.mkdir(exist_ok=True)
+        if os.access(cache_dir, os.W_OK):
+            return str(cache_dir / name)
+    except OSError:
+        pass
+    # 套件目錄不可寫入時改用暫存目錄
+    return os.path.join(tempfile.gettempdir(), f"pytune-{name}")
+
+
+def load_grammar(grammar_file=None):
+    """讀取語法檔（預設 grammar/music_lang.lark）"""
+    with open(grammar_file or GRAMMAR_PATH, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def _compile_parser(grammar_file=None):
+    """取得已編譯的 LALR 解析器：行程內只編譯一次，解析表序列化到快取檔供下次啟動直接載入"""
+    key = os.path.abspath(grammar_file or GRAMMAR_PATH)
+    compiled = _compiled_parsers.get(key)
+    if compiled is None:
+        grammar = load_grammar(key)
+        compiled = _compiled_parsers[key] = Lark(
+            grammar,
+            parser='lalr',
+            transformer=MusicTransformer(),
+            cache=_cache_path(grammar)
+        )
+    return compiled
 
-// 數字 Token
-NUMBER: /[0-9]+(\\.[0-9]+)?/
 
-// 註解和空白字符
-COMMENT: "//" /[^\\n]*/
-%ignore COMMENT
-%ignore /\\s+/
-            '''
+class MusicLanguageParser:
+    """音樂程式語言解析器"""
+    
+    def __init__(self, grammar_file=None):
+        if grammar_file and not os.path.exists(grammar_file):
+            print(f"⚠️  找不到語法檔 {grammar_file}，使用內建語法 {GRAMMAR_PATH.name}")
+            grammar_file = None
         
         try:
-            self.parser = Lark(
-                grammar,
-                parser='lalr',
-                transformer=MusicTransformer()
-            )
+            self.parser = _compile_parser(grammar_file)
             print("✅ 解析器初始化成功（支援休止符）")
         except Exception as e:
             print(f"❌ 解析器初始化失敗: {e}")
@@ -445,6 +305,14 @@ COMMENT: "//" /[^\\n]*/
             print(f"❌ 語法錯誤: {e}")
             raise SyntaxError(f"語法錯誤: {e}")
 
+
+def get_parser():
+    """取得行程內共用的解析器實例"""
+    global _shared_parser
+    if _shared_parser is None:
+        _shared_parser = MusicLanguageParser()
+    return _shared_parser
+
 def test_parser():
     """測試解析器（包含休止符）"""
     parser = MusicLanguageParser()
@@ -3,7 +3,12 @@
 quick_test.py - 快速測試不同程式碼的腳本
 """
 
-from parser import MusicLanguageParser
+import sys
+from pathlib import Path
+
+# 以套件方式載入解析器（parser.py 使用相對匯入）
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from parser.parser import MusicLanguageParser
 import json
 
 def pretty_print_ast(ast, indent=0):
@@ -34,7 +39,7 @@ def test_code(code, description=""):
     
     try:
         parser = MusicLanguageParser()
-        ast = parser.parse(code)
+        ast = parser.parse(code).to_dict()
         print("✅ 解析成功!")
         print("AST結構:")
         pretty_print_ast(ast)
@@ -106,7 +111,7 @@ def interactive_test():
             if not code:
                 continue
                 
-            ast = parser.parse(code)
+            ast = parser.parse(code).to_dict()
             print("✅ 解析成功!")
             pretty_print_ast(ast)
             
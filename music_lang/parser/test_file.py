@@ -3,9 +3,13 @@
 test_file.py - 測試 .ptm 檔案的腳本
 """
 
-from parser import MusicLanguageParser
-import os
 import sys
+from pathlib import Path
+
+# 以套件方式載入解析器（parser.py 使用相對匯入）
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from parser.parser import MusicLanguageParser
+import os
 
 def test_ptm_file(filename):
     """測試 .ptm 檔案"""
@@ -28,7 +32,7 @@ def test_ptm_file(filename):
         
         # 解析程式碼
         parser = MusicLanguageParser()
-        ast = parser.parse(code)
+        ast = parser.parse(code).to_dict()
         
         print("✅ 解析成功!")
         print("\n🌳 AST結構:")
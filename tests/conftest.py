@@ -0,0 +1,61 @@
+"""
+測試共用設定：music_lang 加入 sys.path（與 main.py 相同的匯入方式），
+音訊改用 SDL dummy 驅動，快取寫到暫存目錄
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+PACKAGE = ROOT / 'music_lang'
+
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+if str(PACKAGE) not in sys.path:
+    sys.path.insert(0, str(PACKAGE))
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """每個測試使用獨立的 AST／樣本庫快取目錄"""
+    path = tmp_path / 'cache'
+    monkeypatch.setenv('PYTUNE_CACHE_DIR', str(path))
+    return path
+
+
+@pytest.fixture
+def parse():
+    """將原始碼解析為 AST（不經過快取與最佳化）"""
+    from parser.parser import get_parser
+
+    def parse(code):
+        return get_parser().parse(code)
+    return parse
+
+
+@pytest.fixture
+def engine():
+    """以 null 後端建立的音訊引擎"""
+    from audio.audio_engine import AudioEngine
+    from audio.backends import NullBackend
+    return AudioEngine(backend=NullBackend())
+
+
+@pytest.fixture
+def trace(tmp_path):
+    """將追蹤事件寫到 JSONL（不輸出到主控台），回傳讀取所有事件的函式；結束後恢復預設追蹤器"""
+    import json
+
+    from audio.tracing import configure
+
+    path = tmp_path / 'trace.jsonl'
+    tracer = configure(console=False, jsonl=path)
+
+    def records():
+        tracer.close()
+        with open(path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+    yield records
+    configure()
@@ -0,0 +1,44 @@
+"""
+加法合成核心：一次計算所有音符的所有泛音，結果與逐一相加的正弦波相同
+"""
+
+import numpy as np
+
+from audio.additive import additive_synthesis
+
+RATE = 44100
+
+
+def reference(frequencies, amplitudes, samples, phases=None):
+    n = np.arange(samples)
+    phases = np.zeros(len(amplitudes)) if phases is None else phases
+    wave = np.zeros(samples)
+    for frequency in frequencies:
+        for k, (amplitude, phase) in enumerate(zip(amplitudes, phases)):
+            partial = frequency * (k + 1)
+            if partial < RATE / 2:
+                wave += amplitude * np.sin(2 * np.pi * partial * n / RATE + phase)
+    return wave
+
+
+def test_matches_per_partial_sum_across_blocks():
+    frequencies = [220.0, 277.18, 329.63]
+    amplitudes = [1.0, 0.5, 0.0, 0.25]
+    phases = [0.0, 0.3, 0.0, 1.2]
+    # 長度不是區塊大小的整數倍，最後一個區塊較短
+    wave = additive_synthesis(frequencies, amplitudes, 10_000, RATE, phases, block_size=4096)
+    np.testing.assert_allclose(wave, reference(frequencies, amplitudes, 10_000, phases), atol=1e-9)
+
+
+def test_partials_above_nyquist_are_dropped():
+    wave = additive_synthesis([15_000.0], [1.0, 1.0], 1000, RATE)
+    np.testing.assert_allclose(wave, reference([15_000.0], [1.0], 1000), atol=1e-9)
+    assert not additive_synthesis([30_000.0], [1.0], 100, RATE).any()
+
+
+def test_writes_into_preallocated_buffer():
+    out = np.full(2000, 7.0)
+    wave = additive_synthesis(440.0, [1.0], 1500, RATE, out=out)
+    assert np.shares_memory(wave, out)
+    assert len(wave) == 1500
+    np.testing.assert_allclose(wave, reference([440.0], [1.0], 1500), atol=1e-9)
@@ -0,0 +1,85 @@
+"""
+乾跑分析：事件計數、同時發聲數，以及串流渲染的記憶體估計
+"""
+
+import tracemalloc
+
+import pytest
+
+from audio import backends
+from audio.analyzer import ProgramAnalyzer
+from audio.audio_engine import InstrumentSynthesizer
+from audio.offline_renderer import OfflineRenderer
+from audio.timeline import TimelineCompiler
+
+PROGRAM = """
+refinst = piano
+note C4, 0.5
+chord [C4, E4, G4], 0.5
+rest 0.25
+refinst = flute
+note A4, 0.25
+rest 0.25
+"""
+
+
+def melody(repeats):
+    return "refinst = organ\n" + "note C4, 0.2\nnote E4, 0.2\nrest 0.1\n" * repeats
+
+
+def test_counts_and_polyphony(parse):
+    report = ProgramAnalyzer().analyze(parse(PROGRAM))
+    assert report.duration == pytest.approx(1.75)
+    assert report.instruments['piano']['notes'] == 4
+    assert report.instruments['piano']['rests'] == 1
+    assert report.instruments['flute'] == {'notes': 1, 'rests': 1, 'sounding': pytest.approx(0.25)}
+    assert report.note_count == 5
+    assert report.rest_count == 2
+    assert report.peak_polyphony == 3
+    assert report.peak_time == pytest.approx(0.5)
+    assert report.to_dict()['notes'] == 5
+
+
+def test_analysis_does_not_initialize_audio(parse, monkeypatch, capsys):
+    ast = parse(PROGRAM)
+    capsys.readouterr()
+
+    def forbidden(*args, **kwargs):
+        raise AssertionError("乾跑分析不應該建立合成器或開啟輸出後端")
+
+    monkeypatch.setattr(InstrumentSynthesizer, '__init__', forbidden)
+    monkeypatch.setattr(backends, 'open_backend', forbidden)
+    report = ProgramAnalyzer().analyze(ast)
+    assert report.note_count == 5
+    # 沒有引擎初始化訊息
+    assert '初始化' not in capsys.readouterr().out
+
+
+def test_memory_estimate_does_not_grow_with_duration(parse):
+    analyzer = ProgramAnalyzer()
+    short = analyzer.analyze(parse(melody(4)))
+    long = analyzer.analyze(parse(melody(200)))
+    assert long.duration > 40 * short.duration
+    # 串流渲染只保留一個區塊與正在發聲的聲部，不會配置整首的主緩衝區
+    assert long.estimated_memory < 2 * short.estimated_memory
+    assert long.estimated_memory < long.duration * 44100 * 8
+
+
+def test_memory_estimate_bounds_streaming_render(parse):
+    ast = parse(PROGRAM)
+    report = ProgramAnalyzer().analyze(ast)
+    timeline = TimelineCompiler().compile(ast)
+    renderer = OfflineRenderer()
+    # 波表屬於常駐資料，先建立好，不算在渲染峰值內
+    for instrument in ('piano', 'flute'):
+        renderer.synthesizer.wavetables.get(instrument)
+
+    tracemalloc.start()
+    try:
+        for _ in renderer.stream_pcm(timeline):
+            pass
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak <= report.estimated_memory * 1.25
+    assert report.estimated_memory <= peak * 3
@@ -0,0 +1,71 @@
+"""
+AST 快取：未修改的原始碼直接載入 AST；原始碼、語法或格式版本改變時失效
+"""
+
+import os
+
+from parser import ast_cache
+from parser.ast_cache import ASTCache
+
+SOURCE = "refinst = piano\nnote C4, 0.5\nrest 0.25"
+
+
+class CountingParser:
+    def __init__(self, parse):
+        self._parse = parse
+        self.calls = 0
+
+    def parse(self, source):
+        self.calls += 1
+        return self._parse(source)
+
+
+def test_hit_skips_parser(tmp_path, parse):
+    cache = ASTCache(tmp_path)
+    parser = CountingParser(parse)
+    first = cache.parse(SOURCE, lambda: parser)
+    second = cache.parse(SOURCE, lambda: parser)
+
+    assert parser.calls == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert second.to_dict() == first.to_dict()
+
+
+def test_source_change_invalidates(tmp_path, parse):
+    cache = ASTCache(tmp_path)
+    cache.put(SOURCE, parse(SOURCE))
+    assert cache.get(SOURCE + "\nrest 0.5") is None
+    assert cache.get(SOURCE) is not None
+
+
+def test_grammar_and_format_changes_invalidate(tmp_path, parse, monkeypatch):
+    ASTCache(tmp_path, grammar_version='a').put(SOURCE, parse(SOURCE))
+    assert ASTCache(tmp_path, grammar_version='a').get(SOURCE) is not None
+    assert ASTCache(tmp_path, grammar_version='b').get(SOURCE) is None
+
+    monkeypatch.setattr(ast_cache, 'AST_FORMAT', ast_cache.AST_FORMAT + 1)
+    assert ASTCache(tmp_path, grammar_version='a').get(SOURCE) is None
+
+
+def test_corrupt_entry_is_removed(tmp_path):
+    cache = ASTCache(tmp_path)
+    path = tmp_path / f"{cache.key(SOURCE)}.ast"
+    path.write_bytes(b'not a pickle')
+    assert cache.get(SOURCE) is None
+    assert not path.exists()
+
+
+def test_evicts_least_recently_used(tmp_path, parse):
+    cache = ASTCache(tmp_path)
+    sources = [f"note C4, 0.5\nrest {i}" for i in range(3)]
+    for i, source in enumerate(sources):
+        cache.put(source, parse(source))
+        os.utime(tmp_path / f"{cache.key(source)}.ast", (i, i))
+
+    size = (tmp_path / f"{cache.key(sources[0])}.ast").stat().st_size
+    cache.max_bytes = 2 * size + size // 2
+    cache._evict()
+    assert cache.get(sources[0]) is None
+    assert cache.get(sources[1]) is not None
+    assert cache.get(sources[2]) is not None
+    assert cache.evictions == 1
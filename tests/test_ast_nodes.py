@@ -0,0 +1,109 @@
+"""
+AST 節點：__slots__ 類別以 NodeKind 區分，並與舊版 dict AST 互相轉換
+"""
+
+import pickle
+
+import pytest
+
+from parser.ast_nodes import NODE_CLASSES, Node, NodeKind, Number, Program, Rest, as_program, from_dict
+
+PROGRAM = """
+tempo 120
+refinst = piano
+x = 1 + 2 * 3
+note C4, 0.5
+note [C4, E4], 0.25
+chord [C4, E4, G4], 1.0
+rest x / 4
+loop 2 {
+    note D4, 0.5
+}
+for (i, 0:3) {
+    rest 0.1
+}
+while (x > 0 and not (x == 5)) {
+    x = x - 1
+}
+if (x == 0) {
+    note E4, 0.5
+} elseif (x < 0) {
+    note F4, 0.5
+} else {
+    note G4, 0.5
+}
+fn hop(n, m) {
+    rest n
+}
+hop(0.1, 2)
+refVolume(0.5)
+"""
+
+
+def walk(node):
+    if isinstance(node, list):
+        for item in node:
+            yield from walk(item)
+    elif isinstance(node, Node):
+        yield node
+        for name in node.__slots__:
+            yield from walk(getattr(node, name))
+
+
+def test_every_kind_has_a_slotted_class():
+    assert set(NODE_CLASSES) == {kind.type_name for kind in NodeKind}
+    for cls in NODE_CLASSES.values():
+        assert '__dict__' not in dir(cls())
+
+
+def test_dict_round_trip(parse):
+    ast = parse(PROGRAM)
+    data = ast.to_dict()
+    assert data['type'] == 'program'
+    assert from_dict(data) == ast
+    assert from_dict(data).to_dict() == data
+    assert as_program(data) == ast
+    # 與 dict 直接比較時以 to_dict() 比較
+    assert ast == data
+
+
+def test_parser_covers_most_kinds(parse):
+    kinds = {node.kind for node in walk(parse(PROGRAM))}
+    assert kinds >= {
+        NodeKind.PROGRAM, NodeKind.NOTE, NodeKind.NOTE_ARRAY, NodeKind.CHORD, NodeKind.REST,
+        NodeKind.TEMPO, NodeKind.INSTRUMENT, NodeKind.LOOP, NodeKind.WHILE, NodeKind.FOR,
+        NodeKind.IF, NodeKind.ELSEIF_CLAUSE, NodeKind.FUNCTION_DEF, NodeKind.FUNCTION_CALL,
+        NodeKind.REF_CALL, NodeKind.ASSIGN, NodeKind.BINOP, NodeKind.LOGICAL_OP,
+        NodeKind.UNARY_OP, NodeKind.COMPARISON, NodeKind.NUMBER, NodeKind.IDENTIFIER,
+    }
+
+
+def test_dict_style_access():
+    rest = Rest(Number(0.5))
+    assert rest['type'] == rest.type == 'rest'
+    assert rest.get('duration') == Number(0.5)
+    assert rest.get('missing', 1) == 1
+    assert 'duration' in rest and 'type' in rest
+    assert rest.keys() == ('type', 'duration')
+    with pytest.raises(KeyError):
+        rest['missing']
+    with pytest.raises(AttributeError):
+        rest.extra = 1
+
+
+def test_pickle_round_trip(parse):
+    ast = parse(PROGRAM)
+    assert pickle.loads(pickle.dumps(ast)) == ast
+
+
+def test_invalid_ast_is_not_a_program():
+    assert as_program({'type': 'unknown'}) is None
+    assert as_program(None) is None
+    assert isinstance(as_program({'type': 'program', 'body': []}), Program)
+
+
+def test_single_statement_is_wrapped_in_program(parse):
+    ast = parse('note C4, 1.0')
+    assert as_program(ast) == Program([ast])
+    assert as_program(ast.to_dict()) == Program([ast])
+    assert as_program(Number(1)) == Program([Number(1)])
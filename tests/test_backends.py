@@ -0,0 +1,138 @@
+"""
+音訊輸出後端：WAV 檔串流寫出與後端選擇
+"""
+
+import io
+import sys
+import time
+import wave
+
+import numpy as np
+
+from audio.backends import PygameStreamBackend, RawPCMBackend, WavFileBackend, create_backend
+
+
+def block(value, frames=100):
+    return np.full((frames, 2), value, dtype=np.int16)
+
+
+def test_wav_backend_appends_blocks_and_patches_header_on_close(tmp_path):
+    path = tmp_path / 'out.wav'
+    backend = WavFileBackend(path)
+    backend.play(block(1000), 0)
+    backend.flush()
+    size_after_first = path.stat().st_size
+
+    backend.play(block(-1000), 100)
+    backend.flush()
+    # 第二次只附加新的區塊，不重寫先前的資料
+    assert path.stat().st_size == size_after_first + 100 * 4
+    backend.close()
+
+    with wave.open(str(path), 'rb') as wav_file:
+        assert wav_file.getnframes() == 200
+        assert wav_file.getnchannels() == 2
+        data = np.frombuffer(wav_file.readframes(200), dtype='<i2').reshape(-1, 2)
+    assert (data[:100] == 1000).all()
+    assert (data[100:] == -1000).all()
+
+
+def test_wav_backend_without_output_writes_nothing(tmp_path):
+    path = tmp_path / 'silent.wav'
+    WavFileBackend(path).close()
+    assert not path.exists()
+
+
+def test_raw_backend_restores_stdout_on_close(monkeypatch):
+    stdout = io.TextIOWrapper(io.BytesIO())
+    monkeypatch.setattr(sys, 'stdout', stdout)
+    backend = RawPCMBackend()
+    backend.open()
+    # 播放期間文字訊息改印到 stderr
+    assert sys.stdout is sys.stderr
+    backend.play(block(7, frames=10), 0)
+    backend.close()
+
+    assert sys.stdout is stdout
+    assert stdout.buffer.getvalue() == block(7, frames=10).tobytes()
+
+
+def test_raw_backend_writes_to_output_file(tmp_path):
+    path = tmp_path / 'out.pcm'
+    stdout = sys.stdout
+    backend = create_backend('raw', str(path))
+    backend.open()
+    assert sys.stdout is stdout
+    backend.play(block(3, frames=5), 0)
+    backend.close()
+    assert path.read_bytes() == block(3, frames=5).tobytes()
+
+
+# === pygame 串流後端 ===
+
+class FakeChannel:
+    """依實際時間播放的 pygame Channel 替身：每個區塊播放 seconds 秒，播完自動接上排隊的區塊"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.played = []
+        self._end = None
+        self._queued = None
+
+    def _update(self):
+        now = time.perf_counter()
+        while self._end is not None and now >= self._end:
+            if self._queued is None:
+                self._end = None
+            else:
+                self.played.append(self._queued)
+                self._queued = None
+                self._end += self.seconds
+
+    def play(self, sound):
+        self._update()
+        self.played.append(sound)
+        self._end = time.perf_counter() + self.seconds
+
+    def queue(self, sound):
+        self._queued = sound
+
+    def get_busy(self):
+        self._update()
+        return self._end is not None
+
+    def get_queue(self):
+        self._update()
+        return self._queued
+
+
+def stream_backend(block_size, lookahead):
+    backend = PygameStreamBackend(lookahead=lookahead)
+    backend._channel = FakeChannel(block_size / backend.sample_rate)
+    backend.make_sound = lambda pcm: pcm
+    return backend
+
+
+def test_stream_backend_plays_blocks_in_order_without_gaps():
+    block_size = 441  # 10ms
+    backend = stream_backend(block_size, lookahead=0.03)
+    blocks = [block(i, frames=block_size) for i in range(15)]
+    played, underruns = backend.stream(iter(blocks), block_size)
+
+    assert (played, underruns) == (15, 0)
+    assert [int(sound[0, 0]) for sound in backend._channel.played] == list(range(15))
+
+
+def test_stream_backend_counts_underruns():
+    block_size = 441
+
+    def slow_blocks():
+        for i in range(4):
+            time.sleep(0.03)  # 渲染比播放慢
+            yield block(i, frames=block_size)
+
+    backend = stream_backend(block_size, lookahead=0.0)
+    played, underruns = backend.stream(slow_blocks(), block_size)
+    assert played == 4
+    assert underruns >= 1
+    assert backend.underruns == underruns
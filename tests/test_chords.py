@@ -0,0 +1,66 @@
+"""
+和弦：所有聲部相加成一個緩衝區，以一個聲音播放，不另外開執行緒
+"""
+
+import threading
+
+import numpy as np
+
+import pytest
+
+from audio import audio_engine
+from audio.audio_engine import InstrumentSynthesizer
+
+
+def test_render_chord_sums_voices_into_one_buffer():
+    synth = InstrumentSynthesizer()
+    frequencies = [261.63, 329.63, 392.0]
+    chord = synth.render_chord(frequencies, 0.25, 'organ', 0.4)
+
+    expected = sum(synth._waveform(f, 0.25, 'organ') for f in frequencies) * 0.4
+    peak = np.max(np.abs(expected))
+    if peak > 0.8:
+        expected *= 0.8 / peak
+    # 和弦以分音直接合成，與逐音讀取波表只差在波表的內插誤差
+    np.testing.assert_allclose(chord, expected, atol=1e-4)
+    # 整體正規化，不是逐聲部削波
+    assert np.max(np.abs(chord)) <= 0.8 + 1e-9
+
+
+@pytest.mark.parametrize('instrument', ['organ', 'trumpet', 'violin'])
+def test_chord_uses_one_additive_kernel_call(monkeypatch, instrument):
+    synth = InstrumentSynthesizer()
+    # 先建立波表（建表時也會呼叫核心一次）
+    synth.wavetables.get(instrument)
+    calls = []
+    kernel = audio_engine.additive_synthesis
+
+    def counting(frequencies, *args, **kwargs):
+        calls.append(len(np.atleast_1d(frequencies)))
+        return kernel(frequencies, *args, **kwargs)
+
+    monkeypatch.setattr(audio_engine, 'additive_synthesis', counting)
+    synth.render_chord([261.63, 329.63, 392.0, 523.25], 0.1, instrument, 0.4)
+    # 所有聲部的所有分音在同一次呼叫中計算
+    assert calls == [4]
+
+
+def test_single_note_chord_matches_render_note():
+    synth = InstrumentSynthesizer()
+    np.testing.assert_array_equal(
+        synth.render_chord([440.0], 0.1, 'organ', 0.4),
+        synth.render_note(440.0, 0.1, 'organ', 0.4),
+    )
+
+
+def test_play_chord_plays_one_sound_without_threads(engine, monkeypatch):
+    def no_threads(*args, **kwargs):
+        raise AssertionError("和弦不應該開執行緒")
+
+    monkeypatch.setattr(threading.Thread, 'start', no_threads)
+    engine.play_chord(['C4', 'E4', 'G4'], 0.1)
+
+    assert engine.backend.sounds_played == 1
+    records = engine.recorder.to_numpy()
+    assert len(records) == 3
+    assert len(set(records['scheduled'].tolist())) == 1
@@ -0,0 +1,118 @@
+"""
+命令列冒煙測試：以 null 後端執行 main.py 的每種模式，確認不會中途拋出例外
+"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+PACKAGE = Path(__file__).resolve().parent.parent / 'music_lang'
+
+PROGRAM = """
+tempo 240
+refinst = piano
+note C4, 0.1
+chord [C4, E4, G4], 0.1
+rest 0.05
+fn hop(n) {
+    note C5, 0.05
+}
+hop(1)
+hop(1)
+"""
+
+
+def run_cli(*args, stdin=None, cache_dir=None):
+    env = dict(os.environ, SDL_AUDIODRIVER='dummy')
+    if cache_dir is not None:
+        env['PYTUNE_CACHE_DIR'] = str(cache_dir)
+    result = subprocess.run(
+        [sys.executable, 'main.py', *args],
+        cwd=PACKAGE, env=env, input=stdin, capture_output=True, timeout=120,
+    )
+    output = result.stdout.decode('utf-8', 'replace') + result.stderr.decode('utf-8', 'replace')
+    assert result.returncode == 0, output
+    assert 'Traceback' not in output, output
+    assert '程式執行失敗' not in output, output
+    return result, output
+
+
+@pytest.fixture
+def program(tmp_path):
+    path = tmp_path / 'smoke.ptm'
+    path.write_text(PROGRAM, encoding='utf-8')
+    return path
+
+
+def test_play_file(program, cache_dir):
+    _, output = run_cli(str(program), '-b', 'null', '-q', cache_dir=cache_dir)
+    assert '音樂播放完成' in output
+
+
+def test_play_code(cache_dir):
+    _, output = run_cli('--code', 'note C4, 0.1\nrest 0.1', '-b', 'null', cache_dir=cache_dir)
+    assert '音樂播放完成' in output
+
+
+def test_demo_rest(cache_dir):
+    _, output = run_cli('--demo-rest', '-b', 'null', '-q', cache_dir=cache_dir)
+    assert '音樂播放完成' in output
+
+
+def test_demo_rest_passes_playback_options(tmp_path, cache_dir):
+    csv_path = tmp_path / 'demo.csv'
+    _, output = run_cli('--demo-rest', '-b', 'null', '-q', '--warmup', '--events-csv', str(csv_path),
+                        cache_dir=cache_dir)
+    assert '預熱完成' in output
+    assert len(csv_path.read_text(encoding='utf-8').splitlines()) > 1
+
+
+def test_status(cache_dir):
+    run_cli('--status', cache_dir=cache_dir)
+
+
+def test_analyze(program, cache_dir):
+    _, output = run_cli(str(program), '--analyze', cache_dir=cache_dir)
+    assert '總長' in output
+
+
+def test_render(program, tmp_path, cache_dir):
+    output_path = tmp_path / 'smoke.wav'
+    run_cli(str(program), '--render', str(output_path), cache_dir=cache_dir)
+    assert output_path.stat().st_size > 44
+
+
+def test_wav_backend(program, tmp_path, cache_dir):
+    output_path = tmp_path / 'smoke.wav'
+    run_cli(str(program), '-b', 'wav', '-o', str(output_path), '-q', cache_dir=cache_dir)
+    assert output_path.stat().st_size > 44
+
+
+def test_raw_backend_keeps_text_out_of_pcm(program, cache_dir):
+    result, _ = run_cli(str(program), '-b', 'raw', '-q', cache_dir=cache_dir)
+    # 文字訊息改印到 stderr，stdout 只有 16-bit 立體聲 PCM
+    assert len(result.stdout) % 4 == 0
+    assert '音樂播放完成' in result.stderr.decode('utf-8')
+
+
+def test_warmup(program, cache_dir):
+    _, output = run_cli(str(program), '-b', 'null', '-q', '--warmup', cache_dir=cache_dir)
+    assert '預熱完成' in output
+
+
+def test_interactive(cache_dir):
+    _, output = run_cli('--interactive', '-b', 'null', stdin=b'note C4, 0.1\nexit\n', cache_dir=cache_dir)
+    assert 'PyTune 互動模式' in output
+
+
+def test_wav_backend_requires_output(program, cache_dir):
+    _, output = run_cli(str(program), '-b', 'wav', cache_dir=cache_dir)
+    assert 'wav 後端需要指定輸出檔案' in output
+
+
+def test_stream_backend(program, cache_dir):
+    _, output = run_cli(str(program), '-b', 'stream', '-q', cache_dir=cache_dir)
+    assert '串流輸出' in output or '改用 null 後端' in output
@@ -0,0 +1,62 @@
+"""
+區塊濾波器：與逐取樣點的差分方程式結果相同，狀態可跨區塊延續
+"""
+
+import numpy as np
+import pytest
+
+from audio.dsp import Biquad, OnePoleLowpass
+
+
+def one_pole_reference(signal, alpha, previous=0.0):
+    output = np.empty(len(signal))
+    for n, x in enumerate(signal):
+        previous = alpha * x + (1 - alpha) * previous
+        output[n] = previous
+    return output
+
+
+def biquad_reference(signal, b, a):
+    z1 = z2 = 0.0
+    output = np.empty(len(signal))
+    for n, x in enumerate(signal):
+        y = b[0] * x + z1
+        z1 = b[1] * x - a[1] * y + z2
+        z2 = b[2] * x - a[2] * y
+        output[n] = y
+    return output
+
+
+@pytest.fixture
+def signal():
+    # 長度不是子區塊大小的整數倍
+    return np.random.default_rng(0).normal(size=1000)
+
+
+def test_one_pole_lowpass_matches_recurrence(signal):
+    lowpass = OnePoleLowpass(800.0, block_size=64)
+    np.testing.assert_allclose(lowpass.process(signal), one_pole_reference(signal, lowpass.alpha), atol=1e-10)
+
+
+@pytest.mark.parametrize('design', [
+    lambda: Biquad.lowpass(1000.0),
+    lambda: Biquad.highpass(300.0),
+    lambda: Biquad.bandpass(2000.0, q=2.0),
+])
+def test_biquad_matches_direct_form(signal, design):
+    biquad = design()
+    np.testing.assert_allclose(biquad.process(signal), biquad_reference(signal, biquad.b, biquad.a), atol=1e-10)
+
+
+def test_state_carries_across_calls(signal):
+    whole = Biquad.lowpass(1500.0).process(signal)
+    streamed = Biquad.lowpass(1500.0)
+    parts = [streamed.process(chunk) for chunk in np.array_split(signal, [1, 300, 301, 777])]
+    np.testing.assert_allclose(np.concatenate(parts), whole, atol=1e-10)
+
+
+def test_reset_starts_at_steady_state():
+    lowpass = OnePoleLowpass(200.0)
+    lowpass.reset(0.5)
+    np.testing.assert_allclose(lowpass.process(np.full(100, 0.5)), 0.5)
+    assert len(lowpass.process([])) == 0
@@ -0,0 +1,140 @@
+"""
+閉包編譯直譯器：AST 先編譯成指令閉包再執行，語意與原本的逐節點直譯相同
+"""
+
+import sys
+
+import pytest
+
+from audio.compiler import MAX_CALL_DEPTH
+from audio.timeline import EVENT_REST, TimelineCompiler
+
+RATE = 44100
+
+
+def run(parse, code):
+    """執行程式，回傳（播放順序, 執行後的變數）；音符記為名稱，休止符記為秒數"""
+    compiler = TimelineCompiler(RATE)
+    timeline = compiler.compile(parse(code))
+    played = [
+        round(int(event['length']) / RATE, 4) if event['kind'] == EVENT_REST else timeline.note_name(event['note'])
+        for event in timeline.events
+    ]
+    return played, compiler.variables
+
+
+def test_arithmetic_and_division_by_zero(parse):
+    played, variables = run(parse, """
+a = 1 + 2 * 3
+b = (1 + 2) * 3
+c = a / 0
+d = 10 - 4 - 3
+rest a / 10
+""")
+    assert (variables['a'], variables['b'], variables['c'], variables['d']) == (7, 9, 7, 3)
+    assert played == [0.7]
+
+
+def test_control_flow(parse):
+    played, variables = run(parse, """
+x = 0
+while (x < 3) {
+    x = x + 1
+    if (x == 1) {
+        note C4, 0.1
+    } elseif (x == 2 or x > 5) {
+        note D4, 0.1
+    } else {
+        note E4, 0.1
+    }
+}
+for (i, 0:2) {
+    loop 2 {
+        rest 0.1
+    }
+}
+if (not (x == 3)) {
+    note F4, 0.1
+}
+""")
+    assert played == ['C4', 'D4', 'E4', 0.1, 0.1, 0.1, 0.1]
+    assert variables['x'] == 3
+
+
+def test_while_iteration_limit(parse):
+    played, variables = run(parse, "x = 0\nwhile (x >= 0) {\n    x = x + 1\n}")
+    assert variables['x'] == 1000
+
+
+def test_functions_bind_parameters_and_share_globals(parse):
+    played, variables = run(parse, """
+total = 0
+fn add(n, step) {
+    total = total + n
+    rest step
+}
+add(1, 0.1)
+add(2, 0.2)
+add(3)
+""")
+    # 參數是區域變數，缺少的引數讀取時取該位置的預設值（休止符為 1 秒）；
+    # 函式主體改寫的全域變數呼叫後可見
+    assert played == [0.1, 0.2, 1.0]
+    assert variables['total'] == 6
+    assert 'n' not in variables and 'step' not in variables
+
+
+def test_undefined_function_call_is_ignored(parse):
+    played, _ = run(parse, "missing(1)\nnote C4, 0.1")
+    assert played == ['C4']
+
+
+def test_state_carries_between_executions(engine, parse):
+    engine.execute(parse("fn hop(n) {\n    rest n\n}\nx = 0.5"))
+    engine.execute(parse("hop(x)\nnote C4, 0.1"))
+    assert engine.recorder.rest_count == 1
+    assert engine.cursor == pytest.approx(int(0.5 * RATE) + int(0.1 * RATE))
+
+
+# === 呼叫框 ===
+
+def test_each_call_binds_its_own_arguments(parse):
+    played, _ = run(parse, """
+fn inner(n) {
+    rest n
+}
+fn outer(n) {
+    inner(n + 0.1)
+    rest n
+}
+outer(0.1, 99)
+""")
+    # 多餘的引數忽略；inner 返回後 outer 的 n 不受影響
+    assert played == [0.2, 0.1]
+
+
+def test_recursion_deeper_than_python_stack(parse):
+    depth = sys.getrecursionlimit() * 3
+    played, _ = run(parse, f"""
+fn down(n) {{
+    if (n > 0) {{
+        rest 0.001
+        down(n - 1)
+    }}
+}}
+down({depth})
+""")
+    assert len(played) == depth
+
+
+def test_runaway_recursion_stops_at_depth_limit(parse):
+    played, _ = run(parse, """
+fn forever(n) {
+    rest 0.001
+    forever(n)
+}
+forever(1)
+note C4, 0.1
+""")
+    assert len(played) == MAX_CALL_DEPTH
+    assert played[-1] == 'C4'
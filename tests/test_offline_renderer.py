@@ -0,0 +1,108 @@
+"""
+離線渲染：以虛擬時鐘把整首曲子寫成 WAV 檔，不需要等待實際播放時間
+"""
+
+import time
+import wave
+
+import numpy as np
+
+from audio.offline_renderer import OfflineRenderer
+from audio.timeline import TimelineCompiler
+
+PROGRAM = """
+tempo 120
+refinst = piano
+note C4, 0.5
+chord [C4, E4, G4], 1.0
+rest 0.5
+refinst = organ
+loop 4 {
+    note G4, 0.5
+    note E4, 0.5
+}
+"""
+
+
+def test_render_writes_whole_piece_faster_than_realtime(parse, tmp_path):
+    ast = parse(PROGRAM)
+    path = tmp_path / 'out.wav'
+    started = time.perf_counter()
+    duration = OfflineRenderer().render(ast, path)
+    elapsed = time.perf_counter() - started
+
+    assert duration == 6.0
+    assert elapsed < duration
+    with wave.open(str(path), 'rb') as wav_file:
+        assert wav_file.getframerate() == 44100
+        assert wav_file.getnchannels() == 2
+        assert wav_file.getsampwidth() == 2
+        assert wav_file.getnframes() == 6 * 44100
+        pcm = np.frombuffer(wav_file.readframes(wav_file.getnframes()), dtype='<i2').reshape(-1, 2)
+
+    # 單聲道複製到兩個聲道；休止符期間靜音，其他時間有聲音
+    np.testing.assert_array_equal(pcm[:, 0], pcm[:, 1])
+    rest = slice(int(1.6 * 44100), int(2.0 * 44100))
+    assert not pcm[rest].any()
+    assert np.abs(pcm[:44100 // 2]).max() > 1000
+
+
+def test_render_is_deterministic(parse):
+    ast = parse("refinst = organ\nchord [C4, E4], 0.5\nnote G4, 0.25")
+    timeline = TimelineCompiler().compile(ast)
+    first = OfflineRenderer().render_timeline(timeline)
+    second = OfflineRenderer().render_timeline(timeline)
+    assert len(first) == timeline.total_samples
+    np.testing.assert_array_equal(first, second)
+
+
+# === 串流區塊渲染 ===
+
+STREAM_PROGRAM = """
+refinst = organ
+fn riff(n) {
+    note C4, 0.1
+    chord [E4, G4], 0.15
+}
+riff(1)
+refinst = piano
+note A4, 0.3
+riff(1)
+rest 0.1
+chord [C4, E4], 0.2
+"""
+
+
+def test_stream_blocks_do_not_depend_on_block_size(parse):
+    timeline = TimelineCompiler().compile(parse(STREAM_PROGRAM))
+    renderer = OfflineRenderer()
+    reference = np.concatenate(list(renderer.stream_timeline(timeline, block_size=timeline.total_samples)))
+    for block_size in (4096, 1000, 37):
+        blocks = list(renderer.stream_timeline(timeline, block_size))
+        assert all(len(block) == block_size for block in blocks[:-1])
+        np.testing.assert_array_equal(np.concatenate(blocks), reference)
+    assert len(reference) == timeline.total_samples
+
+
+def test_stream_pcm_yields_stereo_int16(parse):
+    timeline = TimelineCompiler().compile(parse(STREAM_PROGRAM))
+    blocks = list(OfflineRenderer().stream_pcm(timeline, block_size=2048))
+    assert all(block.dtype == np.int16 and block.shape[1] == 2 for block in blocks)
+    assert sum(len(block) for block in blocks) == timeline.total_samples
+
+
+def test_failed_voice_is_skipped(parse, monkeypatch):
+    timeline = TimelineCompiler().compile(parse("refinst = organ\nnote C4, 0.1\nnote E4, 0.1"))
+    renderer = OfflineRenderer()
+    render_group = renderer._render_group
+
+    def flaky(frequencies, length, instrument, gain):
+        if frequencies[0] > 300:
+            raise ValueError("boom")
+        return render_group(frequencies, length, instrument, gain)
+
+    monkeypatch.setattr(renderer, '_render_group', flaky)
+    mix = renderer.render_timeline(timeline)
+    assert len(mix) == timeline.total_samples
+    assert np.abs(mix[:4410]).max() > 0
+    assert not mix[4410:].any()
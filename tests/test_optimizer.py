@@ -0,0 +1,127 @@
+"""
+AST 最佳化：產生的事件時間軸與未最佳化時相同，且不妨礙函式主體的記憶化
+"""
+
+import numpy as np
+import pytest
+
+from audio.timeline import TimelineCompiler
+from parser.ast_nodes import NodeKind
+from parser.optimizer import TEMP_PREFIX, optimize
+
+PROGRAMS = {
+    'folding': """
+x = 2 + 3
+note C4, 0.5
+rest x / 10
+rest (x - 4) * 0.25
+""",
+    'dead_branches': """
+x = 1
+if (x == 2) {
+    note C4, 0.5
+} elseif (x == 1) {
+    note D4, 0.5
+} else {
+    note E4, 0.5
+}
+loop 0 {
+    note F4, 0.5
+}
+""",
+    'hoisting': """
+base = 0.1
+loop 2 {
+    base = base + 0.05
+}
+for (i, 0:4) {
+    note C4, 0.2
+    loop 2 {
+        rest base + 0.05
+    }
+}
+""",
+    'functions': """
+fn hop(n) {
+    loop 3 {
+        note C5, 0.25
+        rest n * 0.5
+    }
+}
+y = 0.2
+hop(y)
+y = y + 0.1
+hop(y)
+""",
+}
+
+
+def compile_events(ast):
+    return TimelineCompiler().compile(ast).events
+
+
+@pytest.mark.parametrize('name', sorted(PROGRAMS))
+def test_optimized_program_produces_same_events(parse, name):
+    ast = parse(PROGRAMS[name])
+    optimized, report = optimize(ast)
+    assert report.changed
+    np.testing.assert_array_equal(compile_events(optimized), compile_events(ast))
+
+
+def test_loop_invariants_hoisted_at_top_level(parse):
+    optimized, report = optimize(parse(PROGRAMS['hoisting']))
+    assert report.hoisted >= 1
+    prelude = [node for node in optimized.body if node.kind == NodeKind.ASSIGN]
+    assert any(node.var.name.startswith(TEMP_PREFIX) for node in prelude)
+
+
+def test_optimized_pure_function_is_still_memoized(parse):
+    ast = parse("""
+refinst = organ
+fn riff(n) {
+    loop 4 {
+        note C4, 0.25
+        rest n * 0.5
+    }
+}
+riff(0.2)
+riff(0.2)
+riff(0.2)
+""")
+    optimized, report = optimize(ast)
+    # 函式主體的迴圈不提出暫存變數，主體仍然只依賴參數
+    assert report.hoisted == 0
+
+    timeline = TimelineCompiler().compile(optimized)
+    # 三次呼叫都是同一個記憶化片段
+    assert len(timeline.segments) == 3
+    assert len(np.unique(timeline.segments['id'])) == 1
+    np.testing.assert_array_equal(timeline.events, compile_events(ast))
+
+
+def test_hoisted_temps_are_not_written_back(parse, engine):
+    optimized, report = optimize(parse("""
+x = 1
+for (i, 0:2) {
+    x = x + 1
+}
+loop 2 {
+    rest x * 2 / 100
+}
+"""))
+    assert report.hoisted == 1
+    engine.execute(optimized)
+    assert engine.variables == {'x': 3, 'i': 1}
+
+
+def test_loops_that_may_not_run_are_not_hoisted(parse):
+    # n 與 y 可能來自先前的輸入（互動模式），迴圈不一定會執行
+    optimized, report = optimize(parse("""
+while (n > 0) {
+    rest y * 2
+    n = n - 1
+}
+"""))
+    assert report.hoisted == 0
+    assert not any(node.kind == NodeKind.ASSIGN and node.var.name.startswith(TEMP_PREFIX)
+                   for node in optimized.body)
@@ -0,0 +1,44 @@
+"""
+解析器：語法只從 music_lang.lark 載入，LALR 解析表在行程內共用並序列化到快取檔
+"""
+
+import os
+
+from parser import parser as parser_module
+from parser.ast_nodes import Program
+from parser.parser import (
+    GRAMMAR_PATH, MusicLanguageParser, _cache_path, _compile_parser, get_parser, load_grammar,
+)
+
+
+def test_parser_is_compiled_once_per_process():
+    assert get_parser() is get_parser()
+    assert MusicLanguageParser().parser is MusicLanguageParser().parser
+    assert _compile_parser(str(GRAMMAR_PATH)) is _compile_parser()
+
+
+def test_parse_table_cache_file_tracks_grammar_content():
+    grammar = load_grammar()
+    path = _cache_path(grammar)
+    _compile_parser()
+    assert os.path.exists(path)
+    assert _cache_path(grammar + "\n// changed\n") != path
+
+
+def test_custom_grammar_file_gets_its_own_parser(tmp_path):
+    custom = tmp_path / 'custom.lark'
+    grammar = load_grammar() + "\n// custom\n"
+    custom.write_text(grammar, encoding='utf-8')
+    try:
+        parser = MusicLanguageParser(str(custom))
+        assert parser.parser is not get_parser().parser
+        assert isinstance(parser.parse("note C4, 0.5\nrest 0.5"), Program)
+    finally:
+        parser_module._compiled_parsers.pop(os.path.abspath(custom), None)
+        if os.path.exists(_cache_path(grammar)):
+            os.remove(_cache_path(grammar))
+
+
+def test_missing_grammar_file_falls_back_to_builtin(tmp_path):
+    parser = MusicLanguageParser(str(tmp_path / 'missing.lark'))
+    assert parser.parser is get_parser().parser
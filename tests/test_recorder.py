@@ -0,0 +1,69 @@
+"""
+欄式演奏記錄：可成長的型別化欄位，到達上限後覆寫最舊的記錄，計數器仍然全部累計
+"""
+
+import csv
+
+import numpy as np
+
+from audio.recorder import RECORD_NOTE, RECORD_REST, EventRecorder
+
+
+def test_grows_until_limit():
+    recorder = EventRecorder(capacity=4, max_records=64)
+    for i in range(10):
+        recorder.record(RECORD_NOTE, 'piano', 'C4', 0.5, i)
+    assert recorder.capacity == 16
+    assert len(recorder) == 10
+    assert recorder.to_numpy()['scheduled'].tolist() == list(range(10))
+
+
+def test_ring_wraparound_keeps_latest_in_order():
+    recorder = EventRecorder(capacity=2, max_records=8)
+    for i in range(21):
+        kind = RECORD_REST if i % 3 == 0 else RECORD_NOTE
+        recorder.record(kind, 'piano' if i % 2 else 'flute', 'C4', 0.25, float(i), float(i) + 0.01)
+
+    assert recorder.capacity == 8
+    assert len(recorder) == 8
+    assert recorder.total == 21
+    records = recorder.to_numpy()
+    assert records['scheduled'].tolist() == list(range(13, 21))
+    np.testing.assert_allclose(records['actual'] - records['scheduled'], 0.01)
+    assert (records['note'][records['kind'] == RECORD_REST] == -1).all()
+
+    # 計數器包含已覆寫的記錄
+    assert recorder.note_count == 14
+    assert recorder.rest_count == 7
+    assert sum(notes + rests for notes, rests in recorder.counts().values()) == 21
+
+
+def test_record_many_wraps_like_single_records():
+    single = EventRecorder(capacity=4, max_records=4)
+    batch = EventRecorder(capacity=4, max_records=4)
+    kinds = [RECORD_NOTE, RECORD_REST] * 3
+    names = ['C4', None] * 3
+    for i, (kind, note) in enumerate(zip(kinds, names)):
+        single.record(kind, 'organ', note, 0.5, float(i), float(i))
+    batch.record(RECORD_NOTE, 'organ', 'D4', 0.5, -1.0)
+    batch.record_many(kinds, ['organ'] * 6, names, 0.5, np.arange(6.0), np.arange(6.0))
+
+    np.testing.assert_array_equal(batch.to_numpy()['scheduled'], single.to_numpy()['scheduled'])
+    np.testing.assert_array_equal(batch.to_numpy()['kind'], single.to_numpy()['kind'])
+    assert batch.counts() == {'organ': (4, 3)}
+
+
+def test_clear_and_csv_export(tmp_path):
+    recorder = EventRecorder()
+    recorder.record(RECORD_NOTE, 'piano', 'E4', 0.5, 0.0, 0.002)
+    recorder.record(RECORD_REST, 'piano', None, 0.25, 0.5)
+    path = tmp_path / 'events.csv'
+    assert recorder.to_csv(path) == 2
+    with open(path, encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert rows[0] == {'kind': 'note', 'instrument': 'piano', 'note': 'E4', 'duration': '0.500000',
+                       'scheduled': '0.000000', 'actual': '0.002000'}
+    assert rows[1]['kind'] == 'rest' and rows[1]['note'] == ''
+
+    recorder.clear()
+    assert not recorder and len(recorder) == 0 and recorder.counts() == {}
@@ -0,0 +1,68 @@
+"""
+樣本庫：預先合成的音色以記憶體映射讀取，結果與即時合成相同；樂器設定改變時重新建立
+"""
+
+import numpy as np
+
+from audio.audio_engine import InstrumentSynthesizer
+from audio.sample_bank import SampleBank, default_bank_dir
+
+MAX_SECONDS = 0.2
+
+
+def make_bank(tmp_path):
+    synth = InstrumentSynthesizer()
+    bank = synth.sample_bank = SampleBank(synth, tmp_path, max_seconds=MAX_SECONDS)
+    return synth, bank
+
+
+def test_bank_render_matches_direct_synthesis(tmp_path):
+    synth, bank = make_bank(tmp_path)
+    frequency = synth.note_to_frequency('A4')
+    from_bank = bank.render(frequency, 0.15, 'organ')
+    direct = synth.generate_waveform(frequency, 0.15, 'organ')
+
+    assert bank.hits == 1
+    np.testing.assert_allclose(from_bank, direct, atol=1e-6)
+    assert bank.path('organ').exists()
+
+
+def test_misses_fall_back_to_synthesis(tmp_path):
+    synth, bank = make_bank(tmp_path)
+    frequency = synth.note_to_frequency('C4')
+    assert bank.render(frequency, MAX_SECONDS * 2, 'organ') is None  # 超過保存長度
+    assert bank.render(frequency * 1.01, 0.1, 'organ') is None       # 不在音高表中
+    assert bank.render(frequency, 0.1, 'drums') is None              # 含噪音的樂器
+    assert not bank.supports('drums')
+    assert bank.misses == 3
+
+
+def test_config_change_rebuilds_and_removes_stale_bank(tmp_path, monkeypatch):
+    synth, bank = make_bank(tmp_path)
+    frequency = synth.note_to_frequency('E4')
+    before = bank.render(frequency, 0.1, 'organ')
+    old_path = bank.path('organ')
+
+    monkeypatch.setitem(synth.instrument_configs, 'organ', dict(synth.instrument_configs['organ'], harmonics=[1.0, 0.1]))
+    synth.wavetables.clear()
+    fresh = SampleBank(synth, tmp_path, max_seconds=MAX_SECONDS)
+    assert fresh.path('organ') != old_path
+
+    after = fresh.render(frequency, 0.1, 'organ')
+    assert not old_path.exists()
+    assert not np.allclose(before, after)
+    np.testing.assert_allclose(after, synth.generate_waveform(frequency, 0.1, 'organ'), atol=1e-6)
+
+
+def test_existing_bank_is_reused(tmp_path):
+    _, bank = make_bank(tmp_path)
+    bank.build(['organ'])
+    mtime = bank.path('organ').stat().st_mtime_ns
+
+    _, again = make_bank(tmp_path)
+    assert again.build(['organ', 'drums']) == 1
+    assert again.path('organ').stat().st_mtime_ns == mtime
+
+
+def test_default_dir_follows_cache_env(cache_dir):
+    assert default_bank_dir() == cache_dir / 'samples'
@@ -0,0 +1,128 @@
+"""
+片段記憶化：只依賴引數與進入狀態的函式主體記錄一次事件，之後的呼叫直接複製，
+時間軸與逐次執行完全相同
+"""
+
+import numpy as np
+import pytest
+
+from audio.offline_renderer import OfflineRenderer
+from audio.timeline import TimelineCompiler
+
+
+class PlainCompiler(TimelineCompiler):
+    """不記憶化的時間軸編譯器，作為對照"""
+
+    begin_segment = None
+    end_segment = None
+
+
+def compile_both(parse, code):
+    ast = parse(code)
+    return TimelineCompiler().compile(ast), PlainCompiler().compile(ast)
+
+
+FUNCTIONS = """
+refinst = organ
+tempo 90
+fn riff(n, gap) {
+    note C4, 0.1
+    chord [E4, G4], 0.1
+    rest gap
+}
+riff(1, 0.05)
+riff(1, 0.05)
+volume 0.5
+riff(1, 0.05)
+riff(2, 0.1)
+riff(1, 0.05)
+"""
+
+
+def test_memoized_calls_match_plain_execution(parse):
+    memoized, plain = compile_both(parse, FUNCTIONS)
+    np.testing.assert_array_equal(memoized.events, plain.events)
+    assert memoized.total_samples == plain.total_samples
+    assert not len(plain.segments)
+
+    # (引數, 音量) 相同的呼叫共用一個片段：riff(1, 0.05) 在音量改變前後各算一種，
+    # 只出現一次的 riff(2, 0.1) 照一般事件渲染
+    ids = memoized.segments['id'].tolist()
+    assert len(ids) == 4
+    assert len(set(ids)) == 2
+
+
+def test_memoized_render_matches_plain_render(parse):
+    memoized, plain = compile_both(parse, FUNCTIONS)
+    np.testing.assert_allclose(
+        OfflineRenderer().render_timeline(memoized),
+        OfflineRenderer().render_timeline(plain),
+        atol=1e-6,
+    )
+
+
+@pytest.mark.parametrize('body', [
+    "rest x",                # 讀取全域變數
+    "x = n\n    rest n",     # 改寫全域變數
+    "other()\n    rest n",   # 呼叫其他函式（other 本身也讀取全域變數）
+])
+def test_impure_functions_are_not_memoized(parse, body):
+    code = f"x = 0.1\nfn other() {{\n    rest x\n}}\nfn f(n) {{\n    {body}\n}}\nf(0.2)\nf(0.2)"
+    memoized, plain = compile_both(parse, code)
+    assert not len(memoized.segments)
+    np.testing.assert_array_equal(memoized.events, plain.events)
+
+
+def test_state_after_replay_matches(parse):
+    memoized = TimelineCompiler()
+    plain = PlainCompiler()
+    for compiler in (memoized, plain):
+        compiler.compile(parse(FUNCTIONS))
+    assert memoized.current_tempo == plain.current_tempo == 90
+    assert memoized.current_volume == plain.current_volume
+    assert memoized.position == pytest.approx(plain.position)
+
+
+# === 迴圈主體 ===
+
+LOOPS = """
+refinst = organ
+loop 8 {
+    note C4, 0.1
+    chord [E4, G4], 0.05
+    rest 0.05
+}
+for (i, 0:3) {
+    note D4, 0.1
+}
+"""
+
+
+def test_state_independent_loop_body_is_tiled(parse):
+    memoized, plain = compile_both(parse, LOOPS)
+    np.testing.assert_array_equal(memoized.events, plain.events)
+
+    # loop 與 for 的主體都不讀寫變數，各自只記錄一次
+    assert len(memoized.segments) == 8 + 3
+    assert len(set(memoized.segments['id'].tolist())) == 2
+    np.testing.assert_allclose(
+        OfflineRenderer().render_timeline(memoized),
+        OfflineRenderer().render_timeline(plain),
+        atol=1e-6,
+    )
+
+
+def test_loop_body_reading_variables_runs_every_iteration(parse):
+    memoized, plain = compile_both(parse, """
+refinst = organ
+d = 0.1
+loop 3 {
+    rest d
+    d = d + 0.1
+}
+for (i, 0:3) {
+    rest i / 10
+}
+""")
+    assert not len(memoized.segments)
+    np.testing.assert_array_equal(memoized.events, plain.events)
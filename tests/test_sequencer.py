@@ -0,0 +1,141 @@
+"""
+絕對期限音序器：起奏依時間軸位置排程、不累積延遲，並逐個起奏回報延遲
+"""
+
+import csv
+import time
+import wave
+
+from audio.audio_engine import AudioEngine
+from audio.backends import AudioBackend, WavFileBackend
+from audio.sequencer import Sequencer
+from audio.timeline import TimelineCompiler
+
+PROGRAM = """
+refinst = organ
+loop 6 {
+    note C4, 0.04
+}
+chord [C4, E4], 0.04
+rest 0.04
+"""
+
+
+class ClockBackend(AudioBackend):
+    """即時後端的替身：記錄每個聲音實際送出的時間"""
+
+    name = 'clock'
+    realtime = True
+
+    def __init__(self):
+        super().__init__()
+        self.onsets = []
+
+    def play(self, sound, start_sample):
+        self.onsets.append((time.perf_counter(), start_sample))
+
+
+def test_onsets_follow_absolute_deadlines(parse, tmp_path, trace):
+    backend = ClockBackend()
+    path = tmp_path / 'events.csv'
+    engine = AudioEngine(backend=backend, events_csv=path)
+    engine.execute(parse(PROGRAM))
+
+    # 每個起奏相對第一個起奏的時間等於時間軸上的位置，不會逐漸落後
+    first_time, first_sample = backend.onsets[0]
+    for played, start in backend.onsets[1:]:
+        expected = (start - first_sample) / backend.sample_rate
+        assert abs((played - first_time) - expected) < 0.02
+
+    # 每個起奏的延遲都寫進追蹤事件與 CSV
+    records = [r for r in trace() if r['event'] in ('note', 'chord')]
+    assert len(records) == len(backend.onsets) == 7
+    assert all(0 <= r['lateness'] < 0.05 for r in records)
+    assert all(abs(r['actual'] - r['scheduled'] - r['lateness']) < 1e-9 for r in records)
+
+    with open(path, encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert [row['kind'] for row in rows].count('rest') == 1
+    assert len(rows) == 6 + 2 + 1
+    assert all(float(row['actual']) >= float(row['scheduled']) for row in rows)
+
+
+def test_non_realtime_backend_does_not_wait(engine, parse):
+    started = time.perf_counter()
+    engine.execute(parse("note C4, 5.0\nrest 5.0"))
+    assert time.perf_counter() - started < 5.0
+    assert engine.cursor == int(10.0 * engine.synthesizer.sample_rate)
+
+
+# === 提前合成的執行緒池 ===
+
+POOL_PROGRAM = """
+refinst = organ
+fn riff(n) {
+    note C4, 0.05
+    chord [E4, G4], 0.05
+}
+loop 3 {
+    note A4, 0.05
+    note A4, 0.05
+}
+riff(1)
+refinst = piano
+chord [C4, E4, G4], 0.1
+riff(1)
+note B4, 0.05
+"""
+
+
+def play_to_wav(parse, path, **options):
+    engine = AudioEngine(backend=WavFileBackend(path))
+    timeline = TimelineCompiler().compile(parse(POOL_PROGRAM))
+    renders = []
+    render_pcm = engine._render_pcm
+
+    def counting(*args):
+        renders.append(args)
+        return render_pcm(*args)
+
+    engine._render_pcm = counting
+    Sequencer(engine, **options).play(timeline)
+    engine.backend.close()
+    with wave.open(str(path), 'rb') as wav_file:
+        return wav_file.readframes(wav_file.getnframes()), renders
+
+
+def test_worker_pool_output_matches_serial(parse, tmp_path):
+    pooled, renders = play_to_wav(parse, tmp_path / 'pool.wav', workers=4, lookahead=8)
+    serial, _ = play_to_wav(parse, tmp_path / 'serial.wav', workers=1, lookahead=0)
+    assert pooled == serial
+
+    # 相同的音符只合成一次（正在合成中的聲音共用同一個工作）
+    keys = [repr(args) for args in renders]
+    assert keys
+    assert len(keys) == len(set(keys))
+
+
+# === 預熱 ===
+
+def test_warmup_fills_cache_before_playback(engine, parse):
+    timeline = TimelineCompiler().compile(parse(POOL_PROGRAM + "\nrefinst = drums\nnote C4, 0.05"))
+    sequencer = Sequencer(engine)
+    count = sequencer.warmup(timeline)
+    # 迴圈片段、兩種樂器各自的 riff 音符與和弦（各 2 個）、C 大三和弦、B4；含噪音的鼓不預熱
+    assert count == 7
+    assert len(engine.sound_cache) == 7
+    assert sequencer.warmup(timeline) == 0
+
+    misses = engine.sound_cache.misses
+    sequencer.play(timeline)
+    assert engine.sound_cache.misses == misses
+
+
+def test_warmup_does_not_change_output(parse, tmp_path):
+    cold = tmp_path / 'cold.wav'
+    warm = tmp_path / 'warm.wav'
+    for path, warmup in ((cold, False), (warm, True)):
+        engine = AudioEngine(backend=WavFileBackend(path), warmup=warmup)
+        engine.execute(parse(POOL_PROGRAM))
+        engine.backend.close()
+    assert cold.read_bytes() == warm.read_bytes()
@@ -0,0 +1,65 @@
+"""
+LRU 音效快取：依記憶體與項目數上限淘汰最久未使用的項目，重複音符不必重新合成
+"""
+
+import numpy as np
+
+from audio.sound_cache import SoundCache
+
+
+def buffer(samples):
+    return np.zeros(samples, dtype=np.float32)
+
+
+def test_key_normalizes_float_noise():
+    assert SoundCache.make_key([261.6256], 'piano', 100, 0.4) == \
+        SoundCache.make_key([261.62560000001], 'piano', 100.0, 0.40000000001)
+    assert SoundCache.make_key([261.63], 'piano', 100, 0.4) != SoundCache.make_key([261.63], 'organ', 100, 0.4)
+
+
+def test_evicts_least_recently_used_by_bytes():
+    cache = SoundCache(max_bytes=3 * 400)
+    for name in 'abc':
+        cache.put(name, buffer(100))
+    assert cache.get('a') is not None  # a 變成最近使用
+    cache.put('d', buffer(100))
+
+    assert 'b' not in cache
+    assert all(name in cache for name in 'acd')
+    assert cache.current_bytes == 3 * 400
+    assert cache.evictions == 1
+
+
+def test_entry_limit_and_stats():
+    cache = SoundCache(max_entries=2)
+    cache.put('a', buffer(10))
+    cache.put('b', buffer(10))
+    cache.put('c', buffer(10))
+    assert len(cache) == 2 and 'a' not in cache
+
+    assert cache.get('a') is None
+    assert cache.get('c') is not None
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.hit_rate == 0.5
+
+
+def test_oversized_buffer_is_not_cached():
+    cache = SoundCache(max_bytes=100)
+    entry = cache.put('big', buffer(1000))
+    assert entry.buffer.nbytes == 4000
+    assert 'big' not in cache
+    assert cache.current_bytes == 0
+
+
+def test_attached_sound_counts_its_copy():
+    cache = SoundCache()
+    cache.put('a', buffer(100))
+    cache.attach_sound('a', object())
+    assert cache.current_bytes == 800
+
+
+def test_engine_reuses_repeated_notes(engine, parse):
+    engine.execute(parse("refinst = organ\nloop 5 {\n    note C4, 0.1\n}\nnote E4, 0.1"))
+    cache = engine.sound_cache
+    assert len(cache) == 2
+    assert cache.hits >= 4
@@ -0,0 +1,75 @@
+"""
+事件時間軸：控制流程在編譯時執行一次，結果是依時間排序的 NumPy 結構化陣列
+"""
+
+import numpy as np
+import pytest
+
+from audio.timeline import EVENT_DTYPE, EVENT_NOTE, EVENT_REST, TimelineCompiler
+
+RATE = 44100
+
+
+def compile_timeline(parse, code):
+    return TimelineCompiler(RATE).compile(parse(code))
+
+
+def test_events_are_flat_structured_array(parse):
+    timeline = compile_timeline(parse, """
+refinst = piano
+note A4, 0.5
+chord [C4, E4], 0.25
+rest 0.25
+refinst = flute
+loop 2 {
+    note A4, 0.5
+}
+""")
+    events = timeline.events
+    assert events.dtype == EVENT_DTYPE
+    assert events['kind'].tolist() == [EVENT_NOTE] * 3 + [EVENT_REST] + [EVENT_NOTE] * 2
+    assert events['start'].tolist() == [0, 22050, 22050, 33075, 44100, 66150]
+    assert events['length'].tolist() == [22050, 11025, 11025, 11025, 22050, 22050]
+    assert events['frequency'][0] == pytest.approx(440.0)
+    assert [timeline.note_name(n) for n in events['note']] == ['A4', 'C4', 'E4', None, 'A4', 'A4']
+    assert [timeline.instrument_name(i) for i in events['instrument']] == ['piano'] * 4 + ['flute'] * 2
+    assert timeline.total_samples == 88200
+    assert timeline.duration == pytest.approx(2.0)
+
+    # 和弦的音符同時起奏，分成同一組；休止符各自一組
+    assert timeline.group_bounds(events) == [(0, 1), (1, 3), (3, 4), (4, 5), (5, 6)]
+
+
+def test_volume_sets_gain_and_rests_are_silent(parse):
+    timeline = compile_timeline(parse, """
+volume 0.5
+note C4, 0.1
+volume 1.0
+note C4, 0.1
+rest 0.1
+""")
+    gains = timeline.events['gain'].tolist()
+    assert gains[0] == pytest.approx(0.2)
+    assert gains[1] == pytest.approx(0.4)
+    assert gains[2] == 0.0
+    assert timeline.events['frequency'][2] == 0.0
+
+
+def test_control_flow_runs_once_at_compile_time(parse):
+    timeline = compile_timeline(parse, """
+refinst = piano
+for (i, 0:3) {
+    note C4, 0.1
+    loop 2 {
+        note D4, 0.05
+    }
+}
+""")
+    assert [timeline.note_name(n) for n in timeline.events['note']] == ['C4', 'D4', 'D4'] * 3
+    assert np.all(np.diff(timeline.events['start'][::3]) == int(0.2 * RATE))
+
+
+def test_event_buffer_grows_past_initial_capacity(parse):
+    timeline = compile_timeline(parse, "refinst = piano\nloop 1500 {\n    note C4, 0.01\n}")
+    assert len(timeline) == 1500
+    assert timeline.events['start'][-1] == round(1499 * 0.01 * RATE)
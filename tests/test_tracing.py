@@ -0,0 +1,65 @@
+"""
+結構化追蹤：等級過濾、停用時不產生事件，以及播放時逐音符的追蹤事件
+"""
+
+from audio.tracing import DEBUG, INFO, WARNING, ConsoleSink, Tracer
+
+PROGRAM = """
+refinst = piano
+x = 1
+loop 2 {
+    note C4, 0.1
+}
+chord [C4, E4, G4], 0.1
+rest 0.1
+"""
+
+
+class ListSink:
+    def __init__(self):
+        self.records = []
+
+    def write(self, record):
+        self.records.append(record)
+
+    def close(self):
+        pass
+
+
+def test_level_flags_follow_level_and_sinks():
+    tracer = Tracer(level=INFO, sinks=[ListSink()])
+    assert not tracer.debug and tracer.info and tracer.warning and tracer.error
+    assert not Tracer(level=DEBUG, sinks=[]).debug
+
+
+def test_emit_filters_by_level_and_keeps_ring_buffer():
+    sink = ListSink()
+    tracer = Tracer(level=INFO, capacity=2, sinks=[sink])
+    tracer.emit(DEBUG, 'hidden', 'x')
+    for i in range(3):
+        tracer.emit(WARNING, 'shown', f'{i}', index=i)
+    assert [r.fields['index'] for r in sink.records] == [0, 1, 2]
+    assert [r.message for r in tracer.recent()] == ['1', '2']
+    assert tracer.recent()[0].to_dict()['level'] == 'warning'
+
+
+def test_remove_console_disables_tracer():
+    tracer = Tracer(sinks=[ConsoleSink()])
+    tracer.remove_console()
+    assert not tracer.debug and not tracer.error
+
+
+def test_playback_traces_every_note_rest_iteration_and_assignment(engine, parse, trace):
+    engine.execute(parse(PROGRAM))
+    records = trace()
+    events = [record['event'] for record in records]
+    assert events.count('note') == 2
+    assert events.count('chord') == 1
+    assert events.count('rest') == 1
+    assert events.count('iteration') == 2
+    assert 'assign' in events
+
+    chord = next(record for record in records if record['event'] == 'chord')
+    assert chord['notes'] == ['C4', 'E4', 'G4']
+    assert chord['instrument'] == 'piano'
+    assert chord['scheduled'] > 0